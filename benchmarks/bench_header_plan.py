@@ -0,0 +1,166 @@
+"""
+Benchmark: heuristic Booknetic mappers, per-row header scanning (before) vs
+compiled header plans (after), on the sample exports in downloads/.
+
+Ejecuta: python -m benchmarks.bench_header_plan [--rows 50000]
+"""
+import argparse
+import csv
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from plugins import booknetic_export_adapter, booknetic_http_export
+
+DOWNLOADS_DIR = Path(__file__).parent.parent / "downloads"
+
+
+# --- before: mappers as they were, resolving columns on every row -----------
+
+def _normalize_key(key: str) -> str:
+    return (key or "").strip().lower().replace(" ", "_")
+
+
+def _fk(row: Dict[str, Any], tokens: List[str]):
+    for k in row.keys():
+        nk = _normalize_key(k)
+        if any(t in nk for t in tokens):
+            return k
+    return None
+
+
+def _fallback_id(row: Dict[str, Any]) -> str:
+    pieces = [f"{_normalize_key(k)}={str(v).strip()}" for k, v in sorted(row.items(), key=lambda kv: _normalize_key(kv[0]))]
+    return hashlib.sha1("|".join(pieces).encode("utf-8")).hexdigest()
+
+
+def legacy_map_appointment(row: Dict[str, Any]) -> Dict[str, Any]:
+    email_k = _fk(row, ["email"]) or _fk(row, ["correo"])
+    name_k = _fk(row, ["name", "customer", "cliente"])
+    service_k = _fk(row, ["service", "servicio"])
+    start_k = _fk(row, ["start", "fecha", "date", "hora", "start_time"])
+    status_k = _fk(row, ["status", "estado"])
+    id_k = _fk(row, ["appointment_id", "appointmentid", "booking_id", "bookingid", "id", "ID"])
+    mapped = {
+        "id": row.get(id_k) if id_k else None,
+        "customer_name": row.get(name_k) if name_k else None,
+        "customer_email": row.get(email_k) if email_k else None,
+        "service_name": row.get(service_k) if service_k else None,
+        "starts_at": row.get(start_k) if start_k else None,
+        "status": row.get(status_k) if status_k else None,
+        "raw": {_normalize_key(k): v for k, v in row.items()},
+    }
+    if not mapped["id"]:
+        mapped["id"] = _fallback_id(row)
+    return mapped
+
+
+def legacy_map_customer(row: Dict[str, Any]) -> Dict[str, Any]:
+    id_k = _fk(row, ["customer_id", "id", "ID"])
+    name_k = _fk(row, ["name", "customer", "cliente"])
+    email_k = _fk(row, ["email", "correo"])
+    phone_k = _fk(row, ["phone", "telefono", "tel"])
+    mapped = {
+        "id": row.get(id_k) if id_k else None,
+        "name": row.get(name_k) if name_k else None,
+        "email": row.get(email_k) if email_k else None,
+        "phone": row.get(phone_k) if phone_k else None,
+        "status": row.get(_fk(row, ["status", "estado"])) if _fk(row, ["status", "estado"]) else None,
+        "raw": {_normalize_key(k): v for k, v in row.items()},
+    }
+    if not mapped["id"]:
+        mapped["id"] = _fallback_id(row)
+    return mapped
+
+
+def legacy_map_payment(row: Dict[str, Any]) -> Dict[str, Any]:
+    def norm_val(v):
+        if v is None:
+            return None
+        if isinstance(v, (list, dict)):
+            return json.dumps(v, ensure_ascii=False, sort_keys=True)
+        return str(v)
+
+    mapped = {
+        "id": norm_val(row.get(_fk(row, ["payment_id", "id", "ID"]))),
+        "appointment_id": norm_val(row.get(_fk(row, ["appointment_id", "appointmentid", "booking_id", "bookingid"]))),
+        "amount": norm_val(row.get(_fk(row, ["amount", "total", "monto"]))),
+        "currency": norm_val(row.get(_fk(row, ["currency", "moneda"]))),
+        "status": norm_val(row.get(_fk(row, ["status", "estado"]))),
+        "method": norm_val(row.get(_fk(row, ["method", "metodo"]))),
+        "paid_at": norm_val(row.get(_fk(row, ["date", "paid_at", "fecha"]))),
+        "raw": {_normalize_key(k): v for k, v in row.items()},
+    }
+    if not mapped["id"]:
+        mapped["id"] = _fallback_id(row)
+    return mapped
+
+
+def legacy_best_effort_map(row: Dict[str, Any]) -> Dict[str, Any]:
+    email_k = _fk(row, ["email", "correo", "e-mail", "mail"])
+    name_k = _fk(row, ["name", "customer", "cliente"])
+    service_k = _fk(row, ["service", "servicio"])
+    start_k = _fk(row, ["start", "fecha", "date", "hora", "start_time"])
+    status_k = _fk(row, ["status", "estado"])
+    id_k = _fk(row, ["appointment_id", "appointmentid", "booking_id", "bookingid", "id", "ID"])
+    raw_id = row.get(id_k) if id_k else None
+    if isinstance(raw_id, str):
+        raw_id = raw_id.strip() or None
+    mapped = {
+        "id": raw_id,
+        "customer_name": row.get(name_k) if name_k else None,
+        "customer_email": row.get(email_k) if email_k else None,
+        "service_name": row.get(service_k) if service_k else None,
+        "starts_at": row.get(start_k) if start_k else None,
+        "status": row.get(status_k) if status_k else None,
+        "raw": {_normalize_key(k): v for k, v in row.items()},
+    }
+    if not mapped["id"]:
+        mapped["id"] = _fallback_id(row)
+    return mapped
+
+
+# --- harness -----------------------------------------------------------------
+
+def load_rows(module: str, n_rows: int) -> List[Dict[str, Any]]:
+    """Rows of the newest downloads/<module>_*.csv, repeated up to n_rows."""
+    path = sorted(DOWNLOADS_DIR.glob(f"{module}_*.csv"))[0]
+    with path.open("r", encoding="utf-8-sig", newline="") as f:
+        sample = [dict(r) for r in csv.DictReader(f)]
+    return [dict(sample[i % len(sample)]) for i in range(n_rows)]
+
+
+def rows_per_sec(fn: Callable[[Dict[str, Any]], Dict[str, Any]], rows: List[Dict[str, Any]]) -> float:
+    start = time.perf_counter()
+    for r in rows:
+        fn(r)
+    return len(rows) / (time.perf_counter() - start)
+
+
+CASES = [
+    ("http _best_map_appointment", "appointments", legacy_map_appointment, booknetic_http_export._best_map_appointment),
+    ("http _best_map_customer", "customers", legacy_map_customer, booknetic_http_export._best_map_customer),
+    ("http _best_map_payment", "payments", legacy_map_payment, booknetic_http_export._best_map_payment),
+    ("adapter _best_effort_map", "appointments", legacy_best_effort_map, booknetic_export_adapter._best_effort_map),
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000)
+    args = parser.parse_args()
+
+    print(f"{'mapper':<28} {'before rows/s':>14} {'after rows/s':>14} {'speedup':>8}")
+    for name, module, before, after in CASES:
+        rows = load_rows(module, args.rows)
+        # Same output, row for row
+        assert [before(r) for r in rows[:500]] == [after(r) for r in rows[:500]], name
+        b = rows_per_sec(before, rows)
+        a = rows_per_sec(after, rows)
+        print(f"{name:<28} {b:>14,.0f} {a:>14,.0f} {a / b:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
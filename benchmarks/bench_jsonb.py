@@ -0,0 +1,149 @@
+"""
+Benchmark: bytes/s of the raw jsonb column through psycopg's parameter
+adaptation, before (Json wrapper, text format, json.dumps per value) vs after
+(db.jsonb: Jsonb in binary format with the fast encoder).
+
+Inputs are the appointments of a synthetic export, mapped with
+jobs.booknetic_export_requests: raw as a dict (the mappers before
+jobs.records) and as a record (key template). Each case dumps the raw values
+of --batch rows at a time the way execute() does, and reports MB/s of wire
+bytes, values/s and the wire size per value. With BENCH_DATABASE_URL set it
+also times INSERTs of the raw column into a temp table.
+
+Ejecuta: python -m benchmarks.bench_jsonb [--rows 50000] [--batch 500]
+"""
+import argparse
+import datetime as dt
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Tuple
+
+import psycopg
+from psycopg import sql
+from psycopg.adapt import PyFormat, Transformer
+from psycopg.types.json import Json, Jsonb
+
+from benchmarks.synthetic import write_csv
+from db import jsonb
+from jobs import booknetic_export_requests as exporter
+from jobs.records import _dump_raw
+
+ANCHOR = dt.datetime(2025, 1, 1, 12, 0)
+
+
+def _default_adapters() -> psycopg.adapt.AdaptersMap:
+    return psycopg.adapt.AdaptersMap(psycopg.adapters)
+
+
+def _fast_adapters() -> psycopg.adapt.AdaptersMap:
+    adapters = psycopg.adapt.AdaptersMap(psycopg.adapters)
+    adapters.register_dumper(Jsonb, jsonb.FastJsonbBinaryDumper)
+    return adapters
+
+
+class Case:
+    """How one variant turns a batch of raws into parameters, and on which adapters."""
+
+    def __init__(self, name: str, source: str, wrap: Callable[[Any], Any], fast: bool, encoder: Optional[str] = None):
+        self.name = name
+        self.source = source  # "dict" | "record"
+        self.wrap = wrap
+        self.fast = fast
+        self.encoder = encoder
+
+    def adapters(self) -> psycopg.adapt.AdaptersMap:
+        return _fast_adapters() if self.fast else _default_adapters()
+
+
+def cases() -> List[Case]:
+    out = [
+        Case("Json(dict) text", "dict", Json, fast=False),
+        Case("Json(record) text", "record", lambda r: Json(r, _dump_raw), fast=False),
+    ]
+    encoders = ["stdlib"] + (["orjson"] if jsonb.orjson is not None else [])
+    for name in encoders:
+        out.append(Case(f"Jsonb(dict) bin {name}", "dict", Jsonb, fast=True, encoder=name))
+    out.append(Case("Jsonb(record) bin", "record", lambda r: Jsonb(r, _dump_raw), fast=True))
+    return out
+
+
+def _batches(values: List[Any], size: int) -> List[List[Any]]:
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+def dump_rate(case: Case, raws: List[Any], batch: int, repeat: int) -> Tuple[float, float, float]:
+    """(MB/s, values/s, bytes/value) dumping ``raws`` in batches, best of ``repeat``."""
+    tx = Transformer(case.adapters())
+    best = float("inf")
+    nbytes = 0
+    for _ in range(repeat):
+        nbytes = 0
+        start = time.perf_counter()
+        for chunk in _batches(raws, batch):
+            params = [case.wrap(r) for r in chunk]
+            dumped = tx.dump_sequence(params, [PyFormat.AUTO] * len(params))
+            nbytes += sum(len(d) for d in dumped)
+        best = min(best, time.perf_counter() - start)
+    return nbytes / best / 1e6, len(raws) / best, nbytes / len(raws)
+
+
+def insert_rate(conninfo: str, case: Case, raws: List[Any], batch: int) -> float:
+    """MB/s of raw inserted into a temp table (wire bytes / wall time)."""
+    with psycopg.connect(conninfo) as conn:
+        if case.fast:
+            jsonb.configure(conn)
+        conn.execute("CREATE TEMP TABLE bench_raw (raw jsonb)")
+        tx = Transformer(conn)
+        nbytes = 0
+        start = time.perf_counter()
+        with conn.cursor() as cur:
+            for chunk in _batches(raws, batch):
+                params = [case.wrap(r) for r in chunk]
+                stmt = sql.SQL("INSERT INTO bench_raw (raw) VALUES {}").format(
+                    sql.SQL(", ").join(sql.SQL("(%s)") for _ in params)
+                )
+                nbytes += sum(len(d) for d in tx.dump_sequence(params, [PyFormat.AUTO] * len(params)))
+                cur.execute(stmt, params)
+        elapsed = time.perf_counter() - start
+        conn.rollback()
+    return nbytes / elapsed / 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    conninfo = os.getenv("BENCH_DATABASE_URL")
+
+    with tempfile.TemporaryDirectory(prefix="hotboat-bench-") as tmp:
+        path = write_csv(Path(tmp) / "appointments.csv", "appointments", args.rows, seed=args.seed, anchor=ANCHOR)
+        records = exporter.map_appointments_to_db(exporter.iter_csv_file(path))
+    sources = {"record": records, "dict": [r.raw() for r in records]}
+
+    print(f"raw column, {len(records):,} appointments, batches of {args.batch}")
+    print(f"{'case':<24} {'MB/s':>8} {'values/s':>11} {'B/value':>8}" + (f" {'insert MB/s':>12}" if conninfo else ""))
+    previous = jsonb.encoder_name()
+    baseline = None
+    try:
+        for case in cases():
+            if case.encoder:
+                jsonb.set_encoder(case.encoder)
+            raws = sources[case.source]
+            mbps, vps, per_value = dump_rate(case, raws, args.batch, args.repeat)
+            baseline = baseline or mbps
+            line = f"{case.name:<24} {mbps:>8.1f} {vps:>11,.0f} {per_value:>8.0f}"
+            if conninfo:
+                line += f" {insert_rate(conninfo, case, raws, args.batch):>12.1f}"
+            print(f"{line}   x{mbps / baseline:.2f}")
+            jsonb.set_encoder(previous)
+    finally:
+        jsonb.set_encoder(previous)
+
+
+if __name__ == "__main__":
+    main()
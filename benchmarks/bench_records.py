@@ -0,0 +1,167 @@
+"""
+Benchmark: memory held by mapped rows, dicts with a per-row raw dict (before)
+vs slotted records with raw aligned to a shared header (after), for the
+jobs.booknetic_export_requests mappers on synthetic exports.
+
+Reports the memory retained by a list of N mapped rows (what map_*_to_db keeps
+alive; the parsed CSV rows are allocated beforehand and not counted), the peak
+while mapping, rows/s, and rows/s encoding the raw jsonb payload (json.dumps
+of the raw dict before, the header's key template after).
+
+Ejecuta: python -m benchmarks.bench_records [--rows 100000]
+"""
+import argparse
+import datetime as dt
+import gc
+import hashlib
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from benchmarks.synthetic import write_csv
+from jobs import booknetic_export_requests as exporter
+from jobs.dates import DateColumnParser
+
+ANCHOR = dt.datetime(2025, 1, 1, 12, 0)
+
+
+# --- before: mappers as they were, one dict (+ raw dict) per row -------------
+
+def legacy_map_customers(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    out = []
+    for row in rows:
+        norm_row = {exporter.normalize_key(k): v for k, v in row.items()}
+        customer_id = norm_row.get("id") or norm_row.get("customer_id")
+        email = norm_row.get("email", "")
+        name = norm_row.get("full_name", "") or norm_row.get("name", "")
+        phone = norm_row.get("phone", "") or norm_row.get("phone_number", "")
+        if not customer_id and email:
+            customer_id = hashlib.sha1(email.encode("utf-8")).hexdigest()[:16]
+        out.append({
+            "id": str(customer_id),
+            "name": name or None,
+            "email": email or None,
+            "phone": phone or None,
+            "raw": norm_row,
+        })
+    return out
+
+
+def legacy_map_appointments(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    parse_date = DateColumnParser()
+    out = []
+    for row in rows:
+        norm_row = {exporter.normalize_key(k): v for k, v in row.items()}
+        customer_name = norm_row.get("customer", "") or norm_row.get("customer_name", "")
+        customer_email = norm_row.get("customer_email", "") or norm_row.get("email", "")
+        service = norm_row.get("service", "") or norm_row.get("service_name", "")
+        date_raw = norm_row.get("date", "") or norm_row.get("start_date", "") or norm_row.get("starts_at", "")
+        status = norm_row.get("status", "")
+        appt_id = norm_row.get("id") or norm_row.get("appointment_id")
+        if not appt_id:
+            appt_id = hashlib.sha1(f"{customer_email}|{date_raw}|{service}".encode("utf-8")).hexdigest()[:16]
+        out.append({
+            "id": str(appt_id),
+            "customer_name": customer_name or None,
+            "customer_email": customer_email or None,
+            "service_name": service or None,
+            "starts_at": parse_date(date_raw) if date_raw else None,
+            "status": status or None,
+            "raw": norm_row,
+        })
+    return out
+
+
+def legacy_map_payments(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Same per-row shape as before (its columns did not match booknetic_payments)
+    parse_date = DateColumnParser()
+    out = []
+    for row in rows:
+        norm_row = {exporter.normalize_key(k): v for k, v in row.items()}
+        customer_name = norm_row.get("customer", "") or norm_row.get("customer_name", "")
+        service = norm_row.get("service", "") or norm_row.get("service_name", "")
+        date_raw = norm_row.get("date", "") or norm_row.get("payment_date", "")
+        amount = norm_row.get("price", "") or norm_row.get("amount", "")
+        status = norm_row.get("payment_status", "") or norm_row.get("status", "")
+        payment_id = norm_row.get("id") or norm_row.get("payment_id")
+        if not payment_id:
+            payment_id = hashlib.sha1(f"{customer_name}|{date_raw}|{amount}".encode("utf-8")).hexdigest()[:16]
+        out.append({
+            "id": str(payment_id),
+            "customer_name": customer_name or None,
+            "service_name": service or None,
+            "date": parse_date(date_raw) if date_raw else None,
+            "amount": float(amount) if amount and amount.replace(".", "").isdigit() else None,
+            "status": status or None,
+            "raw": norm_row,
+        })
+    return out
+
+
+# --- harness -----------------------------------------------------------------
+
+def measure(fn: Callable[[List[Dict[str, Any]]], List[Any]], rows: List[Dict[str, Any]]) -> Tuple[int, int, float]:
+    """(retained KiB, peak KiB, rows/s) of mapping ``rows`` into a list."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        mapped = fn(rows)
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del mapped
+    gc.collect()
+
+    start = time.perf_counter()
+    mapped = fn(rows)
+    elapsed = time.perf_counter() - start
+    del mapped
+    return retained // 1024, peak // 1024, len(rows) / elapsed
+
+
+def encode_rate(encode: Callable[[Any], str], mapped: List[Any]) -> float:
+    start = time.perf_counter()
+    for m in mapped:
+        encode(m)
+    return len(mapped) / (time.perf_counter() - start)
+
+
+CASES = [
+    ("customers", legacy_map_customers, exporter.map_customers_to_db),
+    ("appointments", legacy_map_appointments, exporter.map_appointments_to_db),
+    ("payments", legacy_map_payments, exporter.map_payments_to_db),
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'mapper':<14} {'':>7} {'retained KiB':>13} {'B/row':>7} {'peak KiB':>10} {'rows/s':>10} {'raw json/s':>11}")
+    with tempfile.TemporaryDirectory(prefix="hotboat-bench-") as tmp:
+        for module, before, after in CASES:
+            path = write_csv(Path(tmp) / f"{module}.csv", module, args.rows, seed=args.seed, anchor=ANCHOR)
+            rows = list(exporter.iter_csv_file(path))
+            # Same ids and raw payloads, row for row
+            for old, new in zip(before(rows[:500]), after(rows[:500])):
+                assert old["id"] == new.id and old["raw"] == new.raw(), module
+            results = {}
+            encoders = {"before": lambda m: json.dumps(m["raw"]), "after": lambda m: m.raw_text()}
+            for label, fn in (("before", before), ("after", after)):
+                retained, peak, rps = results[label] = measure(fn, rows)
+                eps = encode_rate(encoders[label], fn(rows))
+                print(
+                    f"{module:<14} {label:>7} {retained:>13,} {retained * 1024 // len(rows):>7,} "
+                    f"{peak:>10,} {rps:>10,.0f} {eps:>11,.0f}"
+                )
+            print(f"{module:<14} {'':>7} {results['after'][0] / results['before'][0]:>12.0%} of before")
+            del rows
+
+
+if __name__ == "__main__":
+    main()
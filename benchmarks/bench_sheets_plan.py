@@ -0,0 +1,139 @@
+"""
+Benchmark: Sheets row processing, per-row config/normalization (before) vs the
+compiled SheetPlan (after), on a synthetic form-responses sheet.
+
+Ejecuta: python -m benchmarks.bench_sheets_plan [--rows 100000]
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from jobs.sheet_plan import SheetPlan
+
+HEADERS = ["Marca temporal", "Nombre Completo", "Correo", "Teléfono", "¿Cuántas personas?", "Fecha tentativa", "Comentarios"]
+
+
+# --- before: job_import_sheets as it was, per record -------------------------
+
+def _map_row_by_headers(headers: List[str], row: List[Any]) -> Dict[str, Any]:
+    values: Dict[str, Any] = {}
+    for i, h in enumerate(headers):
+        key = (h or "").strip().lower().replace(" ", "_")
+        values[key] = row[i] if i < len(row) else None
+    return values
+
+
+def _apply_col_map(record: Dict[str, Any], col_map: Optional[Dict[str, str]]) -> Dict[str, Any]:
+    if not col_map:
+        return record
+    normalized_map: Dict[str, str] = {
+        (k or "").strip().lower().replace(" ", "_"): v for k, v in col_map.items()
+    }
+    result = dict(record)
+    for src_key, dest_key in normalized_map.items():
+        if dest_key in {"id", "name", "email", "phone"} and dest_key not in result:
+            result[dest_key] = record.get(src_key)
+    return result
+
+
+def _ensure_id(record: Dict[str, Any]) -> None:
+    if record.get("id"):
+        return
+    fields_csv = os.getenv("SHEETS_ID_FIELDS", "email,marca_temporal").strip()
+    fields = [f.strip().lower().replace(" ", "_") for f in fields_csv.split(",") if f.strip()]
+    if not fields:
+        return
+    parts: List[str] = []
+    for f in fields:
+        v = record.get(f)
+        parts.append("" if v is None else str(v))
+    raw = "||".join(parts)
+    record["id"] = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def legacy_records(headers: List[str], rows: List[List[Any]]) -> List[Dict[str, Any]]:
+    mapped = [_map_row_by_headers(headers, r) for r in rows]
+    col_map_env = os.getenv("SHEETS_COL_MAP_JSON")
+    col_map = json.loads(col_map_env) if col_map_env else None
+    records = [_apply_col_map(m, col_map) for m in mapped]
+    for rec in records:
+        _ensure_id(rec)
+    if os.getenv("SHEETS_USE_EMAIL_AS_ID", "").strip().lower() in {"1", "true", "yes", "y"}:
+        for rec in records:
+            if not rec.get("id") and rec.get("email"):
+                rec["id"] = rec.get("email")
+    return records
+
+
+def plan_records(headers: List[str], rows: List[List[Any]]) -> List[Dict[str, Any]]:
+    return SheetPlan.from_env(headers).records(rows)
+
+
+# --- harness -----------------------------------------------------------------
+
+def make_rows(n_rows: int, seed: int = 7) -> List[List[Any]]:
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n_rows):
+        row = [
+            f"{rnd.randint(1, 28)}/{rnd.randint(1, 12)}/2025 {rnd.randint(0, 23)}:{rnd.randint(0, 59):02d}:00",
+            f"Cliente {i}",
+            f"cliente{i}@example.com" if rnd.random() > 0.05 else "",
+            f"+569{rnd.randint(10_000_000, 99_999_999)}",
+            str(rnd.randint(1, 8)),
+            f"2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+            "",
+        ]
+        # Google Sheets recorta celdas vacías al final en algunas filas
+        rows.append(row[: rnd.choice((5, 6, 7))])
+    return rows
+
+
+CONFIGS = [
+    ("defaults", {}),
+    ("col map + id fields", {
+        "SHEETS_COL_MAP_JSON": json.dumps({"Nombre Completo": "name", "Correo": "email", "Teléfono": "phone"}),
+        "SHEETS_ID_FIELDS": "correo, marca temporal",
+    }),
+    ("email as id", {"SHEETS_COL_MAP_JSON": json.dumps({"correo": "email"}), "SHEETS_ID_FIELDS": "", "SHEETS_USE_EMAIL_AS_ID": "1"}),
+]
+
+
+def timed(fn: Callable[[List[str], List[List[Any]]], Any], rows: List[List[Any]]) -> float:
+    start = time.perf_counter()
+    fn(HEADERS, rows)
+    return len(rows) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    print(f"{'config':<22} {'before rows/s':>14} {'after rows/s':>14} {'speedup':>8}")
+    for name, env in CONFIGS:
+        saved = {k: os.environ.get(k) for k in ("SHEETS_COL_MAP_JSON", "SHEETS_ID_FIELDS", "SHEETS_USE_EMAIL_AS_ID")}
+        for k in saved:
+            os.environ.pop(k, None)
+        os.environ.update(env)
+        try:
+            # Same output, row for row
+            assert legacy_records(HEADERS, rows[:2000]) == plan_records(HEADERS, rows[:2000]), name
+            b = timed(legacy_records, rows)
+            a = timed(plan_records, rows)
+        finally:
+            for k, v in saved.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+        print(f"{name:<22} {b:>14,.0f} {a:>14,.0f} {a / b:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
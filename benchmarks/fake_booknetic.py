@@ -0,0 +1,387 @@
+"""
+Fake WordPress + Booknetic server (stdlib only) for offline load and latency
+testing of the scrapers.
+
+Implements what the exporters use:
+  - GET/POST /wp-login.php         login form, wordpress_logged_in_* cookie
+  - GET /wp-admin/, profile.php    200 when logged in, 302 to the login otherwise
+  - GET /wp-admin/admin.php?page=booknetic&module=M            admin page with the export link
+  - GET /wp-admin/admin.php?page=booknetic&module=M&action=export
+        synthetic CSV (benchmarks.synthetic) with ETag/Last-Modified and 304 support
+  - GET /__bench/stats, POST /__bench/bump?module=M   counters / change an export
+
+Exports are generated once per (module, rows, seed, version) into a cache dir
+and served from disk, so the download speed measures the client, not the
+generator. Latency and failures can be injected.
+
+Ejecuta:
+  python -m benchmarks.fake_booknetic --rows 100000 --port 8099
+  python -m benchmarks.fake_booknetic --rows 100000 --run requests --run http
+"""
+import argparse
+import email.utils
+import hashlib
+import json
+import os
+import random
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+from urllib.parse import parse_qs, quote, urlsplit
+
+from benchmarks.synthetic import MODULES, write_csv
+
+COOKIE_HASH = hashlib.md5(b"fake-booknetic").hexdigest()
+LOGGED_IN_COOKIE = f"wordpress_logged_in_{COOKIE_HASH}"
+
+
+class FakeBooknetic:
+    """
+    The server, runnable in a background thread::
+
+        with FakeBooknetic(rows=10_000, latency=0.05) as fake:
+            os.environ["BOOKNETIC_URL"] = fake.url
+    """
+
+    def __init__(
+        self,
+        rows: Union[int, Dict[str, int]] = 1000,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        username: str = "bench",
+        password: str = "bench",
+        latency: float = 0.0,
+        export_latency: float = 0.0,
+        fail_rate: float = 0.0,
+        admin_page_kb: int = 200,
+        session_ttl: int = 2 * 24 * 3600,
+        cache_dir: Optional[Path] = None,
+    ):
+        self.rows = rows if isinstance(rows, dict) else {m: rows for m in MODULES}
+        self.seed = seed
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.export_latency = export_latency
+        self.fail_rate = fail_rate
+        self.admin_page_kb = admin_page_kb
+        self.session_ttl = session_ttl
+        self.cache_dir = Path(cache_dir or Path(tempfile.gettempdir()) / "fake_booknetic")
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self.versions = {m: 0 for m in MODULES}
+        self.modified_at = {m: time.time() for m in MODULES}
+        self.sessions: Dict[str, float] = {}  # token -> expiry
+        self.stats: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._rnd = random.Random(seed)
+        self._exports_lock = threading.Lock()
+
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self  # type: ignore[attr-defined]
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeBooknetic":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-booknetic", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "FakeBooknetic":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # -- state --
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + n
+
+    def should_fail(self) -> bool:
+        if self.fail_rate <= 0:
+            return False
+        with self._lock:
+            return self._rnd.random() < self.fail_rate
+
+    def bump(self, module: str) -> None:
+        """Simulate a change in Booknetic: the module's export gets new content and ETag."""
+        with self._lock:
+            self.versions[module] += 1
+            self.modified_at[module] = time.time()
+
+    def etag(self, module: str) -> str:
+        return f'"{module}-{self.rows[module]}-{self.seed}-{self.versions[module]}"'
+
+    def export_path(self, module: str) -> Path:
+        """Generated export for the module's current version (created on first use)."""
+        version = self.versions[module]
+        seed = self.seed + version * 7919
+        path = self.cache_dir / f"{module}_{self.rows[module]}_{seed}_{time.strftime('%Y%m%d')}.csv"
+        with self._exports_lock:
+            if not path.exists():
+                tmp = path.with_suffix(".tmp")
+                write_csv(tmp, module, self.rows[module], seed=seed)
+                tmp.replace(path)
+        return path
+
+    def new_session(self) -> str:
+        token = secrets.token_hex(16)
+        with self._lock:
+            self.sessions[token] = time.time() + self.session_ttl
+        return token
+
+    def valid_session(self, token: Optional[str]) -> bool:
+        with self._lock:
+            return bool(token) and self.sessions.get(token, 0) > time.time()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "Apache"
+
+    @property
+    def fake(self) -> FakeBooknetic:
+        return self.server.fake  # type: ignore[attr-defined]
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass
+
+    # -- helpers --
+
+    def _send(self, status: int, body: bytes = b"", content_type: str = "text/html; charset=UTF-8", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+        self.fake.count("bytes_out", len(body))
+
+    def _redirect(self, location: str, headers=None) -> None:
+        self._send(302, b"", headers={"Location": location, **(headers or {})})
+
+    def _session_token(self) -> Optional[str]:
+        cookie = SimpleCookie(self.headers.get("Cookie") or "")
+        morsel = cookie.get(LOGGED_IN_COOKIE)
+        if morsel is None:
+            return None
+        parts = morsel.value.replace("%7C", "|").split("|")
+        return parts[2] if len(parts) >= 4 else None
+
+    def _logged_in(self) -> bool:
+        return self.fake.valid_session(self._session_token())
+
+    def _login_page(self, error: str = "") -> bytes:
+        err = f'<div id="login_error"><strong>Error:</strong> {error}</div>' if error else ""
+        return (
+            '<!DOCTYPE html><html><body class="login">'
+            f"{err}"
+            '<form name="loginform" id="loginform" action="/wp-login.php" method="post">'
+            '<input type="text" name="log"><input type="password" name="pwd">'
+            '<input type="submit" name="wp-submit" value="Log In"></form></body></html>'
+        ).encode("utf-8")
+
+    # -- routes --
+
+    def do_GET(self) -> None:  # noqa: N802
+        parts = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        fake = self.fake
+        fake.count("requests")
+
+        if parts.path == "/__bench/stats":
+            body = json.dumps({"stats": fake.stats, "versions": fake.versions}).encode("utf-8")
+            return self._send(200, body, "application/json")
+
+        if fake.latency:
+            time.sleep(fake.latency)
+
+        if parts.path == "/wp-login.php":
+            fake.count("login_page")
+            return self._send(200, self._login_page(), headers={"Set-Cookie": "wordpress_test_cookie=WP%20Cookie%20check; path=/"})
+
+        if not parts.path.startswith("/wp-admin"):
+            return self._send(200, b"<!DOCTYPE html><html><body>HotBoat</body></html>")
+
+        if not self._logged_in():
+            fake.count("unauthenticated")
+            return self._redirect(f"/wp-login.php?redirect_to={quote(self.path, safe='')}&reauth=1")
+
+        if parts.path == "/wp-admin/profile.php":
+            fake.count("profile")
+            return self._send(200, b"<!DOCTYPE html><html><body>Profile</body></html>")
+
+        if parts.path == "/wp-admin/admin.php" and query.get("page") == "booknetic":
+            module = query.get("module", "")
+            if fake.should_fail():
+                fake.count("failures")
+                return self._send(503, b"<!DOCTYPE html><html><body>Service Unavailable</body></html>")
+            if module in MODULES and query.get("action") == "export":
+                return self._export(module)
+            if module in MODULES:
+                fake.count("admin_page")
+                return self._send(200, self._admin_page(module))
+
+        fake.count("admin_other")
+        return self._send(200, b"<!DOCTYPE html><html><body>Dashboard</body></html>")
+
+    def do_POST(self) -> None:  # noqa: N802
+        parts = urlsplit(self.path)
+        fake = self.fake
+        fake.count("requests")
+        length = int(self.headers.get("Content-Length") or 0)
+        form = {k: v[-1] for k, v in parse_qs(self.rfile.read(length).decode("utf-8")).items()}
+
+        if parts.path == "/__bench/bump":
+            module = parse_qs(parts.query).get("module", [""])[-1]
+            if module not in MODULES:
+                return self._send(400, b"unknown module", "text/plain")
+            fake.bump(module)
+            return self._send(200, b"ok", "text/plain")
+
+        if fake.latency:
+            time.sleep(fake.latency)
+
+        if parts.path == "/wp-login.php":
+            fake.count("login_post")
+            if form.get("log") != fake.username or form.get("pwd") != fake.password:
+                return self._send(200, self._login_page("The password you entered is incorrect."))
+            token = fake.new_session()
+            expiry = int(time.time()) + fake.session_ttl
+            mac = hashlib.sha256(f"{form['log']}|{expiry}|{token}".encode("utf-8")).hexdigest()
+            value = quote(f"{form['log']}|{expiry}|{token}|{mac}", safe="")
+            cookie = f"{LOGGED_IN_COOKIE}={value}; path=/; HttpOnly"
+            return self._redirect(form.get("redirect_to") or "/wp-admin/", headers={"Set-Cookie": cookie})
+
+        return self._send(404, b"<!DOCTYPE html><html><body>Not found</body></html>")
+
+    def _admin_page(self, module: str) -> bytes:
+        link = f"/wp-admin/admin.php?page=booknetic&module={module}&action=export"
+        filler = "<!-- " + "x" * max(0, self.fake.admin_page_kb * 1024 - 200) + " -->"
+        return (
+            f'<!DOCTYPE html><html><body><div class="booknetic_{module}">'
+            f'<a class="btn export" href="{link}">Export</a></div>{filler}</body></html>'
+        ).encode("utf-8")
+
+    def _export(self, module: str) -> None:
+        fake = self.fake
+        etag = fake.etag(module)
+        last_modified = email.utils.formatdate(fake.modified_at[module], usegmt=True)
+        if self.headers.get("If-None-Match") == etag:
+            fake.count("export_304")
+            return self._send(304, b"", headers={"ETag": etag, "Last-Modified": last_modified})
+
+        if fake.export_latency:
+            time.sleep(fake.export_latency)
+        path = fake.export_path(module)
+        size = path.stat().st_size
+        fake.count("export")
+        fake.count("bytes_out", size)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv; charset=UTF-8")
+        self.send_header("Content-Disposition", f'attachment; filename="{module}.csv"')
+        self.send_header("Content-Length", str(size))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.end_headers()
+        with path.open("rb") as f:
+            shutil.copyfileobj(f, self.wfile, 64 * 1024)
+
+
+# --- end-to-end drivers ------------------------------------------------------
+
+def _consume(result: Dict[str, Any]) -> Dict[str, int]:
+    """Drain the (possibly lazy) entity iterators returned by a fetch()."""
+    return {m: sum(1 for _ in (result.get(m) or [])) for m in MODULES}
+
+
+def run_client(kind: str, fake: FakeBooknetic) -> Dict[str, Any]:
+    """Run one exporter's fetch() end to end against ``fake`` and time it."""
+    os.environ.update(
+        BOOKNETIC_URL=fake.url,
+        BOOKNETIC_USERNAME=fake.username,
+        BOOKNETIC_PASSWORD=fake.password,
+    )
+    os.environ.setdefault("BOOKNETIC_DOWNLOADS_DIR", str(fake.cache_dir / "downloads"))
+    if kind == "requests":
+        from jobs import booknetic_export_requests as exporter
+    else:
+        from plugins import booknetic_http_export as exporter
+    before = dict(fake.stats)
+    start = time.perf_counter()
+    rows = _consume(exporter.fetch())
+    elapsed = time.perf_counter() - start
+    total = sum(rows.values())
+    requests_made = {k: v - before.get(k, 0) for k, v in fake.stats.items() if v != before.get(k, 0)}
+    return {
+        "client": kind,
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(total / elapsed) if elapsed else None,
+        "server": requests_made,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="rows per module export (1k-1M)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--export-latency", type=float, default=0.0, help="extra seconds before an export body")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of admin/export requests answered 503")
+    parser.add_argument("--admin-page-kb", type=int, default=200)
+    parser.add_argument("--cache-dir", type=Path, default=None)
+    parser.add_argument("--run", action="append", choices=("requests", "http"), default=[],
+                        help="run an exporter end to end against the server and exit (repeatable)")
+    args = parser.parse_args()
+
+    fake = FakeBooknetic(
+        rows=args.rows,
+        seed=args.seed,
+        host=args.host,
+        port=0 if args.run else args.port,
+        latency=args.latency,
+        export_latency=args.export_latency,
+        fail_rate=args.fail_rate,
+        admin_page_kb=args.admin_page_kb,
+        cache_dir=args.cache_dir,
+    )
+    for module in MODULES:
+        fake.export_path(module)  # generate up front, not during the first download
+
+    if not args.run:
+        print(f"[fake-booknetic] serving {fake.url} rows={fake.rows} user={fake.username}/{fake.password}")
+        try:
+            fake.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    with fake:
+        results = [run_client(kind, fake) for kind in args.run]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
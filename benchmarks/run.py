@@ -0,0 +1,376 @@
+"""
+Benchmark suite for the ETL hot paths, with a regression check against a
+stored baseline.
+
+Cases (on synthetic exports from benchmarks.synthetic, real header layouts):
+  csv:<module>              iter_csv_file over the export on disk
+  map:<module>              jobs.booknetic_export_requests iter_map_* mappers
+  best_map:<module>         plugins.booknetic_http_export _best_map_* mappers
+  dates:flexible / dates:column   parse_date_flexible / DateColumnParser
+  ids:with_ids / ids:fallback     job_scrape_booknetic._with_ids / HeaderPlan.fallback_id
+  upsert:values / upsert:copy / upsert:unchanged
+                            db.utils.upsert_many into a scratch table, only when
+                            BENCH_DATABASE_URL points at a PostgreSQL to write to
+
+For every case and size it reports rows/s (best of --repeat), peak traced
+memory (a separate tracemalloc pass) and p50/p95 latency per batch of --batch
+rows. With a baseline file, rows/s below ``baseline * (1 - tolerance)`` or peak
+memory above ``baseline * (1 + tolerance)`` is a regression (exit status 1).
+The baseline is machine-specific and not committed: its meta records the
+machine it was taken on. Without one the run fails (exit status 2) before
+benchmarking, unless --allow-missing-baseline skips the check explicitly.
+
+Ejecuta:
+  python -m benchmarks.run --save-baseline          # guarda benchmarks/baseline.json
+  python -m benchmarks.run                          # compara contra el baseline
+  python -m benchmarks.run --allow-missing-baseline # solo mide si no hay baseline
+  python -m benchmarks.run --sizes 1000,100000 -k map --tolerance 0.2
+"""
+import argparse
+import contextlib
+import datetime as dt
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional
+
+from benchmarks.synthetic import MODULES, write_csv
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+DEFAULT_TOLERANCE = float(os.getenv("BENCH_TOLERANCE", "0.15"))
+# Differences in peak memory below this are noise, whatever the tolerance
+PEAK_NOISE_KB = 256
+
+# Fixed anchor so the generated data does not change from day to day
+ANCHOR = dt.datetime(2025, 1, 1, 12, 0)
+
+SCRATCH_TABLE = "bench_booknetic_appointments"
+SCRATCH_DDL = f"""
+CREATE TABLE IF NOT EXISTS {SCRATCH_TABLE} (
+    id text primary key,
+    customer_name text,
+    customer_email text,
+    service_name text,
+    starts_at timestamptz,
+    status text,
+    raw jsonb,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+)
+"""
+APPOINTMENT_UPDATE_COLUMNS = ["customer_name", "customer_email", "service_name", "starts_at", "status", "raw"]
+
+
+class Dataset:
+    """Inputs for one size: the exports on disk, parsed rows and derived lists."""
+
+    def __init__(self, size: int, workdir: Path, seed: int = 0, batch_size: int = 1000):
+        from jobs.booknetic_export_requests import iter_csv_file, iter_map_appointments
+
+        self.size = size
+        self.batch_size = batch_size
+        self.paths = {m: write_csv(workdir / f"{m}_{size}.csv", m, size, seed=seed, anchor=ANCHOR) for m in MODULES}
+        self.rows = {m: list(iter_csv_file(p)) for m, p in self.paths.items()}
+        self.appointments = list(iter_map_appointments(self.rows["appointments"]))
+        self.start_dates = [r["START DATE"] for r in self.rows["appointments"]]
+
+
+class Case(NamedTuple):
+    name: str
+    # Fresh iterator over the case's output for a dataset; timing is per item pulled
+    make_iter: Callable[[Dataset], Iterator[Any]]
+    setup: Optional[Callable[[], None]] = None
+    needs_db: bool = False
+
+
+# --- cases -------------------------------------------------------------------
+
+def _csv_case(module: str) -> Case:
+    def make_iter(data: Dataset) -> Iterator[Any]:
+        from jobs.booknetic_export_requests import iter_csv_file
+        return iter_csv_file(data.paths[module])
+    return Case(f"csv:{module}", make_iter)
+
+
+def _map_case(module: str) -> Case:
+    def make_iter(data: Dataset) -> Iterator[Any]:
+        from jobs import booknetic_export_requests as exporter
+        return getattr(exporter, f"iter_map_{module}")(data.rows[module])
+    return Case(f"map:{module}", make_iter)
+
+
+def _best_map_case(module: str) -> Case:
+    def make_iter(data: Dataset) -> Iterator[Any]:
+        from plugins import booknetic_http_export as plugin
+        mapper = getattr(plugin, f"_best_map_{module[:-1]}")
+        return (mapper(r) for r in data.rows[module])
+    return Case(f"best_map:{module}", make_iter)
+
+
+def _dates_flexible(data: Dataset) -> Iterator[Any]:
+    from jobs import dates
+    dates._parse_cached.cache_clear()
+    return (dates.parse_date_flexible(v) for v in data.start_dates)
+
+
+def _dates_column(data: Dataset) -> Iterator[Any]:
+    from jobs.dates import DateColumnParser
+    parse = DateColumnParser()
+    return (parse(v) for v in data.start_dates)
+
+
+def _ids_with_ids(data: Dataset) -> Iterator[Any]:
+    from jobs.job_scrape_booknetic import _with_ids
+    fields = ("customer_email", "starts_at", "service_name")
+    # Copies without id, made before timing starts
+    rows = [{f: r[f] for f in fields} for r in data.appointments]
+    return _with_ids(rows, fields)
+
+
+def _ids_fallback(data: Dataset) -> Iterator[Any]:
+    from plugins.booknetic_http_export import APPOINTMENT_FIELDS
+    from plugins.header_plan import plan_for_row
+    rows = data.rows["appointments"]
+    plan = plan_for_row(rows[0], APPOINTMENT_FIELDS)
+    values = [list(r.values()) for r in rows]
+    return (plan.fallback_id(v) for v in values)
+
+
+def _truncate_scratch() -> None:
+    from db.connection import get_connection
+    with get_connection() as conn:
+        conn.execute(SCRATCH_DDL)
+        conn.execute(f"TRUNCATE {SCRATCH_TABLE}")
+        conn.commit()
+
+
+def _upserted(rows: List[Dict[str, Any]], batch_size: int, method: str) -> Iterator[Any]:
+    """Upsert ``rows`` one batch per upsert_many call, yielding rows as they are written."""
+    from db.utils import upsert_many
+    it = iter(rows)
+    while True:
+        batch = list(itertools.islice(it, batch_size))
+        if not batch:
+            return
+        upsert_many(SCRATCH_TABLE, batch, ["id"], APPOINTMENT_UPDATE_COLUMNS, method=method, only_changed=True)
+        yield from batch
+
+
+def _upsert_case(name: str, method: str, truncate: bool) -> Case:
+    def make_iter(data: Dataset) -> Iterator[Any]:
+        return _upserted(data.appointments, data.batch_size, method)
+
+    def setup() -> None:
+        # unchanged: the rows are already there from a previous pass
+        if truncate:
+            _truncate_scratch()
+    return Case(name, make_iter, setup, needs_db=True)
+
+
+CASES: List[Case] = (
+    [_csv_case(m) for m in MODULES]
+    + [_map_case(m) for m in MODULES]
+    + [_best_map_case(m) for m in MODULES]
+    + [
+        Case("dates:flexible", _dates_flexible),
+        Case("dates:column", _dates_column),
+        Case("ids:with_ids", _ids_with_ids),
+        Case("ids:fallback", _ids_fallback),
+        _upsert_case("upsert:values", "values", truncate=True),
+        _upsert_case("upsert:copy", "copy", truncate=True),
+        _upsert_case("upsert:unchanged", "auto", truncate=False),
+    ]
+)
+
+
+# --- harness -----------------------------------------------------------------
+
+def _percentile(values: List[float], q: float) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+def _timed_pass(case: Case, data: Dataset, batch_size: int) -> List[float]:
+    """Seconds per batch of ``batch_size`` items pulled from the case's iterator."""
+    if case.setup:
+        case.setup()
+    it = case.make_iter(data)
+    batches: List[float] = []
+    clock = time.perf_counter
+    while True:
+        start = clock()
+        n = len(deque(itertools.islice(it, batch_size), maxlen=batch_size))
+        elapsed = clock() - start
+        if not n:
+            return batches
+        batches.append(elapsed)
+
+
+def _peak_kb(case: Case, data: Dataset, batch_size: int) -> int:
+    """Peak memory traced while running the case (inputs already allocated are excluded)."""
+    if case.setup:
+        case.setup()
+    tracemalloc.start()
+    try:
+        it = case.make_iter(data)
+        while deque(itertools.islice(it, batch_size), maxlen=1):
+            pass
+        return tracemalloc.get_traced_memory()[1] // 1024
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(case: Case, data: Dataset, batch_size: int, repeat: int) -> Dict[str, Any]:
+    # Progress prints of the code under test (e.g. "[db] ... merged via COPY") go nowhere
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        _timed_pass(case, data, batch_size)  # warm-up: imports, plan caches, connections
+        passes = [_timed_pass(case, data, batch_size) for _ in range(repeat)]
+        peak_kb = _peak_kb(case, data, batch_size)
+    best = min(passes, key=sum)
+    all_batches = [b for p in passes for b in p]
+    seconds = sum(best)
+    return {
+        "rows": data.size,
+        "seconds": round(seconds, 4),
+        "rows_per_sec": round(data.size / seconds) if seconds else None,
+        "peak_kb": peak_kb,
+        "p50_ms": round(_percentile(all_batches, 50) * 1000, 3),
+        "p95_ms": round(_percentile(all_batches, 95) * 1000, 3),
+    }
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    """Regression messages for results worse than the baseline beyond ``tolerance``."""
+    regressions = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if base.get("rows_per_sec") and cur["rows_per_sec"] < base["rows_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{key}: rows/s {cur['rows_per_sec']:,} < baseline {base['rows_per_sec']:,} "
+                f"({cur['rows_per_sec'] / base['rows_per_sec'] - 1:+.0%})"
+            )
+        if base.get("peak_kb") is not None and cur["peak_kb"] > base["peak_kb"] * (1 + tolerance) \
+                and cur["peak_kb"] - base["peak_kb"] > PEAK_NOISE_KB:
+            regressions.append(f"{key}: peak {cur['peak_kb']:,} KiB > baseline {base['peak_kb']:,} KiB")
+    return regressions
+
+
+def _delta(cur: Dict[str, Any], base: Optional[Dict[str, Any]]) -> str:
+    if not base or not base.get("rows_per_sec"):
+        return ""
+    return f"{cur['rows_per_sec'] / base['rows_per_sec'] - 1:+.0%}"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,50000", help="comma-separated row counts")
+    parser.add_argument("--batch", type=int, default=1000, help="rows per latency sample (and per upsert call)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes per case; rows/s is the best one")
+    parser.add_argument("-k", dest="only", action="append", default=[], help="only cases whose name contains this (repeatable)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument(
+        "--allow-missing-baseline", action="store_true", help="without a baseline, report results and skip the regression check"
+    )
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed regression, e.g. 0.15 = 15%%")
+    parser.add_argument("--json", type=Path, default=None, help="also write the results to this file")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    cases = [c for c in CASES if not args.only or any(k in c.name for k in args.only)]
+
+    bench_db = os.getenv("BENCH_DATABASE_URL")
+    if bench_db:
+        # upsert_many goes through db.connection's pool, which reads DATABASE_URL
+        os.environ["DATABASE_URL"] = bench_db
+    else:
+        skipped = [c.name for c in cases if c.needs_db]
+        if skipped:
+            print(f"[bench] BENCH_DATABASE_URL not set, skipping {', '.join(skipped)}")
+        cases = [c for c in cases if not c.needs_db]
+
+    baseline: Dict[str, Dict[str, Any]] = {}
+    if not args.save_baseline:
+        if args.baseline.exists():
+            stored = json.loads(args.baseline.read_text(encoding="utf-8"))
+            baseline = stored.get("results", {})
+            meta = stored.get("meta", {})
+            print(
+                f"[bench] baseline {args.baseline} from {meta.get('created_at', '?')} on "
+                f"{meta.get('platform', '?')}, {meta.get('cpus', '?')} CPU(s), Python {meta.get('python', '?')}"
+            )
+        elif args.allow_missing_baseline:
+            print(f"[bench] no baseline at {args.baseline}: regression check SKIPPED")
+        else:
+            print(
+                f"[bench] ERROR: no baseline at {args.baseline}. Create one on this machine with "
+                f"--save-baseline, or pass --allow-missing-baseline to only measure"
+            )
+            return 2
+
+    results: Dict[str, Dict[str, Any]] = {}
+    print(f"{'case':<22} {'rows':>8} {'rows/s':>12} {'peak KiB':>10} {'p50 ms':>9} {'p95 ms':>9} {'vs base':>8}")
+    with tempfile.TemporaryDirectory(prefix="hotboat-bench-") as tmp:
+        for size in sizes:
+            data = Dataset(size, Path(tmp), seed=args.seed, batch_size=args.batch)
+            for case in cases:
+                key = f"{case.name}@{size}"
+                res = results[key] = run_case(case, data, args.batch, args.repeat)
+                print(
+                    f"{case.name:<22} {size:>8} {res['rows_per_sec']:>12,} {res['peak_kb']:>10,} "
+                    f"{res['p50_ms']:>9.3f} {res['p95_ms']:>9.3f} {_delta(res, baseline.get(key)):>8}"
+                )
+            del data
+
+    if bench_db and any(c.needs_db for c in cases):
+        from db.connection import get_connection
+        with get_connection() as conn:
+            conn.execute(f"DROP TABLE IF EXISTS {SCRATCH_TABLE}")
+            conn.commit()
+
+    payload = {
+        "meta": {
+            "created_at": dt.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpus": os.cpu_count(),
+            "batch": args.batch,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.json:
+        args.json.write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
+    if args.save_baseline:
+        # Merge: a partial run (-k / --sizes) only replaces its own entries
+        previous = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else {}
+        payload["results"] = {**previous.get("results", {}), **results}
+        args.baseline.write_text(json.dumps(payload, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"[bench] baseline written to {args.baseline}")
+        return 0
+
+    if not baseline:
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for msg in regressions:
+        print(f"[bench] REGRESSION {msg}")
+    print(f"[bench] {len(regressions)} regression(s) against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
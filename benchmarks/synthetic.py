@@ -0,0 +1,165 @@
+"""
+Synthetic Booknetic exports with the real column layouts of the CSVs in
+downloads/ (same headers, value formats and fputcsv-style quoting).
+
+Rows are deterministic for a given (module, seed, anchor) and are generated
+lazily, so 1M-row exports can be streamed without holding them in memory.
+Appointment i, payment i and the customer they reference are consistent
+across modules.
+"""
+import datetime as dt
+import random
+import re
+import unicodedata
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+# Exact headers of downloads/<module>_*.csv (BOM included in the files)
+HEADERS = {
+    "appointments": [
+        "ID", "START DATE", "Customer", "Service", "Customer Email", "Customer Phone Number",
+        "STAFF", "SERVICE", "PAYMENT", "DURATION", "   ", "", "", "Terms &amp; Conditions", " ", "CREATED AT",
+    ],
+    "customers": ["First name", "Last name", "Email", "PHONE", "LAST APPOINTMENT", "Date of birth", "Note"],
+    "payments": [
+        "ID", "APPOINTMENT DATE", "Customer", "Customer Email", "Customer Phone Number", "STAFF",
+        "SERVICE", "METHOD", "TOTAL AMOUNT", "PAID AMOUNT", "DUE AMOUNT", "STATUS",
+    ],
+}
+MODULES = tuple(HEADERS)
+
+FIRST_NAMES = ["Camila", "Paulina", "Belén", "Gabriela", "Carlos", "Javiera", "Dinko", "Sacha", "Matías", "Fernanda", "José", "Ignacia"]
+LAST_NAMES = ["Rivas", "Ramos", "Orellana", "Moscoso", "Sanchez", "Berroeta", "Damjanic", "González", "Muñoz", "Rojas"]
+STAFF = ["RUKAPILLAN"] * 18 + ["Newen", "RUKAPILLLAN 2"]
+TRIPS = [(2, 69990), (3, 54990), (4, 44990), (5, 38990), (6, 32990), (7, 29990)]
+EXTRAS = [
+    "Romantic [ Quantity: 1 | Price: $20.000 | Duration: 0 ]",
+    "Personalized Profesional Edited Video (15 seconds) [ Quantity: 1 | Price: $30.000 | Duration: 0 ]",
+    "Sharing Platter 1 [ Quantity: 1 | Price: $20.000 | Duration: 0 ]",
+    "Rent a Towel [ Quantity: 2 | Price: $5.000 | Duration: 0 ]",
+]
+METHODS = ["WooCommerce", "WooCommerce", "Pay in Person"]
+STATUSES = ["Paid"] * 7 + ["Paid (deposit)", "Pending", "Not paid"]
+TERMS = "I have read and accept the terms and conditions"
+
+# fputcsv encloses fields containing any of these
+_needs_quotes = re.compile(r'[,"\n\r\t ]').search
+
+
+def csv_line(fields: List[str]) -> str:
+    """One CSV line quoted like PHP's fputcsv (the Booknetic exporter)."""
+    return ",".join(
+        '"' + f.replace('"', '""') + '"' if _needs_quotes(f) else f for f in fields
+    ) + "\n"
+
+
+def _money(amount: int) -> str:
+    # Chilean format: $139.980
+    return "$" + f"{amount:,}".replace(",", ".")
+
+
+def _ascii(s: str) -> str:
+    return unicodedata.normalize("NFKD", s).encode("ascii", "ignore").decode("ascii")
+
+
+_FIRST_ASCII = [_ascii(n).lower() for n in FIRST_NAMES]
+_LAST_ASCII = [_ascii(n).lower() for n in LAST_NAMES]
+
+
+def _customer(k: int):
+    fi = k % len(FIRST_NAMES)
+    li = (k // len(FIRST_NAMES)) % len(LAST_NAMES)
+    email = f"{_FIRST_ASCII[fi]}.{_LAST_ASCII[li]}{k}@example.com"
+    phone = f"+569{(k * 7919) % 100_000_000:08d}"
+    return FIRST_NAMES[fi], LAST_NAMES[li], email, phone
+
+
+def _fmt(d: dt.datetime) -> str:
+    return f"{d.day:02d}/{d.month:02d}/{d.year} {d.hour:02d}:{d.minute:02d}"
+
+
+def _bookings(n_rows: int, seed: int, anchor: dt.datetime) -> Iterator[tuple]:
+    """
+    Shared stream behind appointments and payments: every random draw for both
+    modules happens here, in the same order, so row i matches across modules.
+    """
+    rnd = random.Random(seed)
+    r = rnd.random
+    n_customers = max(1, n_rows // 2)
+    midnight = anchor.replace(hour=0, minute=0)
+    hours = (10, 13, 16, 19)
+    for i in range(n_rows):
+        # ~2 years of history plus ~6 months of upcoming bookings
+        start = midnight + dt.timedelta(days=int(r() * 911) - 730, hours=hours[int(r() * 4)])
+        created = start - dt.timedelta(minutes=int(r() * 86_400))
+        people, price = TRIPS[int(r() * len(TRIPS))]
+        extras = ""
+        if r() < 0.25:
+            extras = " ; ".join(rnd.sample(EXTRAS, 1 + int(r() * 2)))
+        yield (
+            str(56 + i),
+            _fmt(start),
+            _fmt(created),
+            _customer(int(r() * n_customers)),
+            STAFF[int(r() * len(STAFF))],
+            f"HotBoat Trip {people} people ({price // 1000}.{price % 1000:03d} pp)",
+            people * price,
+            extras,
+            METHODS[int(r() * len(METHODS))],
+            STATUSES[int(r() * len(STATUSES))],
+        )
+
+
+def iter_rows(module: str, n_rows: int, seed: int = 0, anchor: Optional[dt.datetime] = None) -> Iterator[List[str]]:
+    """Data rows (without header) of a synthetic ``module`` export."""
+    if module not in HEADERS:
+        raise ValueError(f"unknown module {module!r}; expected one of {MODULES}")
+    anchor = (anchor or dt.datetime.now()).replace(second=0, microsecond=0)
+
+    if module == "customers":
+        rnd = random.Random(seed)
+        for k in range(n_rows):
+            first, last, email, phone = _customer(k)
+            last_appt = "-" if rnd.random() < 0.4 else (anchor - dt.timedelta(days=rnd.randint(0, 730))).strftime("%d/%m/%Y")
+            yield [first, last, email, phone, last_appt, "-", "-"]
+        return
+
+    for appt_id, start, created, customer, staff, service, total, extras, method, status in _bookings(n_rows, seed, anchor):
+        first, last, email, phone = customer
+        if module == "appointments":
+            yield [
+                appt_id, start, f"{first} {last}", extras, email, phone,
+                staff, service, _money(total), "2h", "", "", "", "", TERMS, created,
+            ]
+        else:
+            paid = total if status == "Paid" else (total // 2 if status == "Paid (deposit)" else 0)
+            yield [
+                appt_id, start, f"{first} {last}", email, phone, staff,
+                service, method, _money(total), _money(paid), _money(total - paid), status,
+            ]
+
+
+def iter_csv_chunks(
+    module: str,
+    n_rows: int,
+    seed: int = 0,
+    anchor: Optional[dt.datetime] = None,
+    chunk_rows: int = 2000,
+) -> Iterator[bytes]:
+    """The export as UTF-8 (with BOM) byte chunks of ``chunk_rows`` rows each."""
+    buf = ["\ufeff" + csv_line(HEADERS[module])]
+    for row in iter_rows(module, n_rows, seed, anchor):
+        buf.append(csv_line(row))
+        if len(buf) >= chunk_rows:
+            yield "".join(buf).encode("utf-8")
+            buf = []
+    if buf:
+        yield "".join(buf).encode("utf-8")
+
+
+def write_csv(path: Path, module: str, n_rows: int, seed: int = 0, anchor: Optional[dt.datetime] = None) -> Path:
+    path = Path(path)
+    with path.open("wb") as f:
+        for chunk in iter_csv_chunks(module, n_rows, seed, anchor):
+            f.write(chunk)
+    return path
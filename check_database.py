@@ -71,16 +71,8 @@ try:
             if missing_tables:
                 print("⚠️  FALTAN TABLAS!")
                 print()
-                print("Para crear las tablas, necesitas ejecutar el schema SQL:")
-                print()
-                print("Opción A: Desde Railway Web Console")
-                print("  1. Ve a PostgreSQL → Data")
-                print("  2. Copia el contenido de sql/schema.sql")
-                print("  3. Pégalo y ejecuta")
-                print()
-                print("Opción B: Desde psql local")
-                print(f'  psql "{DATABASE_URL}" -f sql/schema.sql')
-                print(f'  psql "{DATABASE_URL}" -f sql/job_meta.sql')
+                print("Para crear las tablas, aplica las migraciones de sql/migrations/:")
+                print(f'  DATABASE_URL="{DATABASE_URL}" python -m db.migrate')
                 print()
             else:
                 print("✅ TODAS LAS TABLAS ESTÁN CONFIGURADAS CORRECTAMENTE")
@@ -1,9 +1,11 @@
 import os
 from contextlib import contextmanager
-from typing import Iterator, Optional
+from typing import Dict, Iterator, Optional
 
 from psycopg_pool import ConnectionPool
 
+from db import jsonb
+
 
 _pool: Optional[ConnectionPool] = None
 
@@ -12,8 +14,9 @@ def _create_pool() -> ConnectionPool:
     database_url = os.getenv("DATABASE_URL")
     if not database_url:
         raise RuntimeError("DATABASE_URL no está definido en el entorno")
-    # Default small pool; Railway free tiers are constrained
-    return ConnectionPool(conninfo=database_url, min_size=1, max_size=5, open=True)
+    # Default small pool; Railway free tiers are constrained.
+    # configure: binary jsonb with the fast encoder on every connection (db.jsonb)
+    return ConnectionPool(conninfo=database_url, min_size=1, max_size=5, open=True, configure=jsonb.configure)
 
 
 def get_pool() -> ConnectionPool:
@@ -23,6 +26,11 @@ def get_pool() -> ConnectionPool:
     return _pool
 
 
+def pool_stats() -> Optional[Dict[str, int]]:
+    """psycopg_pool counters (ConnectionPool.get_stats), or None if the pool was never opened."""
+    return _pool.get_stats() if _pool is not None else None
+
+
 @contextmanager
 def get_connection():
     pool = get_pool()
@@ -0,0 +1,241 @@
+"""
+Job-run context: timings and counters for one job execution, written to
+job_runs / job_run_phases.
+
+The run row is inserted when the job starts (status 'running'). Everything
+collected while it runs (phase timings, bytes downloaded, rows
+inserted/updated/unchanged, peak RSS) is written at the end in a single
+pipelined round trip.
+
+The active run is held in a contextvar, so instrumented code calls the
+module-level helpers (phase, add_bytes, add_counts) without threading the run
+through every signature; they are no-ops outside a run. Worker threads must be
+started with contextvars.copy_context().run to report into the run.
+
+Finish hooks (add_finish_hook) see every finished run in-process, e.g. to
+export metrics.
+"""
+import contextvars
+import threading
+import time
+import traceback
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional
+
+from psycopg import Pipeline
+from psycopg.types.json import Jsonb
+
+from db.connection import get_connection
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+
+class PhaseTiming(NamedTuple):
+    name: str
+    started_at: float  # epoch seconds
+    wall_seconds: float
+    cpu_seconds: float  # process CPU (includes worker threads)
+
+
+class TableLoad(NamedTuple):
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    seconds: float = 0.0  # wall time of the upserts, including the lazy map upstream
+
+    @property
+    def rows(self) -> int:
+        return self.inserted + self.updated + self.unchanged
+
+
+class Download(NamedTuple):
+    bytes: int
+    seconds: float  # request start to last byte
+
+
+def peak_rss_kb() -> Optional[int]:
+    """Peak resident set size of this process, in KiB (None if unavailable)."""
+    if resource is None:
+        return None
+    return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+class JobRun:
+    def __init__(self, job_name: str):
+        self.job_name = job_name
+        self.id: Optional[int] = None
+        self.phases: List[PhaseTiming] = []
+        self.bytes_downloaded = 0
+        self.rows_inserted = 0
+        self.rows_updated = 0
+        self.rows_unchanged = 0
+        self.tables: Dict[str, TableLoad] = {}
+        self.downloads: List[Download] = []
+        # Set by finish()
+        self.status = "running"
+        self.row_count: Optional[int] = None
+        self.wall_seconds: Optional[float] = None
+        # Summary set by db.profiling when the run is profiled
+        self.profile: Optional[dict] = None
+        self._lock = threading.Lock()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started_at = time.time()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            timing = PhaseTiming(name, started_at, time.perf_counter() - wall, time.process_time() - cpu)
+            with self._lock:
+                self.phases.append(timing)
+
+    def add_bytes(self, n: int, seconds: Optional[float] = None) -> None:
+        """Count downloaded bytes; with ``seconds`` also record it as one download."""
+        with self._lock:
+            self.bytes_downloaded += n
+            if seconds is not None:
+                self.downloads.append(Download(n, seconds))
+
+    def add_counts(self, counts, table: Optional[str] = None, seconds: float = 0.0) -> None:
+        """Accumulate a db.utils.UpsertCounts (per table too, when given)."""
+        with self._lock:
+            self.rows_inserted += counts.inserted
+            self.rows_updated += counts.updated
+            self.rows_unchanged += counts.unchanged
+            if table is not None:
+                prev = self.tables.get(table, TableLoad())
+                self.tables[table] = TableLoad(
+                    prev.inserted + counts.inserted,
+                    prev.updated + counts.updated,
+                    prev.unchanged + counts.unchanged,
+                    prev.seconds + seconds,
+                )
+
+    def start(self) -> int:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO job_runs (job_name, status, started_at)
+                    VALUES (%s, %s, now())
+                    RETURNING id
+                    """,
+                    (self.job_name, "running"),
+                )
+                self.id = cur.fetchone()[0]
+            conn.commit()
+        return self.id
+
+    def finish(self, row_count: Optional[int] = None, err: Optional[BaseException] = None) -> None:
+        """Write the final status, metrics and phases in one pipelined transaction."""
+        status = "error" if err is not None else "success"
+        error = f"{type(err).__name__}: {err}\n{traceback.format_exc()}" if err is not None else None
+        self.status, self.row_count = status, row_count
+        self.wall_seconds = time.perf_counter() - self._wall_start
+        try:
+            self._write_finish(status, row_count, error)
+        finally:
+            for hook in list(_finish_hooks):
+                try:
+                    hook(self, err)
+                except Exception as e:  # noqa: BLE001
+                    print(f"[job {self.job_name}] finish hook {hook!r} failed: {e}")
+
+    def _write_finish(self, status: str, row_count: Optional[int], error: Optional[str]) -> None:
+        with get_connection() as conn:
+            pipeline = conn.pipeline() if Pipeline.is_supported() else nullcontext()
+            with pipeline:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        UPDATE job_runs
+                        SET status = %s, finished_at = now(), row_count = %s, error = %s,
+                            rows_inserted = %s, rows_updated = %s, rows_unchanged = %s,
+                            bytes_downloaded = %s, peak_rss_kb = %s,
+                            wall_seconds = %s, cpu_seconds = %s, profile = %s
+                        WHERE id = %s
+                        """,
+                        (
+                            status,
+                            row_count,
+                            error,
+                            self.rows_inserted,
+                            self.rows_updated,
+                            self.rows_unchanged,
+                            self.bytes_downloaded,
+                            peak_rss_kb(),
+                            self.wall_seconds,
+                            time.process_time() - self._cpu_start,
+                            Jsonb(self.profile) if self.profile is not None else None,
+                            self.id,
+                        ),
+                    )
+                    if self.phases:
+                        cur.executemany(
+                            """
+                            INSERT INTO job_run_phases
+                                (job_run_id, seq, phase, started_at, wall_seconds, cpu_seconds)
+                            VALUES (%s, %s, %s, to_timestamp(%s), %s, %s)
+                            """,
+                            [
+                                (self.id, i, p.name, p.started_at, p.wall_seconds, p.cpu_seconds)
+                                for i, p in enumerate(self.phases)
+                            ],
+                        )
+            conn.commit()
+
+    def summary(self) -> str:
+        phases = " ".join(f"{p.name}={p.wall_seconds:.2f}s" for p in self.phases)
+        return (
+            f"inserted={self.rows_inserted} updated={self.rows_updated} unchanged={self.rows_unchanged} "
+            f"bytes={self.bytes_downloaded} peak_rss_kb={peak_rss_kb()} {phases}"
+        ).rstrip()
+
+
+_finish_hooks: List[Callable[[JobRun, Optional[BaseException]], None]] = []
+
+
+def add_finish_hook(hook: Callable[[JobRun, Optional[BaseException]], None]) -> None:
+    """Call ``hook(run, err)`` after every run finishes (err is None on success)."""
+    if hook not in _finish_hooks:
+        _finish_hooks.append(hook)
+
+
+_current: contextvars.ContextVar[Optional[JobRun]] = contextvars.ContextVar("job_run", default=None)
+
+
+def current_run() -> Optional[JobRun]:
+    return _current.get()
+
+
+@contextmanager
+def activate(run: JobRun) -> Iterator[JobRun]:
+    token = _current.set(run)
+    try:
+        yield run
+    finally:
+        _current.reset(token)
+
+
+def phase(name: str):
+    """Time a phase of the current run (no-op outside a run)."""
+    run = _current.get()
+    return run.phase(name) if run is not None else nullcontext()
+
+
+def add_bytes(n: int, seconds: Optional[float] = None) -> None:
+    run = _current.get()
+    if run is not None:
+        run.add_bytes(n, seconds)
+
+
+def add_counts(counts, table: Optional[str] = None, seconds: float = 0.0) -> None:
+    run = _current.get()
+    if run is not None:
+        run.add_counts(counts, table, seconds)
@@ -0,0 +1,101 @@
+"""
+jsonb parameters: binary transfer and a pluggable JSON encoder.
+
+configure(conn) is the pool's ``configure`` hook (db.connection). It registers
+FastJsonbBinaryDumper on the connection for psycopg's Jsonb wrapper (and, by
+oid, for jsonb columns in binary COPY), so jsonb values travel in binary format
+and are encoded with the encoder chosen by set_encoder() (DB_JSON_ENCODER):
+  - "orjson": orjson.dumps, when the optional orjson package is installed;
+  - "stdlib": json.dumps, compact;
+  - "auto" (default): orjson if importable, else stdlib.
+A wrapper's own ``dumps`` still wins (e.g. the key template of jobs.records).
+
+Env:
+  DB_FAST_JSONB=0           keep psycopg's default json(b) dumpers
+  DB_JSON_ENCODER=auto|orjson|stdlib
+"""
+import json
+import os
+from typing import Any, Callable, Union
+
+from psycopg import Connection
+from psycopg.types.json import Json, Jsonb, JsonbBinaryDumper
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+FAST_JSONB = os.getenv("DB_FAST_JSONB", "1").strip().lower() in {"1", "true", "yes", "y"}
+ENCODERS = ("auto", "orjson", "stdlib")
+
+# jsonb binary format: a version byte followed by the JSON text
+_VERSION = b"\x01"
+
+
+# json.dumps with non-default arguments builds an encoder per call: build it once
+_stdlib_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return _stdlib_encode(obj).encode()
+
+
+def _orjson_dumps(obj: Any) -> bytes:
+    try:
+        return orjson.dumps(obj)
+    except TypeError:
+        # Non-str keys, ints beyond 64 bits...: what json.dumps accepts
+        return _stdlib_dumps(obj)
+
+
+dumps: Callable[[Any], bytes] = _stdlib_dumps
+
+
+def set_encoder(encoder: Union[str, Callable[[Any], bytes]]) -> None:
+    """Encode jsonb with ``encoder``: one of ENCODERS or a function obj -> bytes."""
+    global dumps
+    if callable(encoder):
+        dumps = encoder
+        return
+    if encoder not in ENCODERS:
+        raise RuntimeError(f"JSON encoder must be one of {ENCODERS}, got {encoder!r}")
+    if encoder == "orjson" and orjson is None:
+        raise RuntimeError("JSON encoder 'orjson' requested but orjson is not installed")
+    dumps = _stdlib_dumps if encoder == "stdlib" or orjson is None else _orjson_dumps
+
+
+def encoder_name() -> str:
+    if dumps is _orjson_dumps:
+        return "orjson"
+    if dumps is _stdlib_dumps:
+        return "stdlib"
+    return getattr(dumps, "__qualname__", repr(dumps))
+
+
+set_encoder(os.getenv("DB_JSON_ENCODER", "auto").strip().lower() or "auto")
+
+
+def encode(obj: Any) -> bytes:
+    """JSON text of ``obj`` as bytes; Json/Jsonb wrappers use their own dumps if they carry one."""
+    if isinstance(obj, (Json, Jsonb)):
+        if obj.dumps is not None:
+            data = obj.dumps(obj.obj)
+            return data.encode() if isinstance(data, str) else data
+        obj = obj.obj
+    return dumps(obj)
+
+
+class FastJsonbBinaryDumper(JsonbBinaryDumper):
+    """Binary jsonb with the module's encoder."""
+
+    def dump(self, obj: Any) -> Any:
+        return _VERSION + encode(obj)
+
+
+def configure(conn: Connection) -> None:
+    """Register the binary jsonb dumper on ``conn`` (pool ``configure`` hook)."""
+    if not FAST_JSONB:
+        return
+    conn.adapters.register_dumper(Jsonb, FastJsonbBinaryDumper)
+
@@ -0,0 +1,215 @@
+"""
+Load coordinator: upsert several tables with one transaction per table.
+
+Modes:
+  - "parallel": one thread and one pool connection per table; each table is
+    loaded in a single transaction and committed when its load finishes. A
+    failing table rolls back alone, the others still commit.
+  - "snapshot": all tables on one connection in one transaction, committed
+    together, so readers see either the previous state of every table or the
+    new state of every table.
+
+Either way readers never see a half-loaded table. Row iterators are consumed
+in the loading thread, so lazy (streaming) inputs must not be shared between
+tables.
+
+load_batches() takes a single stream of record batches (jobs.batches) and
+feeds each table's load through a queue as batches arrive, so loading overlaps
+whatever produces the stream (downloads, CSV parsing).
+"""
+import contextvars
+import itertools
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+
+from psycopg import Connection
+
+from db import job_run
+from db.connection import get_pool
+from db.utils import UpsertCounts, upsert_many_counts
+
+LOAD_MODES = ("parallel", "snapshot")
+
+# Batches a table's queue holds before the producer waits for its load (parallel mode)
+QUEUE_BATCHES = 4
+# Upper bound of tables loaded concurrently by load_batches (one pool connection each)
+MAX_TABLES = 4
+# How often blocked producers/consumers check whether the other side failed
+_POLL_SECONDS = 0.5
+
+
+class TableSpec(NamedTuple):
+    table: str
+    rows: Iterable[Dict[str, Any]]
+    conflict_columns: Sequence[str]
+    update_columns: Sequence[str]
+    only_changed: bool = True
+    name: Optional[str] = None  # label for phases/logs (default: table)
+
+    @property
+    def label(self) -> str:
+        return self.name or self.table
+
+
+def _upsert(spec: TableSpec, conn: Connection) -> UpsertCounts:
+    with job_run.phase(f"load:{spec.label}"):
+        return upsert_many_counts(
+            spec.table,
+            spec.rows,
+            spec.conflict_columns,
+            spec.update_columns,
+            only_changed=spec.only_changed,
+            conn=conn,
+        )
+
+
+def _load_one(spec: TableSpec) -> UpsertCounts:
+    # pool.connection() rolls back if the block raises
+    with get_pool().connection() as conn:
+        counts = _upsert(spec, conn)
+        conn.commit()
+    return counts
+
+
+_END = object()
+
+
+class _Aborted(Exception):
+    """The batch stream failed: the load rolls back."""
+
+
+class _Feed:
+    """Queue between the producer of a batch stream and one loading thread."""
+
+    def __init__(self, maxsize: int):
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize)
+        self._aborted = False
+        self.future: Optional[Future] = None
+
+    def put(self, item: Any) -> None:
+        """Enqueue ``item``; raises the load's error if the consumer already failed."""
+        while True:
+            if self.future is not None and self.future.done():
+                self.future.result()
+                raise RuntimeError("load finished before its input")
+            try:
+                self._queue.put(item, timeout=_POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    def close(self) -> None:
+        self.put(_END)
+
+    def abort(self) -> None:
+        self._aborted = True
+
+    def __iter__(self) -> Iterator[Any]:
+        while True:
+            if self._aborted:
+                raise _Aborted("batch stream failed")
+            try:
+                item = self._queue.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+            if item is _END:
+                return
+            yield item
+
+
+def _load_snapshot(tables: _Feed) -> Dict[str, UpsertCounts]:
+    # Tables arrive in the order of their first batch and are loaded one after
+    # the other on the same connection, committed together
+    results: Dict[str, UpsertCounts] = {}
+    with get_pool().connection() as conn:
+        for spec in tables:
+            results[spec.label] = _upsert(spec, conn)
+        conn.commit()
+    return results
+
+
+def load_batches(batches: Iterable[Any], mode: str = "parallel") -> Dict[str, UpsertCounts]:
+    """
+    Load a stream of record batches and return {entity: UpsertCounts}.
+
+    Each batch has ``.rows`` and a ``.schema`` with entity, table,
+    conflict_columns and update_columns (see jobs.batches.RecordBatch). A
+    table's load starts with its first batch and ends when the stream is
+    exhausted, so batches of different tables may be interleaved.
+
+    parallel: one thread, connection and transaction per table, each queue
+    bounded to QUEUE_BATCHES (the producer waits for a slow load). snapshot:
+    one thread and one transaction; later tables queue up unbounded while the
+    earlier ones load, so streams should be grouped by table.
+
+    If the stream raises, every load rolls back and its error is raised; if a
+    load fails the stream is stopped and the first load error is raised.
+    """
+    if mode not in LOAD_MODES:
+        raise ValueError(f"load mode must be one of {LOAD_MODES}, got {mode!r}")
+    snapshot = mode == "snapshot"
+
+    feeds: Dict[str, _Feed] = {}
+    futures: Dict[str, Future] = {}
+    tables = _Feed(0)
+    executor = ThreadPoolExecutor(max_workers=1 if snapshot else MAX_TABLES, thread_name_prefix="load")
+    if snapshot:
+        # copy_context: phases and counts go to the current job run
+        tables.future = futures["snapshot"] = executor.submit(contextvars.copy_context().run, _load_snapshot, tables)
+
+    source_error: Optional[BaseException] = None
+    try:
+        for batch in batches:
+            schema = batch.schema
+            feed = feeds.get(schema.entity)
+            if feed is None:
+                feed = feeds[schema.entity] = _Feed(0 if snapshot else QUEUE_BATCHES)
+                spec = TableSpec(
+                    schema.table,
+                    itertools.chain.from_iterable(feed),
+                    schema.conflict_columns,
+                    schema.update_columns,
+                    name=schema.entity,
+                )
+                if snapshot:
+                    feed.future = tables.future
+                    tables.put(spec)
+                else:
+                    if len(feeds) > MAX_TABLES:
+                        raise RuntimeError(f"more than {MAX_TABLES} tables in one batch stream")
+                    feed.future = futures[schema.entity] = executor.submit(
+                        contextvars.copy_context().run, _load_one, spec
+                    )
+            feed.put(batch.rows)
+        for feed in feeds.values():
+            feed.close()
+        tables.close()
+    except BaseException as e:  # noqa: BLE001 (re-raised below, after the loads roll back)
+        source_error = e
+        for feed in (tables, *feeds.values()):
+            feed.abort()
+    finally:
+        close = getattr(batches, "close", None)
+        if close is not None:
+            close()
+        executor.shutdown(wait=True)
+
+    results: Dict[str, UpsertCounts] = {}
+    errors: List[BaseException] = []
+    for label, future in futures.items():
+        try:
+            if snapshot:
+                results.update(future.result())
+            else:
+                results[label] = future.result()
+        except _Aborted:
+            print(f"[load] {label} rolled back: batch stream failed")
+        except Exception as e:  # noqa: BLE001
+            print(f"[load] {label} rolled back: {e}")
+            errors.append(e)
+    if errors:
+        raise errors[0]
+    if source_error is not None:
+        raise source_error
+    return results
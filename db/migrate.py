@@ -1,132 +1,103 @@
+"""
+Versioned schema migrations.
+
+Migrations are the ordered files in sql/migrations/ (NNNN_name.sql). Applied
+versions and their SHA-256 are recorded in the schema_migrations ledger, so on
+a normal boot ensure_schema is a single SELECT. Pending migrations run in one
+transaction under an advisory lock, so concurrent replicas don't race.
+
+Ejecuta: python -m db.migrate
+"""
+import hashlib
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+from psycopg import errors
+
 from db.connection import get_connection
 
 
+MIGRATIONS_DIR = Path(__file__).parent.parent / "sql" / "migrations"
+
+# pg_advisory_xact_lock key shared by every replica running migrations
+MIGRATION_LOCK_KEY = 7_264_817_042
+
+
+class Migration(NamedTuple):
+    version: str
+    name: str
+    sql: str
+    checksum: str
+
+
+def load_migrations() -> List[Migration]:
+    migrations: List[Migration] = []
+    for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+        version, _, name = path.stem.partition("_")
+        text = path.read_text(encoding="utf-8")
+        checksum = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        migrations.append(Migration(version, name, text, checksum))
+    return migrations
+
+
+def _pending(migrations: List[Migration], applied: Dict[str, str]) -> List[Migration]:
+    pending: List[Migration] = []
+    for m in migrations:
+        checksum = applied.get(m.version)
+        if checksum is None:
+            pending.append(m)
+        elif checksum != m.checksum:
+            raise RuntimeError(
+                f"Migration {m.version}_{m.name} was modified after being applied "
+                f"(ledger {checksum[:12]}, file {m.checksum[:12]}); add a new migration instead"
+            )
+    return pending
+
+
+def _applied(cur) -> Dict[str, str]:
+    cur.execute("select version, checksum from schema_migrations")
+    return dict(cur.fetchall())
+
+
 def ensure_schema() -> None:
-    statements = [
-        # job_runs
-        """
-        create table if not exists job_runs (
-            id bigserial primary key,
-            job_name text not null,
-            status text not null,
-            started_at timestamptz not null,
-            finished_at timestamptz,
-            row_count integer,
-            error text
-        );
-        """,
-        """
-        create index if not exists idx_job_runs_job_name_started_at
-        on job_runs (job_name, started_at desc);
-        """,
-        # updated_at trigger function
-        """
-        create or replace function set_updated_at()
-        returns trigger as $$
-        begin
-          new.updated_at = now();
-          return new;
-        end;
-        $$ language plpgsql;
-        """,
-        # leads table + trigger
-        """
-        create table if not exists leads (
-            id text primary key,
-            name text,
-            email text,
-            phone text,
-            raw jsonb,
-            source text,
-            created_at timestamptz not null default now(),
-            updated_at timestamptz not null default now()
-        );
-        """,
-        # Ensure new columns exist on already-created tables
-        """
-        alter table if exists leads
-        add column if not exists raw jsonb;
-        """,
-        """
-        drop trigger if exists trg_leads_updated_at on leads;
-        """,
-        """
-        create trigger trg_leads_updated_at
-        before update on leads
-        for each row execute procedure set_updated_at();
-        """,
-        # booknetic_appointments + trigger
-        """
-        create table if not exists booknetic_appointments (
-            id text primary key,
-            customer_name text,
-            customer_email text,
-            service_name text,
-            starts_at timestamptz,
-            status text,
-            raw jsonb,
-            created_at timestamptz not null default now(),
-            updated_at timestamptz not null default now()
-        );
-        """,
-        """
-        drop trigger if exists trg_booknetic_updated_at on booknetic_appointments;
-        """,
-        """
-        create trigger trg_booknetic_updated_at
-        before update on booknetic_appointments
-        for each row execute procedure set_updated_at();
-        """,
-        # booknetic_customers + trigger
-        """
-        create table if not exists booknetic_customers (
-            id text primary key,
-            name text,
-            email text,
-            phone text,
-            status text,
-            raw jsonb,
-            created_at timestamptz not null default now(),
-            updated_at timestamptz not null default now()
-        );
-        """,
-        """
-        drop trigger if exists trg_booknetic_cust_updated_at on booknetic_customers;
-        """,
-        """
-        create trigger trg_booknetic_cust_updated_at
-        before update on booknetic_customers
-        for each row execute procedure set_updated_at();
-        """,
-        # payments
-        """
-        create table if not exists booknetic_payments (
-            id text primary key,
-            appointment_id text,
-            amount numeric,
-            currency text,
-            status text,
-            method text,
-            paid_at timestamptz,
-            raw jsonb,
-            created_at timestamptz not null default now(),
-            updated_at timestamptz not null default now()
-        );
-        """,
-        """
-        drop trigger if exists trg_booknetic_pay_updated_at on booknetic_payments;
-        """,
-        """
-        create trigger trg_booknetic_pay_updated_at
-        before update on booknetic_payments
-        for each row execute procedure set_updated_at();
-        """,
-    ]
+    """Apply pending migrations; a single SELECT when the schema is up to date."""
+    migrations = load_migrations()
 
     with get_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                applied = _applied(cur)
+        except errors.UndefinedTable:
+            applied = {}
+        conn.rollback()
+
+        if not _pending(migrations, applied):
+            return
+
         with conn.cursor() as cur:
-            for stmt in statements:
-                cur.execute(stmt)
+            cur.execute("select pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+            cur.execute(
+                """
+                create table if not exists schema_migrations (
+                    version text primary key,
+                    name text not null,
+                    checksum text not null,
+                    applied_at timestamptz not null default now()
+                )
+                """
+            )
+            # Another replica may have applied them while we waited for the lock
+            pending = _pending(migrations, _applied(cur))
+            for m in pending:
+                print(f"[migrate] applying {m.version}_{m.name}")
+                cur.execute(m.sql)
+                cur.execute(
+                    "insert into schema_migrations (version, name, checksum) values (%s, %s, %s)",
+                    (m.version, m.name, m.checksum),
+                )
         conn.commit()
+    print(f"[migrate] {len(pending)} migration(s) applied")
 
 
+if __name__ == "__main__":
+    ensure_schema()
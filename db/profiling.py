@@ -0,0 +1,241 @@
+"""
+Opt-in profiling of job runs (cProfile, optionally tracemalloc).
+
+A run is profiled when any of these asks for it:
+  - PROFILE_JOBS: "1"/"all" for every job, or a comma-separated list of job names
+  - run_with_job_meta(..., profile=True), e.g. ``python -m jobs.runner --profile``
+  - a one-shot flag in etl_state, consumed by the next run of the job, so a
+    single production run can be profiled without a redeploy:
+        python -m jobs.runner --profile-next booknetic_scrape [--tracemalloc]
+
+Each profiled run writes profile.pstats, hotspots.txt and (with tracemalloc)
+allocations.txt to PROFILE_DIR/<timestamp>_<job>_<run id>/; only the newest
+PROFILE_KEEP run directories are kept. A compact top-N summary is stored in
+job_runs.profile.
+
+cProfile only sees the job's own thread: time spent in worker threads (e.g.
+parallel downloads) shows up as waiting on their futures.
+"""
+import cProfile
+import datetime as dt
+import io
+import os
+import pstats
+import shutil
+import sysconfig
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from db.state import pop_state, set_state
+
+PROFILE_JOBS = os.getenv("PROFILE_JOBS", "").strip()
+PROFILE_TRACEMALLOC = os.getenv("PROFILE_TRACEMALLOC", "").strip().lower() in {"1", "true", "yes", "y"}
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR") or Path(__file__).parent.parent / "profiles")
+PROFILE_KEEP = max(1, int(os.getenv("PROFILE_KEEP", "20")))
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "15"))
+# Frames kept per allocation traceback
+TRACEMALLOC_FRAMES = 10
+# A one-shot flag nobody consumed within this time is dropped
+NEXT_FLAG_TTL = 24 * 3600
+
+ALL_JOBS = "*"
+
+_ROOT = str(Path(__file__).parent.parent) + os.sep
+_STDLIB = sysconfig.get_paths()["stdlib"] + os.sep
+# tracemalloc is process-wide: only one run traces memory at a time
+_tracemalloc_lock = threading.Lock()
+
+
+class ProfileOptions(NamedTuple):
+    trace_memory: bool
+    reason: str  # "env" | "cli" | "next"
+
+
+def next_flag_key(job_name: str) -> str:
+    return f"profile:next:{job_name}"
+
+
+def request_next(job_name: str = ALL_JOBS, trace_memory: bool = False) -> None:
+    """Profile the next run of ``job_name`` (ALL_JOBS: the next run of any job)."""
+    set_state(next_flag_key(job_name), {"tracemalloc": trace_memory}, ttl_seconds=NEXT_FLAG_TTL)
+
+
+def _env_selects(job_name: str) -> bool:
+    if not PROFILE_JOBS:
+        return False
+    if PROFILE_JOBS.lower() in {"1", "true", "yes", "y", "all", ALL_JOBS}:
+        return True
+    return job_name in {j.strip() for j in PROFILE_JOBS.split(",")}
+
+
+def _claim_next(job_name: str) -> Optional[Dict[str, Any]]:
+    """Consume a one-shot flag for this job (or for any job); DB errors mean no flag."""
+    for key in (next_flag_key(job_name), next_flag_key(ALL_JOBS)):
+        try:
+            flag = pop_state(key)
+        except Exception as e:  # noqa: BLE001
+            print(f"[profile] could not read {key}: {e}")
+            return None
+        if flag is not None:
+            return flag if isinstance(flag, dict) else {}
+    return None
+
+
+def requested(job_name: str, force: Optional[bool] = None) -> Optional[ProfileOptions]:
+    """Profiling options for this run, or None. ``force=False`` disables profiling."""
+    if force is False:
+        return None
+    if force:
+        return ProfileOptions(PROFILE_TRACEMALLOC, "cli")
+    if _env_selects(job_name):
+        return ProfileOptions(PROFILE_TRACEMALLOC, "env")
+    flag = _claim_next(job_name)
+    if flag is not None:
+        return ProfileOptions(bool(flag.get("tracemalloc")) or PROFILE_TRACEMALLOC, "next")
+    return None
+
+
+def _where(filename: str, lineno: int, func: Optional[str] = None) -> str:
+    if filename.startswith(_ROOT):
+        filename = filename[len(_ROOT):]
+    elif filename.startswith(_STDLIB):
+        filename = filename[len(_STDLIB):]
+    elif "site-packages" + os.sep in filename:
+        filename = filename.split("site-packages" + os.sep, 1)[1]
+    return f"{filename}:{lineno}" + (f"({func})" if func else "")
+
+
+def _hotspots(stats: pstats.Stats, top_n: int) -> List[Dict[str, Any]]:
+    """Top functions by own time (the profiler's own frames excluded)."""
+    entries = sorted(
+        (kv for kv in stats.stats.items() if kv[0][0] != __file__),  # type: ignore[attr-defined]
+        key=lambda kv: kv[1][2],
+        reverse=True,
+    )[:top_n]
+    return [
+        {
+            "func": _where(filename, lineno, func),
+            "calls": nc,
+            "tottime": round(tt, 4),
+            "cumtime": round(ct, 4),
+        }
+        for (filename, lineno, func), (cc, nc, tt, ct, _callers) in entries
+    ]
+
+
+def _top_allocations(snapshot: tracemalloc.Snapshot, top_n: int) -> List[Dict[str, Any]]:
+    return [
+        {"where": _where(s.traceback[0].filename, s.traceback[0].lineno), "kb": s.size // 1024, "count": s.count}
+        for s in snapshot.statistics("lineno")[:top_n]
+    ]
+
+
+def _write_reports(
+    out_dir: Path,
+    profiler: cProfile.Profile,
+    snapshot: Optional[tracemalloc.Snapshot],
+    peak_kb: Optional[int],
+) -> None:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(str(out_dir / "profile.pstats"))
+
+    text = io.StringIO()
+    stats = pstats.Stats(profiler, stream=text)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(50)
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(50)
+    (out_dir / "hotspots.txt").write_text(text.getvalue(), encoding="utf-8")
+
+    if snapshot is not None:
+        lines = [f"peak traced memory: {peak_kb} KiB", "", "allocations still alive at the end of the run, by line:"]
+        for s in snapshot.statistics("lineno")[:30]:
+            lines.append(f"  {s.size // 1024:>8} KiB {s.count:>8} blocks  {_where(s.traceback[0].filename, s.traceback[0].lineno)}")
+        lines += ["", "largest of them, with tracebacks:"]
+        for s in snapshot.statistics("traceback")[:5]:
+            lines.append(f"  {s.size // 1024} KiB in {s.count} blocks")
+            lines += [f"    {line}" for line in s.traceback.format()]
+        (out_dir / "allocations.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def _prune(base: Path, keep: int) -> None:
+    runs = sorted((p for p in base.iterdir() if p.is_dir()), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in runs[keep:]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+@contextmanager
+def profiled(run, options: Optional[ProfileOptions]) -> Iterator[None]:
+    """
+    Profile the block for ``run`` (a db.job_run.JobRun) when ``options`` is set:
+    reports go to PROFILE_DIR and the summary to ``run.profile``. Failures to
+    profile or to write reports never fail the job.
+    """
+    if options is None:
+        yield
+        return
+
+    trace_memory = options.trace_memory and _tracemalloc_lock.acquire(blocking=False)
+    if options.trace_memory and not trace_memory:
+        print(f"[profile] {run.job_name}: tracemalloc busy with another run, CPU profile only")
+    if trace_memory and tracemalloc.is_tracing():
+        _tracemalloc_lock.release()
+        trace_memory = False
+
+    profiler = cProfile.Profile()
+    started = True
+    try:
+        profiler.enable()
+    except ValueError as e:  # another profiler active in this thread
+        print(f"[profile] {run.job_name}: could not start cProfile: {e}")
+        started = False
+    if not started:
+        # Yield outside the handler: the job's own exceptions must not chain onto this one
+        if trace_memory:
+            _tracemalloc_lock.release()
+        yield
+        return
+    if trace_memory:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    snapshot = None
+    peak_kb = None
+    try:
+        yield
+    finally:
+        profiler.disable()
+        if trace_memory:
+            try:
+                peak_kb = tracemalloc.get_traced_memory()[1] // 1024
+                snapshot = tracemalloc.take_snapshot().filter_traces(
+                    (tracemalloc.Filter(False, tracemalloc.__file__),)
+                )
+            except Exception as e:  # noqa: BLE001
+                print(f"[profile] {run.job_name}: could not snapshot tracemalloc: {e}")
+            finally:
+                tracemalloc.stop()
+                _tracemalloc_lock.release()
+
+        stamp = dt.datetime.now().strftime("%Y%m%d-%H%M%S")
+        out_dir = PROFILE_DIR / f"{stamp}_{run.job_name}_{run.id}"
+        try:
+            _write_reports(out_dir, profiler, snapshot, peak_kb)
+            _prune(PROFILE_DIR, PROFILE_KEEP)
+        except Exception as e:  # noqa: BLE001
+            print(f"[profile] {run.job_name}: could not write reports to {out_dir}: {e}")
+
+        try:
+            summary: Dict[str, Any] = {
+                "reason": options.reason,
+                "dir": str(out_dir),
+                "hotspots": _hotspots(pstats.Stats(profiler), PROFILE_TOP_N),
+            }
+            if snapshot is not None:
+                summary["peak_traced_kb"] = peak_kb
+                summary["allocations"] = _top_allocations(snapshot, PROFILE_TOP_N)
+            run.profile = summary
+            top = ", ".join(f"{h['func']} {h['tottime']}s" for h in summary["hotspots"][:3])
+            print(f"[profile] {run.job_name}: reports in {out_dir} (top: {top})")
+        except Exception as e:  # noqa: BLE001
+            print(f"[profile] {run.job_name}: could not summarize the profile: {e}")
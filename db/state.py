@@ -0,0 +1,68 @@
+"""
+Small persistent key/value store (tabla etl_state) for ETL bookkeeping:
+export fingerprints, caches, high-water marks, etc.
+"""
+import datetime as dt
+from typing import Any, Optional
+
+from psycopg.types.json import Jsonb
+
+from db.connection import get_connection
+
+
+def get_state(key: str) -> Optional[Any]:
+    """Return the stored value for ``key`` or None if missing/expired."""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT value FROM etl_state
+                WHERE key = %s AND (expires_at IS NULL OR expires_at > now())
+                """,
+                (key,),
+            )
+            row = cur.fetchone()
+    return row[0] if row else None
+
+
+def set_state(key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+    """Store ``value`` (JSON-serializable) under ``key``, optionally expiring after ttl_seconds."""
+    expires_at = None
+    if ttl_seconds is not None:
+        expires_at = dt.datetime.now(dt.timezone.utc) + dt.timedelta(seconds=ttl_seconds)
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO etl_state (key, value, expires_at, updated_at)
+                VALUES (%s, %s, %s, now())
+                ON CONFLICT (key) DO UPDATE
+                SET value = EXCLUDED.value, expires_at = EXCLUDED.expires_at, updated_at = now()
+                """,
+                (key, Jsonb(value), expires_at),
+            )
+        conn.commit()
+
+
+def delete_state(key: str) -> None:
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM etl_state WHERE key = %s", (key,))
+        conn.commit()
+
+
+def pop_state(key: str) -> Optional[Any]:
+    """Atomically remove ``key`` and return its value (None if missing/expired)."""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                DELETE FROM etl_state
+                WHERE key = %s
+                RETURNING value, (expires_at IS NULL OR expires_at > now())
+                """,
+                (key,),
+            )
+            row = cur.fetchone()
+        conn.commit()
+    return row[0] if row and row[1] else None
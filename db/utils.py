@@ -1,151 +1,423 @@
 import datetime as dt
-import traceback
-from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+import itertools
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
 
-from psycopg import sql
-from psycopg.types.json import Json
+from psycopg import Connection, sql
+from psycopg.types.json import Jsonb
 
+from db import job_run, profiling
 from db.connection import get_connection
 
 
+# Minimum number of rows for which method="auto" switches to the COPY loader.
+# Below this the multi-row INSERT is cheaper than creating a staging table.
+COPY_MIN_ROWS = int(os.getenv("DB_COPY_MIN_ROWS", "1000"))
+
+# Rows per INSERT ... VALUES statement
+BATCH_SIZE = 500
+
+UPSERT_METHODS = ("auto", "values", "copy")
+
+
 def now_utc() -> dt.datetime:
     return dt.datetime.now(dt.timezone.utc)
 
 
+class UpsertCounts(NamedTuple):
+    """Outcome of an upsert: rows inserted, rows updated and rows left untouched."""
+
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+    @property
+    def affected(self) -> int:
+        return self.inserted + self.updated
+
+    @property
+    def total(self) -> int:
+        return self.inserted + self.updated + self.unchanged
+
+
 def upsert_many(
     table: str,
     rows: Iterable[Dict[str, Any]],
     conflict_columns: Sequence[str],
     update_columns: Sequence[str],
+    method: str = "auto",
+    only_changed: bool = False,
+    batch_size: int = BATCH_SIZE,
+    conn: Optional[Connection] = None,
 ) -> int:
-    rows_list = [r for r in rows if r]
-    if not rows_list:
-        return 0
-
-    # Deduplicate by conflict key (last one wins) to avoid 21000 error when a batch
-    # contains multiple rows targeting the same constraint.
-    if conflict_columns:
-        unique_map: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
-        for r in rows_list:
-            key = tuple(r.get(c) for c in conflict_columns)
-            # Skip rows that don't have full conflict key
-            if any(v is None for v in key):
-                continue
-            unique_map[key] = r
-        deduped = list(unique_map.values())
-        if len(deduped) != len(rows_list):
-            try:
-                print(f"[db] deduplicated {len(rows_list) - len(deduped)} rows on keys {list(conflict_columns)}")
-            except Exception:
-                pass
-        rows_list = deduped
-
-    all_columns: List[str] = list({k for row in rows_list for k in row.keys()})
+    """
+    Upsert rows into ``table`` (ON CONFLICT ... DO UPDATE) and return the number
+    of rows written. See upsert_many_counts for the arguments.
+    """
+    counts = upsert_many_counts(
+        table,
+        rows,
+        conflict_columns,
+        update_columns,
+        method=method,
+        only_changed=only_changed,
+        batch_size=batch_size,
+        conn=conn,
+    )
+    return counts.affected
+
+
+def upsert_many_counts(
+    table: str,
+    rows: Iterable[Dict[str, Any]],
+    conflict_columns: Sequence[str],
+    update_columns: Sequence[str],
+    method: str = "auto",
+    only_changed: bool = False,
+    batch_size: int = BATCH_SIZE,
+    conn: Optional[Connection] = None,
+) -> UpsertCounts:
+    """
+    Upsert rows into ``table`` (ON CONFLICT ... DO UPDATE) and report inserted,
+    updated and unchanged rows separately.
+
+    ``rows`` may be any iterable (e.g. a generator straight from a CSV mapper); it
+    is consumed in chunks, so memory stays bounded by the chunk size. Rows are
+    dicts or record objects from jobs.records (see _wire). On pool connections
+    jsonb values go in binary format (db.jsonb).
+
+    method:
+      - "values": multi-row INSERT ... VALUES in batches of ``batch_size``
+      - "copy": binary COPY into a temp staging table, then a single
+        INSERT ... SELECT ... ON CONFLICT merge, all in one transaction.
+        Insert columns are taken from the first COPY_MIN_ROWS rows.
+      - "auto": "copy" when there are at least COPY_MIN_ROWS rows, else "values"
+
+    only_changed: guard the DO UPDATE with ``WHERE (update_columns) IS DISTINCT FROM
+    (EXCLUDED.update_columns)`` so identical rows are not rewritten (no new tuple,
+    no WAL, updated_at triggers don't fire). Those rows are counted as unchanged.
+
+    Rows repeating a conflict key are deduplicated (last one wins) within a batch
+    (and across the whole input for "copy"); rows without a full key are skipped.
+    The counts are also added to the current job run (db.job_run), if any.
+
+    conn: run every statement on this connection and leave the transaction open
+    for the caller to commit (see db.loader). By default each batch checks out a
+    pool connection and commits on its own.
+    """
+    if method not in UPSERT_METHODS:
+        raise ValueError(f"upsert method must be one of {UPSERT_METHODS}, got {method!r}")
+
+    started = time.perf_counter()
+    rows_iter: Iterator[Dict[str, Any]] = (r for r in rows if r)
+    on_conflict = _on_conflict_clause(table, conflict_columns, update_columns, only_changed)
+
+    # Peek at the head of the input to pick the method without materializing it
+    head: List[Dict[str, Any]] = []
+    if method != "values":
+        head = list(itertools.islice(rows_iter, COPY_MIN_ROWS))
+        if not head:
+            return UpsertCounts()
+        if method == "auto":
+            method = "copy" if len(head) >= COPY_MIN_ROWS else "values"
+    rows_iter = itertools.chain(head, rows_iter)
+
+    if method == "copy":
+        all_columns = _insert_columns(head, conflict_columns, update_columns)
+        counts = _copy_upsert(table, rows_iter, all_columns, conflict_columns, on_conflict, conn)
+        job_run.add_counts(counts, table, time.perf_counter() - started)
+        return counts
+
+    def execute_batch(batch: List[Dict[str, Any]], all_columns: List[str]) -> Tuple[int, int]:
+        insert_stmt = _counted(
+            sql.SQL(
+                """
+                INSERT INTO {table} ({cols})
+                VALUES {values}
+                {on_conflict}
+                """
+            ).format(
+                table=sql.Identifier(table),
+                cols=sql.SQL(", ").join(sql.Identifier(c) for c in all_columns),
+                values=sql.SQL(", ").join(
+                    sql.SQL("(")
+                    + sql.SQL(", ").join(sql.Placeholder() for _ in all_columns)
+                    + sql.SQL(")")
+                    for _ in batch
+                ),
+                on_conflict=on_conflict,
+            )
+        )
+
+        flat_params: List[Any] = []
+        for r in batch:
+            flat_params.extend(_wire(r, all_columns))
+
+        with _transaction(conn) as c:
+            with c.cursor() as cur:
+                cur.execute(insert_stmt, flat_params)
+                inserted, updated = cur.fetchone()
+        return inserted, updated
+
+    # Insert in chunks to avoid very large single statements/param lists
+    inserted = updated = total = dropped = 0
+    for chunk in _chunks(rows_iter, batch_size):
+        batch = _dedupe(chunk, conflict_columns)
+        dropped += len(chunk) - len(batch)
+        if not batch:
+            continue
+        ins, upd = execute_batch(batch, _insert_columns(batch, conflict_columns, update_columns))
+        inserted += ins
+        updated += upd
+        total += len(batch)
+
+    if dropped:
+        print(f"[db] deduplicated {dropped} rows on keys {list(conflict_columns)}")
+    counts = UpsertCounts(inserted, updated, total - inserted - updated)
+    job_run.add_counts(counts, table, time.perf_counter() - started)
+    return counts
+
+
+@contextmanager
+def _transaction(conn: Optional[Connection]) -> Iterator[Connection]:
+    """The caller's connection (left uncommitted), or a pool connection committed on exit."""
+    if conn is not None:
+        yield conn
+        return
+    with get_connection() as own:
+        yield own
+        own.commit()
+
+
+def _chunks(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    it = iter(rows)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _wire(row: Any, columns: Sequence[str]) -> List[Any]:
+    """
+    Values of ``row`` in ``columns`` order, dicts/lists wrapped for jsonb.
+    Record objects (jobs.records) encode themselves through ``wire()``, without
+    building a dict; plain dict rows are read by key.
+    """
+    wire = getattr(row, "wire", None)
+    if wire is not None:
+        return wire(columns)
+    values = []
+    for c in columns:
+        v = row.get(c)
+        if isinstance(v, (dict, list)):
+            v = Jsonb(v)
+        values.append(v)
+    return values
+
+
+def _dedupe(batch: List[Dict[str, Any]], conflict_columns: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Deduplicate by conflict key (last one wins) to avoid 21000 error when a batch
+    contains multiple rows targeting the same constraint.
+    """
+    if not conflict_columns:
+        return batch
+    unique_map: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+    for r in batch:
+        key = tuple(r.get(c) for c in conflict_columns)
+        # Skip rows that don't have full conflict key
+        if any(v is None for v in key):
+            continue
+        unique_map[key] = r
+    return list(unique_map.values())
+
+
+def _insert_columns(
+    rows: Iterable[Dict[str, Any]],
+    conflict_columns: Sequence[str],
+    update_columns: Sequence[str],
+) -> List[str]:
+    all_columns: List[str] = list(dict.fromkeys(k for row in rows for k in row.keys()))
     # Ensure conflict and update columns exist in the insert list
-    for c in set(conflict_columns).union(update_columns):
+    for c in list(conflict_columns) + list(update_columns):
         if c not in all_columns:
             all_columns.append(c)
+    return all_columns
+
 
-    def execute_batch(batch: List[Dict[str, Any]]) -> None:
-        insert_stmt = sql.SQL(
-            """
-            INSERT INTO {table} ({cols})
-            VALUES {values}
-            ON CONFLICT ({conflict}) DO UPDATE SET {updates}
-            """
-        ).format(
-            table=sql.Identifier(table),
-            cols=sql.SQL(", ").join(sql.Identifier(c) for c in all_columns),
-            values=sql.SQL(", ").join(
-                sql.SQL("(")
-                + sql.SQL(", ").join(sql.Placeholder() for _ in all_columns)
-                + sql.SQL(")")
-                for _ in batch
-            ),
-            conflict=sql.SQL(", ").join(sql.Identifier(c) for c in conflict_columns),
+def _on_conflict_clause(
+    table: str,
+    conflict_columns: Sequence[str],
+    update_columns: Sequence[str],
+    only_changed: bool,
+) -> sql.Composed:
+    clause = sql.SQL("ON CONFLICT ({conflict}) DO UPDATE SET {updates}").format(
+        conflict=sql.SQL(", ").join(sql.Identifier(c) for c in conflict_columns),
         updates=sql.SQL(", ").join(
             sql.Identifier(c) + sql.SQL(" = EXCLUDED.") + sql.Identifier(c)
             for c in update_columns
         ),
+    )
+    if only_changed and update_columns:
+        clause += sql.SQL(" WHERE ({current}) IS DISTINCT FROM ({incoming})").format(
+            current=sql.SQL(", ").join(sql.Identifier(table, c) for c in update_columns),
+            incoming=sql.SQL(", ").join(sql.Identifier("excluded", c) for c in update_columns),
         )
+    return clause
 
-        flat_params: List[Any] = []
-        for r in batch:
-            for c in all_columns:
-                v = r.get(c)
-                if isinstance(v, (dict, list)):
-                    v = Json(v)
-                flat_params.append(v)
 
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(insert_stmt, flat_params)
-            conn.commit()
+def _counted(upsert_stmt: sql.Composable) -> sql.Composed:
+    """
+    Wrap an INSERT ... ON CONFLICT so it returns (inserted, updated) in one row.
+    Rows skipped by the DO UPDATE WHERE guard are not returned at all; xmax = 0
+    marks freshly inserted tuples.
+    """
+    return sql.SQL(
+        """
+        WITH upserted AS (
+            {stmt}
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted)
+        FROM upserted
+        """
+    ).format(stmt=upsert_stmt)
 
-    # Insert in chunks to avoid very large single statements/param lists
-    batch_size = 500
-    for i in range(0, len(rows_list), batch_size):
-        execute_batch(rows_list[i : i + batch_size])
 
-    return len(rows_list)
+def _column_types(cur, table: str) -> Dict[str, str]:
+    """Return {column: SQL type} for ``table`` as reported by the catalog."""
+    cur.execute(
+        """
+        SELECT a.attname, format_type(a.atttypid, a.atttypmod)
+        FROM pg_attribute a
+        WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+        """,
+        (table,),
+    )
+    return {name: typ for name, typ in cur.fetchall()}
 
 
-# Job meta logging
-def record_job_start(job_name: str) -> int:
-    started_at = now_utc()
-    with get_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO job_runs (job_name, status, started_at)
-                VALUES (%s, %s, %s)
-                RETURNING id
-                """,
-                (job_name, "running", started_at),
-            )
-            job_run_id = cur.fetchone()[0]
-        conn.commit()
-    return job_run_id
+def _copy_upsert(
+    table: str,
+    rows: Iterable[Dict[str, Any]],
+    all_columns: List[str],
+    conflict_columns: Sequence[str],
+    on_conflict: sql.Composable,
+    conn: Optional[Connection] = None,
+) -> UpsertCounts:
+    """
+    Stream rows with binary COPY into a temp staging table and merge them into
+    ``table`` with one INSERT ... SELECT ... ON CONFLICT, in a single transaction.
 
+    Staging columns are text (jsonb for json/jsonb targets) and values are cast to
+    the target type server-side, so callers can keep passing strings for dates and
+    numbers exactly like with the VALUES path. An identity column keeps the input
+    order so duplicates resolve to the last row, as in the VALUES path.
+    On a caller's connection the staging table is dropped right after the merge,
+    since the transaction (and ON COMMIT DROP) may span further upserts.
+    """
+    stage = f"_stage_{table}"
+    with _transaction(conn) as c:
+        with c.cursor() as cur:
+            target_types = _column_types(cur, table)
+            json_cols = {c for c in all_columns if target_types.get(c) in ("json", "jsonb")}
+            stage_types = ["jsonb" if c in json_cols else "text" for c in all_columns]
 
-def record_job_end(job_run_id: int, row_count: int) -> None:
-    with get_connection() as conn:
-        with conn.cursor() as cur:
             cur.execute(
-                """
-                UPDATE job_runs
-                SET status = %s, finished_at = %s, row_count = %s
-                WHERE id = %s
-                """,
-                ("success", now_utc(), row_count, job_run_id),
+                sql.SQL(
+                    "CREATE TEMP TABLE {stage} (_ord bigint generated always as identity, {cols}) ON COMMIT DROP"
+                ).format(
+                    stage=sql.Identifier(stage),
+                    cols=sql.SQL(", ").join(
+                        sql.Identifier(c) + sql.SQL(" " + t) for c, t in zip(all_columns, stage_types)
+                    ),
+                )
             )
-        conn.commit()
 
+            copy_stmt = sql.SQL("COPY {stage} ({cols}) FROM STDIN (FORMAT BINARY)").format(
+                stage=sql.Identifier(stage),
+                cols=sql.SQL(", ").join(sql.Identifier(c) for c in all_columns),
+            )
+            staged = 0
+            with cur.copy(copy_stmt) as copy:
+                copy.set_types(stage_types)
+                text_positions = [i for i, c in enumerate(all_columns) if c not in json_cols]
+                for r in rows:
+                    values = _wire(r, all_columns)
+                    for i in text_positions:
+                        v = values[i]
+                        if v is not None and not isinstance(v, str):
+                            values[i] = str(v)
+                    copy.write_row(values)
+                    staged += 1
 
-def record_job_error(job_run_id: int, err: BaseException) -> None:
-    with get_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
+            key_cols = sql.SQL(", ").join(sql.Identifier(c) for c in conflict_columns)
+            merge_stmt = sql.SQL(
                 """
-                UPDATE job_runs
-                SET status = %s, finished_at = %s, error = %s
-                WHERE id = %s
-                """,
-                ("error", now_utc(), f"{type(err).__name__}: {err}\n{traceback.format_exc()}", job_run_id),
+                WITH src AS (
+                    SELECT DISTINCT ON ({keys}) {casts}
+                    FROM {stage}
+                    WHERE {key_not_null}
+                    ORDER BY {keys}, _ord DESC
+                ), upserted AS (
+                    INSERT INTO {table} ({cols})
+                    SELECT * FROM src
+                    {on_conflict}
+                    RETURNING (xmax = 0) AS inserted
+                )
+                SELECT (SELECT count(*) FROM src),
+                       count(*) FILTER (WHERE inserted),
+                       count(*) FILTER (WHERE NOT inserted)
+                FROM upserted
+                """
+            ).format(
+                keys=key_cols,
+                casts=sql.SQL(", ").join(
+                    sql.Identifier(c) + sql.SQL("::" + target_types[c]) if c in target_types else sql.Identifier(c)
+                    for c in all_columns
+                ),
+                stage=sql.Identifier(stage),
+                key_not_null=sql.SQL(" AND ").join(
+                    sql.Identifier(c) + sql.SQL(" IS NOT NULL") for c in conflict_columns
+                ),
+                table=sql.Identifier(table),
+                cols=sql.SQL(", ").join(sql.Identifier(c) for c in all_columns),
+                on_conflict=on_conflict,
             )
-        conn.commit()
+            cur.execute(merge_stmt)
+            total, inserted, updated = cur.fetchone()
+            if conn is not None:
+                cur.execute(sql.SQL("DROP TABLE {stage}").format(stage=sql.Identifier(stage)))
+    if staged != total:
+        print(f"[db] deduplicated {staged - total} rows on keys {list(conflict_columns)}")
+    print(f"[db] {table}: {total} rows merged via COPY")
+    return UpsertCounts(inserted, updated, total - inserted - updated)
+
 
+def run_with_job_meta(job_name: str, fn: Callable[[], int], profile: Optional[bool] = None) -> None:
+    """
+    Run ``fn`` inside a db.job_run.JobRun: phases, bytes and upsert counts
+    reported while it runs are written with the final status in one round trip.
 
-def run_with_job_meta(job_name: str, fn: Callable[[], int]) -> None:
-    job_run_id = record_job_start(job_name)
+    ``profile``: True profiles this run, False never does, None lets
+    PROFILE_JOBS or a one-shot flag decide (see db.profiling).
+    """
+    run = job_run.JobRun(job_name)
+    run.start()
+    options = profiling.requested(job_name, force=profile)
     try:
-        row_count = int(fn() or 0)
-        record_job_end(job_run_id, row_count)
-        print(f"[job {job_name}] success rows={row_count}")
+        with job_run.activate(run), profiling.profiled(run, options):
+            row_count = int(fn() or 0)
     except BaseException as e:  # noqa: BLE001
-        record_job_error(job_run_id, e)
+        run.finish(err=e)
         print(f"[job {job_name}] error: {e}")
         raise
+    # Outside the try: if writing the success fails, the run must not be finished again as an error
+    run.finish(row_count=row_count)
+    print(f"[job {job_name}] success rows={row_count} {run.summary()}")
 
 
 def print_db_identity() -> None:
@@ -0,0 +1,114 @@
+"""
+Contrato de plugins por lotes tipados.
+
+Un plugin puede exponer ``iter_batches()`` (preferido) en vez de ``fetch()``:
+un iterador que entrega
+  - RecordBatch: filas mapeadas de una entidad (appointments / customers /
+    payments), cuyo esquema (tabla, columnas, clave) está declarado en SCHEMAS;
+  - Checkpoint: estado de etl_state (p.ej. fingerprints de exports) que se
+    guarda solo si toda la carga termina bien.
+
+Los lotes de distintas entidades pueden llegar intercalados. El loader
+(db.loader.load_batches) los consume a medida que llegan, así la carga de una
+entidad se solapa con la descarga de la siguiente.
+
+``from_legacy`` adapta las formas antiguas de fetch(): tupla (appointments,
+customers), dict por entidad (+ "fingerprints") o lista de appointments.
+"""
+import itertools
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Tuple, Union
+
+# Filas por lote
+BATCH_ROWS = 1000
+
+
+class Schema(NamedTuple):
+    entity: str
+    table: str
+    columns: Tuple[str, ...]
+    conflict_columns: Tuple[str, ...]
+    update_columns: Tuple[str, ...]
+    # Campos con los que se genera un id estable cuando la fila no trae uno
+    id_fields: Tuple[str, ...]
+
+
+SCHEMAS: Dict[str, Schema] = {
+    "appointments": Schema(
+        "appointments",
+        "booknetic_appointments",
+        columns=("id", "customer_name", "customer_email", "service_name", "starts_at", "status", "raw"),
+        conflict_columns=("id",),
+        update_columns=("customer_name", "customer_email", "service_name", "starts_at", "status", "raw"),
+        id_fields=("customer_email", "starts_at", "service_name"),
+    ),
+    "customers": Schema(
+        "customers",
+        "booknetic_customers",
+        columns=("id", "name", "email", "phone", "status", "raw"),
+        conflict_columns=("id",),
+        update_columns=("name", "email", "phone", "status", "raw"),
+        id_fields=("email", "name", "phone"),
+    ),
+    "payments": Schema(
+        "payments",
+        "booknetic_payments",
+        columns=("id", "appointment_id", "amount", "currency", "status", "method", "paid_at", "raw"),
+        conflict_columns=("id",),
+        update_columns=("appointment_id", "amount", "currency", "status", "method", "paid_at", "raw"),
+        id_fields=("appointment_id", "amount", "paid_at"),
+    ),
+}
+ENTITIES = tuple(SCHEMAS)
+
+
+class RecordBatch(NamedTuple):
+    entity: str
+    rows: List[Dict[str, Any]]
+
+    @property
+    def schema(self) -> Schema:
+        return SCHEMAS[self.entity]
+
+
+class Checkpoint(NamedTuple):
+    key: str
+    value: Any
+
+
+Item = Union[RecordBatch, Checkpoint]
+
+
+def batched(entity: str, rows: Iterable[Dict[str, Any]], size: int = BATCH_ROWS) -> Iterator[RecordBatch]:
+    """Parte ``rows`` (lista o iterador perezoso) en lotes de ``entity``."""
+    if entity not in SCHEMAS:
+        raise ValueError(f"entity must be one of {ENTITIES}, got {entity!r}")
+    it = iter(rows)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield RecordBatch(entity, chunk)
+
+
+def from_legacy(data: Any) -> Iterator[Item]:
+    """Lotes equivalentes a lo que devuelve un fetch() antiguo."""
+    fingerprints = None
+    if isinstance(data, tuple):
+        # Formato antiguo: (appointments, customers)
+        appts, customers = data
+        entities = {"appointments": appts, "customers": customers}
+    elif isinstance(data, dict):
+        # {"appointments": [...], "customers": [...], "payments": [...], "fingerprints": {...}}
+        entities = {e: data.get(e) for e in ENTITIES}
+        fingerprints = data.get("fingerprints")
+    elif isinstance(data, list):
+        # Solo appointments
+        entities = {"appointments": data}
+    else:
+        entities = {}
+
+    for entity, rows in entities.items():
+        if rows:
+            yield from batched(entity, rows)
+    for key, value in (fingerprints or {}).items():
+        yield Checkpoint(key, value)
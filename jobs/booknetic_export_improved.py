@@ -12,41 +12,23 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 import chromedriver_autoinstaller
 
+from jobs.dates import DateColumnParser, parse_date_flexible as _parse_date_flexible
+
+
+def _warn_unparsed(date_str: str) -> None:
+    print(f"⚠️ No se pudo parsear fecha: {date_str}")
+
 
 def parse_date_flexible(date_str: str) -> Optional[str]:
     """
     Parsea diferentes formatos de fecha y retorna formato ISO para PostgreSQL
     Formatos soportados: DD/MM/YYYY HH:MM, DD-MM-YYYY HH:MM, YYYY-MM-DD, etc.
     """
-    if not date_str or not isinstance(date_str, str):
-        return None
-    
-    date_str = date_str.strip()
-    if not date_str or date_str == '-':
-        return None
-    
-    # Formatos comunes a probar
-    formats = [
-        "%d/%m/%Y %H:%M",      # 31/08/2024 13:00
-        "%d-%m-%Y %H:%M",      # 31-08-2024 13:00
-        "%Y-%m-%d %H:%M:%S",   # 2024-08-31 13:00:00
-        "%Y-%m-%d %H:%M",      # 2024-08-31 13:00
-        "%Y-%m-%d",            # 2024-08-31
-        "%d/%m/%Y",            # 31/08/2024
-        "%d-%m-%Y",            # 31-08-2024
-    ]
-    
-    for fmt in formats:
-        try:
-            dt = datetime.strptime(date_str, fmt)
-            # Retornar en formato ISO compatible con PostgreSQL
-            return dt.strftime("%Y-%m-%d %H:%M:%S")
-        except ValueError:
-            continue
-    
-    # Si no se pudo parsear, retornar None
-    print(f"⚠️ No se pudo parsear fecha: {date_str}")
-    return None
+    parsed = _parse_date_flexible(date_str)
+    if parsed is None and isinstance(date_str, str) and date_str.strip() not in ("", "-"):
+        # Si no se pudo parsear, retornar None
+        _warn_unparsed(date_str.strip())
+    return parsed
 
 def setup_chrome_driver():
     """Setup Chrome driver with automatic chromedriver installation"""
@@ -385,6 +367,7 @@ def map_customers_to_db(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
 def map_appointments_to_db(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Map appointment CSV rows to database format"""
     mapped = []
+    parse_date = DateColumnParser(on_unparsed=_warn_unparsed)
     for row in rows:
         # Normalize keys
         norm_row = {normalize_key(k): v for k, v in row.items()}
@@ -397,7 +380,7 @@ def map_appointments_to_db(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         status = norm_row.get("status", "")
         
         # Parse date to PostgreSQL format
-        date_parsed = parse_date_flexible(date_raw) if date_raw else None
+        date_parsed = parse_date(date_raw) if date_raw else None
         
         # Generate ID
         appt_id = norm_row.get("id") or norm_row.get("appointment_id")
@@ -420,6 +403,7 @@ def map_appointments_to_db(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
 def map_payments_to_db(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Map payment CSV rows to database format"""
     mapped = []
+    parse_date = DateColumnParser(on_unparsed=_warn_unparsed)
     for row in rows:
         # Normalize keys
         norm_row = {normalize_key(k): v for k, v in row.items()}
@@ -433,7 +417,7 @@ def map_payments_to_db(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         paid_at_raw = norm_row.get("paid_at", "") or norm_row.get("date", "") or norm_row.get("payment_date", "")
         
         # Parse date to PostgreSQL format
-        paid_at_parsed = parse_date_flexible(paid_at_raw) if paid_at_raw else None
+        paid_at_parsed = parse_date(paid_at_raw) if paid_at_raw else None
         
         # Generate ID
         payment_id = norm_row.get("id") or norm_row.get("payment_id")
@@ -2,29 +2,76 @@
 Booknetic Export usando REQUESTS en lugar de Selenium
 Mucho más rápido y confiable para Railway
 """
+import contextvars
+import csv
 import os
+import re
 import time
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Tuple
 from datetime import datetime
 
 import requests
 from bs4 import BeautifulSoup
 
 # Database imports
-from db.core import get_pool
+from db import job_run
+from db.state import get_state
+from jobs.batches import Checkpoint, Item, batched
+from jobs.dates import DateColumnParser, parse_date_flexible  # noqa: F401 (re-export)
+from jobs.records import AppointmentRecord, CustomerRecord, PaymentRecord, iter_with_headers
+from jobs.sync_window import current_window
+from jobs.wp_session import ensure_logged_in
 
 # Configuración
 BASE_URL = os.getenv("BOOKNETIC_URL", "https://hotboatchile.com")
 USERNAME = os.getenv("BOOKNETIC_USERNAME", "")
 PASSWORD = os.getenv("BOOKNETIC_PASSWORD", "")
-DOWNLOADS_DIR = Path(__file__).parent.parent / "downloads"
+DOWNLOADS_DIR = Path(os.getenv("BOOKNETIC_DOWNLOADS_DIR") or Path(__file__).parent.parent / "downloads")
+# Saltar parse/map/upsert de módulos cuyo export no cambió desde la última ingesta
+SKIP_UNCHANGED = os.getenv("BOOKNETIC_SKIP_UNCHANGED", "1").strip().lower() in {"1", "true", "yes", "y"}
+# Máximo de exports descargados en paralelo (no saturar el WordPress)
+DOWNLOAD_CONCURRENCY = max(1, int(os.getenv("BOOKNETIC_DOWNLOAD_CONCURRENCY", "3")))
+# Tamaño de bloque al escribir la descarga a disco
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Versión de los mappers/esquema, guardada en cada fingerprint: súbela al cambiar
+# lo que producen los map_* (p.ej. columnas de payments) para que un export con
+# los mismos bytes se vuelva a ingerir
+MAPPER_VERSION = 3
+# Moneda de los montos cuando el export no trae columna currency
+DEFAULT_CURRENCY = os.getenv("BOOKNETIC_CURRENCY", "CLP").strip().upper() or "CLP"
+# Monedas sin decimales: en ellas "164.970" solo puede ser separador de miles
+ZERO_DECIMAL_CURRENCIES = frozenset({"CLP", "JPY", "KRW", "PYG", "ISK"})
+
+# Contrato de plugin (jobs.plugin_registry)
+CAPABILITIES = ("appointments", "customers", "payments")
+
+
+def probe() -> bool:
+    """Disponible si hay credenciales; no hace login."""
+    return bool(USERNAME and PASSWORD)
+
+
+def fingerprint_key(module_name: str) -> str:
+    """Clave en etl_state del fingerprint del último export ingerido de un módulo"""
+    return f"booknetic:export_fingerprint:{module_name}"
+
+
+def load_fingerprint(module_name: str) -> Optional[Dict[str, Any]]:
+    """Lee el fingerprint guardado; si la DB no está disponible se trata como ausente"""
+    try:
+        return get_state(fingerprint_key(module_name))
+    except Exception as e:
+        print(f"⚠️ No se pudo leer fingerprint de {module_name}: {e}")
+        return None
 
 
 def create_session_and_login() -> Optional[requests.Session]:
     """
-    Crea una sesión de requests y hace login en WordPress
+    Crea una sesión de requests autenticada en WordPress: reusa la sesión
+    guardada (jobs.wp_session) si sigue válida y si no hace login
     """
     print("\n" + "="*60)
     print("🔐 INICIANDO LOGIN CON REQUESTS")
@@ -35,6 +82,13 @@ def create_session_and_login() -> Optional[requests.Session]:
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
     })
     
+    if ensure_logged_in(session, BASE_URL, USERNAME, lambda: _login(session)):
+        return session
+    return None
+
+
+def _login(session: requests.Session) -> bool:
+    """Login completo en wp-login.php (GET + POST)"""
     # Step 1: Get login page to get cookies and nonce
     print(f"📄 Obteniendo página de login...")
     login_page_url = f"{BASE_URL}/wp-login.php"
@@ -44,7 +98,7 @@ def create_session_and_login() -> Optional[requests.Session]:
         print(f"✅ Página de login obtenida (status: {response.status_code})")
     except Exception as e:
         print(f"❌ Error obteniendo página de login: {e}")
-        return None
+        return False
     
     # Step 2: Login POST
     print(f"🔑 Enviando credenciales de login...")
@@ -66,7 +120,7 @@ def create_session_and_login() -> Optional[requests.Session]:
             if 'wp-login.php' not in response.url:
                 print(f"✅ Login exitoso!")
                 print(f"   URL final: {response.url}")
-                return session
+                return True
             else:
                 print(f"❌ Login falló - seguimos en wp-login.php")
                 # Buscar mensaje de error
@@ -74,19 +128,28 @@ def create_session_and_login() -> Optional[requests.Session]:
                 error_div = soup.find('div', {'id': 'login_error'})
                 if error_div:
                     print(f"   Error: {error_div.get_text(strip=True)}")
-                return None
+                return False
         else:
             print(f"❌ Login falló - status code: {response.status_code}")
-            return None
+            return False
             
     except Exception as e:
         print(f"❌ Error durante login: {e}")
-        return None
+        return False
 
 
-def download_csv(session: requests.Session, module_name: str, display_name: str) -> Optional[Path]:
+def download_csv(
+    session: requests.Session,
+    module_name: str,
+    display_name: str,
+    previous: Optional[Dict[str, Any]] = None,
+) -> Tuple[Optional[Path], Optional[Dict[str, Any]]]:
     """
-    Descarga el CSV de un módulo específico
+    Descarga el CSV de un módulo específico.
+
+    Retorna (ruta, fingerprint). El fingerprint tiene sha256/size del contenido y
+    etag/last_modified de la respuesta. Si se pasa ``previous`` se envían
+    If-None-Match/If-Modified-Since; ante un 304 retorna (None, previous).
     """
     print(f"\n{'='*60}")
     print(f"📥 DESCARGANDO: {display_name}")
@@ -94,44 +157,131 @@ def download_csv(session: requests.Session, module_name: str, display_name: str)
     
     # URL de export directo
     export_url = f"{BASE_URL}/wp-admin/admin.php?page=booknetic&module={module_name}&action=export"
+    # Ventana caliente: filtrar el export en origen si está configurado
+    window_query = current_window().export_query()
+    if window_query:
+        export_url += "&" + window_query
     print(f"🌐 URL: {export_url}")
+
+    headers = {}
+    if previous:
+        if previous.get("etag"):
+            headers["If-None-Match"] = previous["etag"]
+        if previous.get("last_modified"):
+            headers["If-Modified-Since"] = previous["last_modified"]
     
     try:
-        # Hacer la petición de descarga
-        response = session.get(export_url, timeout=60)
-        print(f"📬 Respuesta (status: {response.status_code})")
-        
-        if response.status_code == 200:
-            # Verificar que sea un CSV
-            content_type = response.headers.get('Content-Type', '')
-            print(f"📄 Content-Type: {content_type}")
-            
-            # Generar nombre de archivo
-            today = datetime.now().strftime("%Y%b%d")
-            filename = f"{module_name}_{today}.csv"
-            filepath = DOWNLOADS_DIR / filename
-            
-            # Guardar el archivo
-            filepath.write_bytes(response.content)
-            file_size = len(response.content)
-            print(f"✅ CSV guardado: {filename} ({file_size} bytes)")
-            
-            # Verificar contenido
-            if file_size < 100:
-                print(f"⚠️ Archivo muy pequeño - podría no ser válido")
-                print(f"   Contenido: {response.text[:200]}")
-            
-            return filepath
-        else:
-            print(f"❌ Error descargando CSV - status: {response.status_code}")
-            print(f"   Respuesta: {response.text[:500]}")
-            return None
+        # Hacer la petición de descarga (stream: el cuerpo se escribe a disco por bloques)
+        with session.get(export_url, headers=headers, timeout=60, stream=True) as response:
+            return _save_export(response, module_name, previous)
             
     except Exception as e:
         print(f"❌ Error durante descarga: {e}")
         import traceback
         traceback.print_exc()
-        return None
+        return None, None
+
+
+def _save_export(
+    response: requests.Response,
+    module_name: str,
+    previous: Optional[Dict[str, Any]],
+) -> Tuple[Optional[Path], Optional[Dict[str, Any]]]:
+    """Escribe el cuerpo de la respuesta a downloads/ por bloques, calculando sha256/size al vuelo"""
+    print(f"📬 Respuesta (status: {response.status_code})")
+
+    if response.status_code == 304 and previous:
+        print(f"✅ Sin cambios desde la última descarga (304 Not Modified)")
+        return None, previous
+
+    if response.status_code != 200:
+        print(f"❌ Error descargando CSV - status: {response.status_code}")
+        print(f"   Respuesta: {response.text[:500]}")
+        return None, None
+
+    # Verificar que sea un CSV
+    content_type = response.headers.get('Content-Type', '')
+    print(f"📄 Content-Type: {content_type}")
+    
+    # Generar nombre de archivo
+    today = datetime.now().strftime("%Y%b%d")
+    filename = f"{module_name}_{today}.csv"
+    filepath = DOWNLOADS_DIR / filename
+    
+    # Guardar el archivo
+    digest = hashlib.sha256()
+    file_size = 0
+    body_started = time.perf_counter()
+    with open(filepath, "wb") as f:
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            f.write(chunk)
+            digest.update(chunk)
+            file_size += len(chunk)
+    # Latencia: hasta los headers (elapsed) + transferencia del cuerpo
+    job_run.add_bytes(file_size, response.elapsed.total_seconds() + time.perf_counter() - body_started)
+    print(f"✅ CSV guardado: {filename} ({file_size} bytes)")
+    
+    # Verificar contenido
+    if file_size < 100:
+        print(f"⚠️ Archivo muy pequeño - podría no ser válido")
+        print(f"   Contenido: {filepath.read_text(encoding='utf-8', errors='replace')[:200]}")
+
+    fingerprint = {
+        "sha256": digest.hexdigest(),
+        "size": file_size,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        # "hot": ingerido solo en la ventana caliente; una ejecución completa no lo reutiliza
+        "scope": current_window().mode,
+        "mapper_version": MAPPER_VERSION,
+    }
+    return filepath, fingerprint
+
+
+def _worker_session(session: requests.Session) -> requests.Session:
+    """Sesión propia para un hilo de descarga, compartiendo el cookie jar del login"""
+    worker = requests.Session()
+    worker.headers.update(session.headers)
+    worker.cookies = session.cookies
+    return worker
+
+
+def _download_one(session: requests.Session, module_name: str, display_name: str):
+    previous = load_fingerprint(module_name) if SKIP_UNCHANGED else None
+    if previous and not current_window().is_hot and previous.get("scope", "full") != "full":
+        # El último ingest fue solo de la ventana caliente: la reconciliación no puede saltárselo
+        previous = None
+    if previous and previous.get("mapper_version", 1) != MAPPER_VERSION:
+        # Ingerido con otros mappers: las filas guardadas no son las que producen los actuales
+        print(f"🔁 {module_name}: mappers cambiaron desde la última ingesta, se vuelve a cargar")
+        previous = None
+    csv_path, fingerprint = download_csv(_worker_session(session), module_name, display_name, previous)
+    return previous, csv_path, fingerprint
+
+
+def iter_downloads(
+    session: requests.Session,
+    modules: List[Tuple[str, str]],
+    concurrency: int = DOWNLOAD_CONCURRENCY,
+) -> Iterator[Tuple[str, Tuple[Optional[Dict[str, Any]], Optional[Path], Optional[Dict[str, Any]]]]]:
+    """
+    Descarga los exports de ``modules`` [(module_name, display_name)] en paralelo,
+    con a lo más ``concurrency`` descargas simultáneas.
+    Entrega (module_name, (fingerprint_previo, ruta, fingerprint_nuevo)) en el orden
+    de ``modules``, cada uno apenas termina su descarga.
+    """
+    workers = max(1, min(concurrency, len(modules)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="booknetic-dl") as pool:
+        # copy_context: los workers reportan bytes descargados al job run actual
+        futures = {
+            name: pool.submit(contextvars.copy_context().run, _download_one, session, name, display)
+            for name, display in modules
+        }
+        for name, future in futures.items():
+            # Solo el tiempo esperando descargas (no el de quien consume entre una y otra)
+            with job_run.phase("download"):
+                result = future.result()
+            yield name, result
 
 
 def find_latest_csv(module_name: str) -> Optional[Path]:
@@ -146,224 +296,162 @@ def normalize_key(key: str) -> str:
     return key.lower().strip().replace(" ", "_").replace("-", "_")
 
 
+def iter_csv_file(filepath: Path) -> Iterator[Dict[str, Any]]:
+    """Lee el CSV fila a fila (sin cargarlo entero en memoria)"""
+    with open(filepath, "r", encoding="utf-8-sig", newline="") as f:
+        yield from csv.DictReader(f)
+
+
 def parse_csv_file(filepath: Path) -> List[Dict[str, Any]]:
     """Parse CSV file"""
-    import csv
-    rows = []
-    with open(filepath, "r", encoding="utf-8-sig") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            rows.append(row)
-    return rows
-
-
-def parse_date_flexible(date_str: str) -> Optional[str]:
-    """Parse diferentes formatos de fecha"""
-    if not date_str or not isinstance(date_str, str):
+    return list(iter_csv_file(filepath))
+
+
+_THOUSANDS = re.compile(r"[0-9]{1,3}(?:\.[0-9]{3})+")
+
+
+def parse_amount(value: Optional[str], currency: Optional[str] = None) -> Optional[float]:
+    """
+    Monto de un export ("$164.970", "1.234,5", "99.90") como número.
+
+    Con coma, la coma es el decimal y los puntos son de miles ("1.234,5").
+    Sin coma, un punto seguido de grupos de 3 dígitos es de miles solo en
+    monedas sin decimales (ZERO_DECIMAL_CURRENCIES; ``currency`` por defecto
+    DEFAULT_CURRENCY): "$164.970" CLP -> 164970. En las demás el punto es el
+    decimal ("99.900" USD -> 99.9). Si la moneda real de un export con punto
+    decimal no llega en currency ni en BOOKNETIC_CURRENCY, "99.900" se leería
+    como 99900.
+    """
+    if not value:
         return None
-    
-    date_str = date_str.strip()
-    if not date_str or date_str == '-':
+    text = value.strip().lstrip("$").replace(" ", "")
+    if not text:
+        return None
+    if "," in text:
+        text = text.replace(".", "").replace(",", ".")
+    elif text.count(".") > 1 or (
+        (currency or DEFAULT_CURRENCY).upper() in ZERO_DECIMAL_CURRENCIES and _THOUSANDS.fullmatch(text)
+    ):
+        text = text.replace(".", "")
+    try:
+        return float(text)
+    except ValueError:
         return None
-    
-    formats = [
-        "%d/%m/%Y %H:%M",
-        "%d-%m-%Y %H:%M",
-        "%Y-%m-%d %H:%M:%S",
-        "%Y-%m-%d %H:%M",
-        "%Y-%m-%d",
-        "%d/%m/%Y",
-        "%d-%m-%Y",
-    ]
-    
-    for fmt in formats:
-        try:
-            dt = datetime.strptime(date_str, fmt)
-            return dt.strftime("%Y-%m-%d %H:%M:%S")
-        except ValueError:
-            continue
-    
-    return None
 
 
-def map_customers_to_db(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Map customer CSV rows to database format"""
-    mapped = []
-    for row in rows:
-        norm_row = {normalize_key(k): v for k, v in row.items()}
+def iter_map_customers(rows: Iterable[Dict[str, Any]]) -> Iterator[CustomerRecord]:
+    """Map customer CSV rows to database format (jobs.records), one row at a time"""
+    # Cada encabezado se normaliza una sola vez (jobs.records.header_for)
+    for header, values in iter_with_headers(rows, normalize_key):
+        get = header.get
         
-        customer_id = norm_row.get("id") or norm_row.get("customer_id")
-        email = norm_row.get("email", "")
-        name = norm_row.get("full_name", "") or norm_row.get("name", "")
-        phone = norm_row.get("phone", "") or norm_row.get("phone_number", "")
+        customer_id = get(values, "id") or get(values, "customer_id")
+        email = get(values, "email", "")
+        name = get(values, "full_name", "") or get(values, "name", "")
+        phone = get(values, "phone", "") or get(values, "phone_number", "")
         
         if not customer_id and email:
             customer_id = hashlib.sha1(email.encode("utf-8")).hexdigest()[:16]
         
-        mapped.append({
-            "id": str(customer_id),
-            "name": name or None,
-            "email": email or None,
-            "phone": phone or None,
-            "raw": norm_row
-        })
-    
-    return mapped
+        yield CustomerRecord(
+            header,
+            values,
+            id=str(customer_id),
+            name=name or None,
+            email=email or None,
+            phone=phone or None,
+        )
 
 
-def map_appointments_to_db(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Map appointment CSV rows to database format"""
-    mapped = []
-    for row in rows:
-        norm_row = {normalize_key(k): v for k, v in row.items()}
+def map_customers_to_db(rows: Iterable[Dict[str, Any]]) -> List[CustomerRecord]:
+    """Map customer CSV rows to database format"""
+    return list(iter_map_customers(rows))
+
+
+def iter_map_appointments(rows: Iterable[Dict[str, Any]]) -> Iterator[AppointmentRecord]:
+    """Map appointment CSV rows to database format (jobs.records), one row at a time"""
+    parse_date = DateColumnParser()
+    # Cada encabezado se normaliza una sola vez (jobs.records.header_for)
+    for header, values in iter_with_headers(rows, normalize_key):
+        get = header.get
         
-        customer_name = norm_row.get("customer", "") or norm_row.get("customer_name", "")
-        customer_email = norm_row.get("customer_email", "") or norm_row.get("email", "")
-        service = norm_row.get("service", "") or norm_row.get("service_name", "")
-        date_raw = norm_row.get("date", "") or norm_row.get("start_date", "") or norm_row.get("starts_at", "")
-        status = norm_row.get("status", "")
+        customer_name = get(values, "customer", "") or get(values, "customer_name", "")
+        customer_email = get(values, "customer_email", "") or get(values, "email", "")
+        service = get(values, "service", "") or get(values, "service_name", "")
+        date_raw = get(values, "date", "") or get(values, "start_date", "") or get(values, "starts_at", "")
+        status = get(values, "status", "")
         
-        date_parsed = parse_date_flexible(date_raw) if date_raw else None
+        date_parsed = parse_date(date_raw) if date_raw else None
         
-        appt_id = norm_row.get("id") or norm_row.get("appointment_id")
+        appt_id = get(values, "id") or get(values, "appointment_id")
         if not appt_id:
             raw = f"{customer_email}|{date_raw}|{service}"
             appt_id = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
         
-        mapped.append({
-            "id": str(appt_id),
-            "customer_name": customer_name or None,
-            "customer_email": customer_email or None,
-            "service_name": service or None,
-            "starts_at": date_parsed,
-            "status": status or None,
-            "raw": norm_row
-        })
-    
-    return mapped
+        yield AppointmentRecord(
+            header,
+            values,
+            id=str(appt_id),
+            customer_name=customer_name or None,
+            customer_email=customer_email or None,
+            service_name=service or None,
+            starts_at=date_parsed,
+            status=status or None,
+        )
 
 
-def map_payments_to_db(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Map payment CSV rows to database format"""
-    mapped = []
-    for row in rows:
-        norm_row = {normalize_key(k): v for k, v in row.items()}
+def map_appointments_to_db(rows: Iterable[Dict[str, Any]]) -> List[AppointmentRecord]:
+    """Map appointment CSV rows to database format"""
+    return list(iter_map_appointments(rows))
+
+
+def iter_map_payments(rows: Iterable[Dict[str, Any]]) -> Iterator[PaymentRecord]:
+    """
+    Map payment CSV rows to database format (jobs.records), one row at a time.
+    Cliente, servicio y fecha de la cita quedan en raw (booknetic_payments no tiene esas columnas).
+    """
+    parse_date = DateColumnParser()
+    # Cada encabezado se normaliza una sola vez (jobs.records.header_for)
+    for header, values in iter_with_headers(rows, normalize_key):
+        get = header.get
         
-        customer_name = norm_row.get("customer", "") or norm_row.get("customer_name", "")
-        service = norm_row.get("service", "") or norm_row.get("service_name", "")
-        date_raw = norm_row.get("date", "") or norm_row.get("payment_date", "")
-        amount = norm_row.get("price", "") or norm_row.get("amount", "")
-        status = norm_row.get("payment_status", "") or norm_row.get("status", "")
+        customer_name = get(values, "customer", "") or get(values, "customer_name", "")
+        date_raw = get(values, "payment_date", "") or get(values, "paid_at", "") or get(values, "date", "")
+        amount = get(values, "paid_amount", "") or get(values, "total_amount", "") \
+            or get(values, "price", "") or get(values, "amount", "")
+        status = get(values, "payment_status", "") or get(values, "status", "")
         
-        date_parsed = parse_date_flexible(date_raw) if date_raw else None
+        date_parsed = parse_date(date_raw) if date_raw else None
         
-        payment_id = norm_row.get("id") or norm_row.get("payment_id")
+        payment_id = get(values, "id") or get(values, "payment_id")
         if not payment_id:
             raw = f"{customer_name}|{date_raw}|{amount}"
             payment_id = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
         
-        mapped.append({
-            "id": str(payment_id),
-            "customer_name": customer_name or None,
-            "service_name": service or None,
-            "date": date_parsed,
-            "amount": float(amount) if amount and amount.replace(".", "").isdigit() else None,
-            "status": status or None,
-            "raw": norm_row
-        })
-    
-    return mapped
+        # El export de pagos de Booknetic lista una fila por cita: su ID es el de la cita
+        appointment_id = get(values, "appointment_id") or get(values, "id")
+        currency = get(values, "currency") or None
+        
+        yield PaymentRecord(
+            header,
+            values,
+            id=str(payment_id),
+            appointment_id=appointment_id or None,
+            amount=parse_amount(amount, currency),
+            currency=currency,
+            status=status or None,
+            method=get(values, "method") or get(values, "payment_method") or None,
+            paid_at=date_parsed,
+        )
 
 
-def load_csv_to_database(csv_files: Dict[str, Path]):
-    """Load CSV data to PostgreSQL and return mapped data"""
-    print("\n" + "="*60)
-    print("📤 CARGANDO DATOS A POSTGRESQL")
-    print("="*60)
-    
-    pool = get_pool()
-    
-    # Mappers
-    mappers = {
-        "customers": map_customers_to_db,
-        "appointments": map_appointments_to_db,
-        "payments": map_payments_to_db
-    }
-    
-    # Tables
-    tables = {
-        "customers": "booknetic_customers",
-        "appointments": "booknetic_appointments",
-        "payments": "booknetic_payments"
-    }
-    
-    results = {
-        "customers": [],
-        "appointments": [],
-        "payments": []
-    }
-    
-    for module_name, csv_path in csv_files.items():
-        if not csv_path or not csv_path.exists():
-            print(f"⚠️ CSV no encontrado para {module_name}")
-            continue
-        
-        print(f"\n📁 Procesando {csv_path.name}...")
-        
-        try:
-            # Parse CSV
-            rows = parse_csv_file(csv_path)
-            print(f"   📊 {len(rows)} filas leídas del CSV")
-            
-            # Map to DB format
-            mapper = mappers.get(module_name)
-            if not mapper:
-                print(f"   ⚠️ No hay mapper para {module_name}")
-                continue
-            
-            mapped = mapper(rows)
-            print(f"   🔄 {len(mapped)} filas mapeadas")
-            
-            # Store mapped data
-            results[module_name] = mapped
-            
-            # Upsert to DB
-            table = tables.get(module_name)
-            if not table:
-                print(f"   ⚠️ No hay tabla para {module_name}")
-                continue
-            
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
-                    # Prepare upsert
-                    for item in mapped:
-                        keys = list(item.keys())
-                        placeholders = ", ".join([f"%({k})s" for k in keys])
-                        updates = ", ".join([f"{k} = EXCLUDED.{k}" for k in keys if k != "id"])
-                        
-                        sql = f"""
-                        INSERT INTO {table} ({", ".join(keys)})
-                        VALUES ({placeholders})
-                        ON CONFLICT (id) DO UPDATE SET {updates}
-                        """
-                        cur.execute(sql, item)
-                    
-                    conn.commit()
-                    print(f"   ✅ {len(mapped)} registros insertados/actualizados en {table}")
-        
-        except Exception as e:
-            print(f"   ❌ Error procesando {module_name}: {e}")
-            import traceback
-            traceback.print_exc()
-    
-    return results
+def map_payments_to_db(rows: Iterable[Dict[str, Any]]) -> List[PaymentRecord]:
+    """Map payment CSV rows to database format"""
+    return list(iter_map_payments(rows))
 
 
-def fetch() -> Dict[str, Any]:
-    """
-    Función principal que exporta y carga datos de Booknetic
-    Retorna un diccionario con appointments, customers, payments
-    """
+def _start_export() -> requests.Session:
+    """Banner, directorio de descargas, credenciales y login"""
     print("\n" + "="*60)
     print("🚀 BOOKNETIC EXPORT CON REQUESTS")
     print("="*60)
@@ -381,64 +469,89 @@ def fetch() -> Dict[str, Any]:
     print(f"👤 Usuario: {USERNAME}")
     
     # Login
-    session = create_session_and_login()
+    with job_run.phase("login"):
+        session = create_session_and_login()
     if not session:
         raise RuntimeError("Login falló")
-    
-    # Download CSVs
-    csv_files = {}
-    modules = [
-        ("customers", "Customers"),
-        ("appointments", "Appointments"),
-        ("payments", "Payments")
-    ]
-    
-    for module_name, display_name in modules:
-        csv_path = download_csv(session, module_name, display_name)
-        if csv_path:
-            csv_files[module_name] = csv_path
-    
-    print(f"\n📊 CSVs descargados: {len(csv_files)}/{len(modules)}")
-    
-    # Parse CSVs and map to DB format (but don't insert yet)
-    print("\n📋 Parseando y mapeando datos...")
-    
-    results = {
-        "customers": [],
-        "appointments": [],
-        "payments": []
-    }
-    
-    mappers = {
-        "customers": map_customers_to_db,
-        "appointments": map_appointments_to_db,
-        "payments": map_payments_to_db
-    }
-    
-    for module_name, csv_path in csv_files.items():
-        if not csv_path or not csv_path.exists():
+    return session
+
+
+def _changed_exports(session: requests.Session) -> Iterator[Tuple[str, Path, Dict[str, Any]]]:
+    """
+    (módulo, csv, fingerprint) de cada export que cambió desde la última ingesta,
+    en el orden de MODULES y apenas termina su descarga (las demás siguen en curso)
+    """
+    for module_name, (previous, csv_path, fingerprint) in iter_downloads(session, MODULES):
+        if previous and fingerprint and fingerprint.get("sha256") == previous.get("sha256") \
+                and fingerprint.get("size") == previous.get("size"):
+            print(f"⏭️ {module_name}: export idéntico al último ingerido, se omite")
             continue
-        
-        try:
-            rows = parse_csv_file(csv_path)
-            mapper = mappers.get(module_name)
-            if mapper:
-                mapped = mapper(rows)
-                results[module_name] = mapped
-                print(f"   ✅ {module_name.capitalize()}: {len(mapped)} registros mapeados")
-        except Exception as e:
-            print(f"   ❌ Error mapeando {module_name}: {e}")
-    
+        if csv_path and csv_path.exists():
+            yield module_name, csv_path, fingerprint
+
+
+def _print_summary(csv_files: Dict[str, Path]) -> None:
     print("\n" + "="*60)
     print("📊 RESUMEN")
     print("="*60)
-    print(f"💾 Customers: {len(results.get('customers', []))} registros")
-    print(f"💾 Appointments: {len(results.get('appointments', []))} registros")
-    print(f"💾 Payments: {len(results.get('payments', []))} registros")
-    print("="*60)
-    print("✅ Datos descargados y mapeados (job_scrape_booknetic hará el upsert)")
+    for module_name, display_name in MODULES:
+        source = csv_files[module_name].name if module_name in csv_files else "sin cambios / sin datos"
+        print(f"💾 {display_name}: {source}")
     print("="*60)
+
+
+def iter_batches() -> Iterator[Item]:
+    """
+    Exporta Booknetic como lotes tipados (contrato de jobs.batches): cada módulo
+    se lee del CSV y se entrega por lotes apenas termina su descarga, mientras
+    las demás siguen, así la carga se solapa con la descarga. Los fingerprints
+    de los exports van al final como Checkpoint; los módulos sin cambios no
+    entregan lotes.
+    """
+    session = _start_export()
+    csv_files: Dict[str, Path] = {}
+    fingerprints: Dict[str, Dict[str, Any]] = {}
+    for module_name, csv_path, fingerprint in _changed_exports(session):
+        csv_files[module_name] = csv_path
+        fingerprints[fingerprint_key(module_name)] = fingerprint
+        print(f"   ✅ {module_name.capitalize()}: {csv_path.name} (cargando en streaming)")
+        yield from batched(module_name, MAPPERS[module_name](iter_csv_file(csv_path)))
+    _print_summary(csv_files)
+    for key, fingerprint in fingerprints.items():
+        yield Checkpoint(key, fingerprint)
+
+
+def fetch() -> Dict[str, Any]:
+    """
+    Función principal que exporta y carga datos de Booknetic (forma antigua;
+    job_scrape_booknetic usa iter_batches)
+    Retorna un diccionario con appointments, customers, payments y los
+    fingerprints (clave etl_state -> valor) de los exports a guardar tras el upsert.
+    Cada entidad es un iterador perezoso de filas mapeadas (se consume una sola vez);
+    los módulos cuyo export no cambió vienen vacíos.
+    """
+    session = _start_export()
+    
+    # Fingerprints nuevos, pendientes de guardar por el llamador tras el upsert
+    fingerprints: Dict[str, Dict[str, Any]] = {}
+    results: Dict[str, Any] = {
+        "customers": [],
+        "appointments": [],
+        "payments": [],
+        "fingerprints": fingerprints,
+    }
     
+    # Parse CSVs and map to DB format lazily: each module is a generator
+    # (CSV fila a fila -> mapper) que el llamador consume por lotes al hacer el upsert
+    csv_files: Dict[str, Path] = {}
+    for module_name, csv_path, fingerprint in _changed_exports(session):
+        csv_files[module_name] = csv_path
+        fingerprints[fingerprint_key(module_name)] = fingerprint
+        results[module_name] = MAPPERS[module_name](iter_csv_file(csv_path))
+        print(f"   ✅ {module_name.capitalize()}: {csv_path.name}")
+    
+    print(f"\n📊 CSVs descargados: {len(csv_files)}/{len(MODULES)}")
+    _print_summary(csv_files)
     return results
 
 
@@ -0,0 +1,172 @@
+"""
+Parseo de fechas de los exports de Booknetic, compartido por todos los exporters.
+
+parse_date_flexible prueba una lista de formatos con strptime. Para columnas
+completas se usa DateColumnParser: infiere el formato de la columna con una
+muestra de valores, parsea el resto con un regex precompilado (sin excepciones
+por formato fallido) y memoiza valores repetidos. Solo los valores atípicos
+vuelven a la ruta flexible.
+"""
+import re
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Tuple
+
+# Formato de salida, compatible con PostgreSQL
+OUTPUT_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Formatos comunes a probar, en orden
+FORMATS = [
+    "%d/%m/%Y %H:%M",      # 31/08/2024 13:00
+    "%d-%m-%Y %H:%M",      # 31-08-2024 13:00
+    "%Y-%m-%d %H:%M:%S",   # 2024-08-31 13:00:00
+    "%Y-%m-%d %H:%M",      # 2024-08-31 13:00
+    "%Y-%m-%d",            # 2024-08-31
+    "%d/%m/%Y",            # 31/08/2024
+    "%d-%m-%Y",            # 31-08-2024
+]
+
+# [0-9] y no \d: \d acepta dígitos Unicode ('٣'), que strptime rechaza
+_FIELD_PATTERNS = {
+    "%d": r"(?P<d>[0-9]{1,2})",
+    "%m": r"(?P<m>[0-9]{1,2})",
+    "%Y": r"(?P<Y>[0-9]{4})",
+    "%H": r"(?P<H>[0-9]{1,2})",
+    "%M": r"(?P<M>[0-9]{1,2})",
+    "%S": r"(?P<S>[0-9]{1,2})",
+}
+
+
+def _compile_fast(fmt: str) -> "re.Pattern[str]":
+    """Regex equivalente a strptime(fmt) para los formatos numéricos de FORMATS."""
+    pattern = ""
+    i = 0
+    while i < len(fmt):
+        if fmt[i] == "%":
+            pattern += _FIELD_PATTERNS[fmt[i : i + 2]]
+            i += 2
+        elif fmt[i].isspace():
+            # strptime acepta cualquier cantidad de espacio donde el formato tiene uno
+            pattern += r"\s+"
+            i += 1
+        else:
+            pattern += re.escape(fmt[i])
+            i += 1
+    return re.compile(pattern)
+
+
+_FAST_PATTERNS: Dict[str, "re.Pattern[str]"] = {fmt: _compile_fast(fmt) for fmt in FORMATS}
+
+
+def _clean(date_str: object) -> Optional[str]:
+    if not date_str or not isinstance(date_str, str):
+        return None
+    date_str = date_str.strip()
+    if not date_str or date_str == "-":
+        return None
+    return date_str
+
+
+def _parse_with_format(date_str: str) -> Tuple[Optional[str], Optional[str]]:
+    """Ruta flexible: (fecha ISO, formato que calzó) o (None, None)."""
+    for fmt in FORMATS:
+        try:
+            dt = datetime.strptime(date_str, fmt)
+            return dt.strftime(OUTPUT_FORMAT), fmt
+        except ValueError:
+            continue
+    return None, None
+
+
+def _parse_fast(date_str: str, fmt: str) -> Optional[str]:
+    """Ruta rápida para un formato ya conocido; None si el valor no calza."""
+    m = _FAST_PATTERNS[fmt].fullmatch(date_str)
+    if not m:
+        return None
+    parts = m.groupdict()
+    year = int(parts["Y"])
+    if year < 1000:
+        return None
+    try:
+        dt = datetime(
+            year,
+            int(parts["m"]),
+            int(parts["d"]),
+            int(parts.get("H") or 0),
+            int(parts.get("M") or 0),
+            int(parts.get("S") or 0),
+        )
+    except ValueError:
+        return None
+    return (
+        f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d} "
+        f"{dt.hour:02d}:{dt.minute:02d}:{dt.second:02d}"
+    )
+
+
+@lru_cache(maxsize=4096)
+def _parse_cached(date_str: str) -> Optional[str]:
+    return _parse_with_format(date_str)[0]
+
+
+def parse_date_flexible(date_str: str) -> Optional[str]:
+    """
+    Parsea diferentes formatos de fecha y retorna formato ISO para PostgreSQL
+    Formatos soportados: DD/MM/YYYY HH:MM, DD-MM-YYYY HH:MM, YYYY-MM-DD, etc.
+    """
+    date_str = _clean(date_str)
+    if date_str is None:
+        return None
+    return _parse_cached(date_str)
+
+
+class DateColumnParser:
+    """
+    Parser para una columna de fechas: usar una instancia por columna y archivo.
+
+    Los primeros ``sample_size`` valores pasan por la ruta flexible y se cuenta
+    qué formato calzó; desde ahí se usa la ruta rápida del formato más común.
+    Los valores que no calzan (atípicos) vuelven a la ruta flexible.
+    ``on_unparsed`` se llama con cada valor no vacío que no se pudo parsear.
+    """
+
+    def __init__(
+        self,
+        sample_size: int = 20,
+        cache_size: int = 4096,
+        on_unparsed: Optional[Callable[[str], None]] = None,
+    ):
+        self.sample_size = sample_size
+        self.cache_size = cache_size
+        self.format: Optional[str] = None
+        self._formats_seen: Counter = Counter()
+        self._cache: Dict[str, Optional[str]] = {}
+        self.fallbacks = 0
+        self.on_unparsed = on_unparsed
+
+    def __call__(self, date_str: str) -> Optional[str]:
+        date_str = _clean(date_str)
+        if date_str is None:
+            return None
+        parsed = self._cache.get(date_str, self)
+        if parsed is self:
+            parsed = _parse_fast(date_str, self.format) if self.format else None
+            if parsed is None:
+                parsed, fmt = _parse_with_format(date_str)
+                if self.format:
+                    self.fallbacks += 1
+                elif fmt:
+                    self._observe(fmt)
+            if len(self._cache) < self.cache_size:
+                self._cache[date_str] = parsed
+
+        if parsed is None and self.on_unparsed is not None:
+            self.on_unparsed(date_str)
+        return parsed
+
+    def _observe(self, fmt: str) -> None:
+        self._formats_seen[fmt] += 1
+        if sum(self._formats_seen.values()) >= self.sample_size:
+            self.format = self._formats_seen.most_common(1)[0][0]
+
@@ -2,12 +2,21 @@ import base64
 import hashlib
 import json
 import os
+import time
 from typing import Any, Dict, List, Optional, Tuple
 
 import gspread
 from google.oauth2.service_account import Credentials
 
-from db.utils import upsert_many
+from db import job_run
+from db.state import get_state, set_state
+from db.utils import upsert_many_counts
+from jobs.sheet_plan import SheetPlan, normalize_key
+
+# Modo incremental: solo se leen las filas nuevas (hojas de respuestas de formularios son append-only)
+INCREMENTAL = os.getenv("SHEETS_INCREMENTAL", "1").strip().lower() in {"1", "true", "yes", "y"}
+# Cada cuántas horas se relee la hoja completa para recoger ediciones/borrados
+FULL_RECONCILE_HOURS = float(os.getenv("SHEETS_FULL_RECONCILE_HOURS", "24"))
 
 
 def _get_gspread_client():
@@ -23,28 +32,6 @@ def _get_gspread_client():
     return gspread.authorize(creds)
 
 
-def _map_row_by_headers(headers: List[str], row: List[Any]) -> Dict[str, Any]:
-    values: Dict[str, Any] = {}
-    for i, h in enumerate(headers):
-        key = (h or "").strip().lower().replace(" ", "_")
-        values[key] = row[i] if i < len(row) else None
-    return values
-
-
-def _apply_col_map(record: Dict[str, Any], col_map: Optional[Dict[str, str]]) -> Dict[str, Any]:
-    if not col_map:
-        return record
-    # Normaliza claves del mapping y aplica: origen -> destino (id/name/email/phone)
-    normalized_map: Dict[str, str] = {
-        (k or "").strip().lower().replace(" ", "_"): v for k, v in col_map.items()
-    }
-    result = dict(record)
-    for src_key, dest_key in normalized_map.items():
-        if dest_key in {"id", "name", "email", "phone"} and dest_key not in result:
-            result[dest_key] = record.get(src_key)
-    return result
-
-
 def _transform(record: Dict[str, Any]) -> Dict[str, Any]:
     # Personaliza este mapeo a tu esquema objetivo
     return {
@@ -57,20 +44,93 @@ def _transform(record: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def _ensure_id(record: Dict[str, Any]) -> None:
-    if record.get("id"):
-        return
-    fields_csv = os.getenv("SHEETS_ID_FIELDS", "email,marca_temporal").strip()
-    fields = [f.strip().lower().replace(" ", "_") for f in fields_csv.split(",") if f.strip()]
-    if not fields:
-        return
-    parts: List[str] = []
-    for f in fields:
-        v = record.get(f)
-        parts.append("" if v is None else str(v))
-    raw = "||".join(parts)
-    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()  # stable deterministic id
-    record["id"] = digest
+def _hwm_key(spreadsheet_id: str, worksheet_name: str) -> str:
+    return f"sheets:hwm:{spreadsheet_id}:{worksheet_name}"
+
+
+def _row_checksum(row: List[Any]) -> str:
+    # get_all_values rellena con "" y batch_get recorta celdas vacías al final: normalizar
+    values = ["" if v is None else str(v) for v in row]
+    while values and values[-1] == "":
+        values.pop()
+    return hashlib.sha1("\x1f".join(values).encode("utf-8")).hexdigest()
+
+
+def _full_read(ws, has_header: bool) -> Tuple[List[List[Any]], Dict[str, Any]]:
+    rows = ws.get_all_values()
+    hwm = {
+        "last_row": len(rows),
+        "checksum": _row_checksum(rows[-1]) if rows else None,
+        "headers": rows[0] if has_header and rows else None,
+        "has_header": has_header,
+        "full_at": time.time(),
+    }
+    print(f"[sheets] mode=full rows={len(rows)}")
+    return rows, hwm
+
+
+def _fetch_rows(ws, state_key: str, has_header: bool) -> Tuple[List[List[Any]], Optional[Dict[str, Any]]]:
+    """
+    Filas a procesar (con la fila de headers primero si has_header) y la nueva
+    marca de agua: última fila leída + checksum de esa fila (None si una lectura
+    incremental no trajo filas nuevas: la marca guardada sigue valiendo).
+
+    En modo incremental se piden en un solo batch_get los headers, la fila de la
+    marca anterior (para detectar ediciones/borrados) y solo las filas nuevas.
+    Si la marca no calza, cambió la configuración o toca reconciliar, se lee todo.
+    """
+    if not INCREMENTAL:
+        return _full_read(ws, has_header)
+    try:
+        hwm = get_state(state_key)
+    except Exception as e:  # noqa: BLE001
+        print(f"[sheets] could not read high-water mark: {e}")
+        hwm = None
+    if not hwm or not hwm.get("last_row") or hwm.get("has_header") != has_header:
+        return _full_read(ws, has_header)
+    if time.time() - (hwm.get("full_at") or 0) >= FULL_RECONCILE_HOURS * 3600:
+        print("[sheets] full reconcile due")
+        return _full_read(ws, has_header)
+
+    last_row = int(hwm["last_row"])
+    ranges = [f"{last_row}:{last_row}"]
+    if has_header:
+        ranges.append("1:1")
+    if last_row < ws.row_count:
+        ranges.append(f"{last_row + 1}:{ws.row_count}")
+    results = ws.batch_get(ranges)
+
+    marker_row = results[0][0] if results[0] else []
+    if _row_checksum(marker_row) != hwm.get("checksum"):
+        print(f"[sheets] row {last_row} changed since last run (edit/delete) -> full reconcile")
+        return _full_read(ws, has_header)
+    headers: List[Any] = []
+    if has_header:
+        headers = results[1][0] if results[1] else []
+        if _row_checksum(headers) != _row_checksum(hwm.get("headers") or []):
+            print("[sheets] headers changed -> full reconcile")
+            return _full_read(ws, has_header)
+        # batch_get recorta celdas vacías finales: mantener el ancho de los headers guardados
+        headers = list(hwm["headers"])
+
+    new_rows = [list(r) for r in results[-1]] if last_row < ws.row_count else []
+    if has_header:
+        # batch_get recorta celdas vacías al final de cada fila; rellenar como get_all_values
+        width = len(headers)
+        new_rows = [r + [""] * (width - len(r)) for r in new_rows]
+
+    new_hwm = None
+    if new_rows:
+        new_hwm = dict(hwm, last_row=last_row + len(new_rows), checksum=_row_checksum(new_rows[-1]))
+    print(f"[sheets] mode=incremental after_row={last_row} new_rows={len(new_rows)}")
+    return ([headers] if has_header else []) + new_rows, new_hwm
+
+
+def _save_hwm(state_key: str, hwm: Dict[str, Any]) -> None:
+    try:
+        set_state(state_key, hwm)
+    except Exception as e:  # noqa: BLE001
+        print(f"[sheets] could not save high-water mark: {e}")
 
 
 def run() -> int:
@@ -84,85 +144,51 @@ def run() -> int:
     ws = sh.worksheet(worksheet_name)
 
     print(f"[sheets] spreadsheet_id={spreadsheet_id} worksheet={worksheet_name}")
-    rows = ws.get_all_values()
-    if not rows:
-        return 0
     has_header = os.getenv("SHEETS_HAS_HEADER", "1").strip().lower() in {"1", "true", "yes", "y"}
+    state_key = _hwm_key(spreadsheet_id, worksheet_name)
+    with job_run.phase("download"):
+        rows, hwm = _fetch_rows(ws, state_key, has_header)
+    if not rows or (has_header and len(rows) == 1):
+        print("[sheets] no new rows")
+        if hwm is not None:
+            # Lectura completa de una hoja solo con headers: guardar la marca (fila 1 +
+            # checksum de los headers) para que la próxima corrida sea incremental
+            _save_hwm(state_key, hwm)
+        return 0
 
     if has_header:
         headers = rows[0]
         data_rows = rows[1:]
-        print(f"[sheets] headers(normalized)={[(h or '').strip().lower().replace(' ', '_') for h in headers]}")
+        plan = SheetPlan.from_env(headers)
+        print(f"[sheets] headers(normalized)={[normalize_key(h) for h in headers]}")
         print(f"[sheets] fetched_rows={len(data_rows)}")
-
-        mapped: List[Dict[str, Any]] = [_map_row_by_headers(headers, r) for r in data_rows]
-
-        # Optional column mapping from env JSON: {"id_cliente":"id","correo":"email"}
-        col_map_env = os.getenv("SHEETS_COL_MAP_JSON")
-        col_map: Optional[Dict[str, str]] = None
-        if col_map_env:
-            try:
-                col_map = json.loads(col_map_env)
-            except Exception:  # noqa: BLE001
-                col_map = None
-
-        mapped_with_aliases = [_apply_col_map(m, col_map) for m in mapped]
     else:
         data_rows = rows
+        plan = SheetPlan.from_env(None)
         print(f"[sheets] no header mode. fetched_rows={len(data_rows)}")
-        # Column index mapping (1-based). Accepts either {"email":2, "id":5} or {"2":"email"}
-        index_map_env = os.getenv("SHEETS_COL_INDEX_JSON", "")
-        index_to_dest: Dict[int, str] = {}
-        if index_map_env:
-            try:
-                raw = json.loads(index_map_env)
-                # dest->index form
-                for k, v in raw.items():
-                    if isinstance(v, int):
-                        index_to_dest[int(v)] = k
-                # index->dest form
-                for k, v in raw.items():
-                    if isinstance(k, str) and k.isdigit():
-                        index_to_dest[int(k)] = str(v)
-            except Exception:  # noqa: BLE001
-                index_to_dest = {}
-
-        def map_by_index(row: List[Any]) -> Dict[str, Any]:
-            rec: Dict[str, Any] = {}
-            for idx, dest in index_to_dest.items():
-                if dest in {"id", "name", "email", "phone"}:
-                    value = row[idx - 1] if 1 <= idx <= len(row) else None
-                    rec[dest] = value
-            return rec
-
-        mapped_with_aliases = [map_by_index(r) for r in data_rows]
-
-    # First: generate deterministic id from selected fields if missing
-    for rec in mapped_with_aliases:
-        _ensure_id(rec)
-
-    # Optional: use email as id if id is still missing
-    use_email_as_id = os.getenv("SHEETS_USE_EMAIL_AS_ID", "").strip().lower() in {"1", "true", "yes", "y"}
-    if use_email_as_id:
-        for rec in mapped_with_aliases:
-            if not rec.get("id") and rec.get("email"):
-                rec["id"] = rec.get("email")
+
+    # Proyección por índice con alias e id (determinístico desde SHEETS_ID_FIELDS o email)
+    with job_run.phase("map"):
+        mapped_with_aliases = plan.records(data_rows)
+        transformed = [_transform(m) for m in mapped_with_aliases if m.get("id")]
 
     has_id = sum(1 for m in mapped_with_aliases if m.get("id"))
     has_email = sum(1 for m in mapped_with_aliases if m.get("email"))
     sample = mapped_with_aliases[:2]
     print(f"[sheets] records_with_id={has_id} records_with_email={has_email} sample_keys={[list(s.keys()) for s in sample]}")
-
-    transformed = [_transform(m) for m in mapped_with_aliases if m.get("id")]
     print(f"[sheets] to_upsert={len(transformed)}")
 
     # Upsert a tabla destino
-    affected = upsert_many(
-        table="leads",
-        rows=transformed,
-        conflict_columns=["id"],
-        update_columns=["name", "email", "phone", "raw", "source"],
-    )
-    return affected
+    with job_run.phase("load"):
+        counts = upsert_many_counts(
+            table="leads",
+            rows=transformed,
+            conflict_columns=["id"],
+            update_columns=["name", "email", "phone", "raw", "source"],
+            only_changed=True,
+        )
+    print(f"[sheets] inserted={counts.inserted} updated={counts.updated} unchanged={counts.unchanged}")
+    _save_hwm(state_key, hwm)
+    return counts.affected
 
 
@@ -1,56 +1,53 @@
 import hashlib
-import importlib
 import os
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 import requests
 
-from db.utils import upsert_many
+from db.state import set_state
+from db.loader import load_batches
+from db.utils import UpsertCounts
+from jobs import plugin_registry, sync_window
+from jobs.batches import Checkpoint, Item, RecordBatch, batched
+from jobs.sync_window import SyncWindow, choose_window
 
+# "parallel": una transacción por tabla, en paralelo; "snapshot": las tres tablas en una sola transacción
+LOAD_MODE = os.getenv("BOOKNETIC_LOAD_MODE", "parallel").strip().lower()
+# Entidades que el modo hot filtra por fecha
+HOT_WINDOW_ENTITIES = ("appointments", "payments")
 
-def _try_plugin(module_path: str):
-    """
-    Try to load plugin and return data
-    Returns: dict, tuple, or list depending on plugin
-    """
-    try:
-        mod = importlib.import_module(module_path)
-        data = mod.fetch()
-        print(f"[booknetic] plugin used: {module_path}")
-        return data
-    except Exception as e:  # noqa: BLE001
-        print(f"[booknetic] plugin '{module_path}' failed: {e}")
-        import traceback
-        traceback.print_exc()
-    return None
-
-
-def _fetch_booknetic():
+
+def _booknetic_batches() -> Tuple[Optional[plugin_registry.Plugin], Iterator[Item]]:
     """
-    Fetch Booknetic data using plugins
-    Returns: dict, tuple, or list depending on plugin
+    Booknetic data as a stream of record batches (jobs.batches), from the
+    plugin chosen by jobs.plugin_registry or from the API. Also returns the
+    autodetected plugin (None otherwise), to remember once the load commits.
     """
     # 1) Prefer explicit plugin via env
     plugin_module = os.getenv("BOOKNETIC_PLUGIN_MODULE")
     if plugin_module:
-        data = _try_plugin(plugin_module)
-        if data:
-            return data
+        plugin = plugin_registry.load(plugin_module)
+        if plugin is not None:
+            try:
+                # Un fetch() antiguo corre aquí; un iter_batches() falla (y revierte la carga) al consumirse
+                items = plugin.batches()
+                print(f"[booknetic] plugin used: {plugin!r}")
+                return None, items
+            except Exception as e:  # noqa: BLE001
+                print(f"[booknetic] plugin '{plugin_module}' failed: {e}")
+                import traceback
+                traceback.print_exc()
         # Si el usuario especificó un plugin explícito pero no hubo datos,
         # no forzamos la ruta API; devolvemos vacío para no romper por envs faltantes
         print(f"[booknetic] plugin '{plugin_module}' returned no data; skipping API fallback")
-        return {"appointments": [], "customers": [], "payments": []}
-
-    # 2) Autodetect common plugins if env not set
-    for candidate in [
-        "plugins.booknetic_full_export",  # NEW: Full export with customers, appointments, payments
-        "plugins.booknetic_export_adapter",
-        "plugins.booknetic_selenium_export",
-        "plugins.booknetic_adapter_example",
-    ]:
-        data = _try_plugin(candidate)
-        if data:
-            return data
+        return None, iter(())
+
+    # 2) Autodetect: un solo plugin (el último exitoso o el primero cuyo probe() pasa);
+    # si falla no se prueba el siguiente, que repetiría el login y el export
+    plugin = plugin_registry.select()
+    if plugin is not None:
+        print(f"[booknetic] plugin used: {plugin!r} (capabilities: {', '.join(plugin.capabilities)})")
+        return plugin, plugin_registry.tracked(plugin)
 
     # 3) Fallback API: acepta alias de variables
     base_url = os.getenv("BOOKNETIC_BASE_URL") or os.getenv("BOOKNETIC_URL")
@@ -80,86 +77,90 @@ def _fetch_booknetic():
         for it in items
         if it.get("id") is not None
     ]
-    return appts, []
+    return None, batched("appointments", appts)
+
+
+def _with_ids(rows: Iterable[Dict[str, Any]], fields: Sequence[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Yield rows, filling a missing id with a stable hash of ``fields``.
+    Works on lists and on lazy iterators from streaming plugins alike.
+    """
+    for row in rows:
+        if not row.get("id"):
+            raw = "|".join(f"{row.get(f, '')}" for f in fields)
+            row["id"] = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+        yield row
+
+
+def _fmt_counts(counts: UpsertCounts) -> str:
+    return f"inserted={counts.inserted} updated={counts.updated} unchanged={counts.unchanged}"
 
 
 def run() -> int:
-    data = _fetch_booknetic()
-    
-    # Handle different return formats
-    if isinstance(data, tuple):
-        # Old format: (appointments, customers)
-        appts, customers = data
-        payments = []
-    elif isinstance(data, dict):
-        # New format: {"appointments": [], "customers": [], "payments": []}
-        appts = data.get("appointments", [])
-        customers = data.get("customers", [])
-        payments = data.get("payments", [])
+    # Ventana caliente (citas recientes/próximas) o reconciliación completa
+    window = choose_window()
+    if window.is_hot:
+        print(f"[booknetic] sync mode=hot window={window.start:%Y-%m-%d}..{window.end:%Y-%m-%d}")
     else:
-        # List of appointments only
-        appts = data if isinstance(data, list) else []
-        customers = []
-        payments = []
+        print("[booknetic] sync mode=full")
 
-    affected = 0
+    with sync_window.activate(window):
+        affected = _sync(window)
 
-    # Upsert appointments
-    if appts:
-        # Asegura id estable si falta utilizando hash
-        for it in appts:
-            if not it.get("id"):
-                raw = f"{it.get('customer_email','')}|{it.get('starts_at','')}|{it.get('service_name','')}"
-                it["id"] = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
-        
-        affected += upsert_many(
-            table="booknetic_appointments",
-            rows=appts,
-            conflict_columns=["id"],
-            update_columns=[
-                "customer_name",
-                "customer_email",
-                "service_name",
-                "starts_at",
-                "status",
-                "raw",
-            ],
-        )
-        print(f"[booknetic] {affected} appointments upserted")
-
-    # Upsert customers if provided
-    if customers:
-        for c in customers:
-            if not c.get("id"):
-                raw = f"{c.get('email','')}|{c.get('name','')}|{c.get('phone','')}"
-                c["id"] = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
-        
-        customer_affected = upsert_many(
-            table="booknetic_customers",
-            rows=customers,
-            conflict_columns=["id"],
-            update_columns=["name", "email", "phone", "status", "raw"],
-        )
-        affected += customer_affected
-        print(f"[booknetic] {customer_affected} customers upserted")
-
-    # Upsert payments if any
-    if payments:
-        for p in payments:
-            if not p.get("id"):
-                raw = f"{p.get('appointment_id','')}|{p.get('amount','')}|{p.get('paid_at','')}"
-                p["id"] = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
-        
-        payment_affected = upsert_many(
-            table="booknetic_payments",
-            rows=payments,
-            conflict_columns=["id"],
-            update_columns=["appointment_id", "amount", "currency", "status", "method", "paid_at", "raw"],
-        )
-        affected += payment_affected
-        print(f"[booknetic] {payment_affected} payments upserted")
-
-    print(f"[booknetic] Total affected: {affected}")
+    if not window.is_hot:
+        sync_window.mark_full_sync()
     return affected
 
 
+def _prepare(
+    items: Iterable[Item],
+    window: SyncWindow,
+    window_stats: Dict[str, int],
+    checkpoints: List[Checkpoint],
+) -> Iterator[RecordBatch]:
+    """
+    Lotes listos para cargar: aparta los Checkpoint, aplica el filtro de la
+    ventana caliente y asegura ids estables
+    """
+    for item in items:
+        if isinstance(item, Checkpoint):
+            checkpoints.append(item)
+            continue
+        rows: Iterable[Dict[str, Any]] = item.rows
+        # En modo hot solo se cargan citas/pagos dentro de la ventana (filtro tras descargar);
+        # customers no trae fechas útiles y se carga completo
+        if window.is_hot and item.entity in HOT_WINDOW_ENTITIES:
+            rows = window.filter(rows, window_stats)
+        # Asegura id estable si falta utilizando hash
+        rows = list(_with_ids(rows, item.schema.id_fields))
+        if rows:
+            yield RecordBatch(item.entity, rows)
+
+
+def _sync(window: SyncWindow) -> int:
+    # Las fases login/download las registran los plugins; load:* corre en paralelo
+    # con ellas: cada tabla se carga a medida que llegan sus lotes
+    window_stats: Dict[str, int] = {}
+    # Fingerprints de los exports de esta ejecución; se guardan tras la carga,
+    # así una carga fallida se reintenta en la próxima ejecución
+    checkpoints: List[Checkpoint] = []
+
+    plugin, items = _booknetic_batches()
+    # Una transacción por tabla, en paralelo (o todas juntas en modo snapshot)
+    results = load_batches(_prepare(items, window, window_stats, checkpoints), mode=LOAD_MODE)
+    affected = unchanged = 0
+    for name, counts in results.items():
+        affected += counts.affected
+        unchanged += counts.unchanged
+        print(f"[booknetic] {name} {_fmt_counts(counts)}")
+
+    for checkpoint in checkpoints:
+        set_state(checkpoint.key, checkpoint.value)
+    # Recién ahora (carga confirmada) el plugin pasa a ser el preferido
+    if plugin is not None:
+        plugin_registry.remember(plugin)
+
+    if window.is_hot:
+        print(f"[booknetic] rows outside hot window skipped: {window_stats.get('skipped', 0)}")
+    print(f"[booknetic] Total affected: {affected} (unchanged: {unchanged})")
+    return affected
@@ -0,0 +1,283 @@
+"""
+Endpoint HTTP de métricas y salud del worker (python -m jobs.runner).
+
+Un ThreadingHTTPServer de la stdlib en un hilo daemon sirve:
+  - /metrics  formato de texto de Prometheus
+  - /healthz  JSON; 503 si algún job lleva más de HEALTH_MAX_SUCCESS_AGE sin un éxito
+              (los registrados con expect_job cuentan aunque nunca hayan terminado)
+
+Las métricas de jobs se actualizan con un finish hook de db.job_run (una vez
+por ejecución); las del pool de conexiones se leen al momento del scrape.
+
+Variables:
+  METRICS_ENABLED (1), METRICS_HOST (0.0.0.0), METRICS_PORT (9108)
+  HEALTH_MAX_SUCCESS_AGE segundos (0 = /healthz no revisa antigüedad)
+"""
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from db import job_run
+from db.connection import pool_stats
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").strip().lower() in {"1", "true", "yes", "y"}
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+HEALTH_MAX_SUCCESS_AGE = float(os.getenv("HEALTH_MAX_SUCCESS_AGE", "0"))
+
+PREFIX = "hotboat_etl_"
+JOB_DURATION_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+DOWNLOAD_SECONDS_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**labels: str) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+def _fmt_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Counters, gauges e histogramas con labels, en memoria y thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}  # name -> (type, help)
+        self._values: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = {}
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, labels: Labels = (), amount: float = 1) -> None:
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + amount
+
+    def set(self, name: str, labels: Labels, value: float) -> None:
+        with self._lock:
+            self._values.setdefault(name, {})[labels] = value
+
+    def get(self, name: str, labels: Labels = ()) -> Optional[float]:
+        with self._lock:
+            return self._values.get(name, {}).get(labels)
+
+    def series(self, name: str) -> Dict[Labels, float]:
+        with self._lock:
+            return dict(self._values.get(name, {}))
+
+    def observe(self, name: str, labels: Labels, value: float, buckets: Tuple[float, ...]) -> None:
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(labels)
+            if hist is None:
+                hist = series[labels] = _Histogram(buckets)
+            hist.observe(value)
+
+    def render(self, extra: Iterable[Tuple[str, str, str, Labels, float]] = ()) -> str:
+        """Exposición en texto; ``extra``: (name, type, help, labels, value) calculados al vuelo."""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in self._values.items():
+                kind, help_text = self._help.get(name, ("untyped", ""))
+                lines += [f"# HELP {PREFIX}{name} {help_text}", f"# TYPE {PREFIX}{name} {kind}"]
+                lines += [f"{PREFIX}{name}{_fmt_labels(lb)} {_fmt_value(v)}" for lb, v in series.items()]
+            for name, series in self._histograms.items():
+                kind, help_text = self._help.get(name, ("histogram", ""))
+                lines += [f"# HELP {PREFIX}{name} {help_text}", f"# TYPE {PREFIX}{name} histogram"]
+                for lb, hist in series.items():
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        le = 'le="%s"' % _fmt_value(bound)
+                        lines.append(f"{PREFIX}{name}_bucket{_fmt_labels(lb, le)} {count}")
+                    inf = 'le="+Inf"'
+                    lines.append(f"{PREFIX}{name}_bucket{_fmt_labels(lb, inf)} {hist.count}")
+                    lines.append(f"{PREFIX}{name}_sum{_fmt_labels(lb)} {_fmt_value(hist.sum)}")
+                    lines.append(f"{PREFIX}{name}_count{_fmt_labels(lb)} {hist.count}")
+        seen = set()
+        for name, kind, help_text, lb, value in extra:
+            if name not in seen:
+                seen.add(name)
+                lines += [f"# HELP {PREFIX}{name} {help_text}", f"# TYPE {PREFIX}{name} {kind}"]
+            lines.append(f"{PREFIX}{name}{_fmt_labels(lb)} {_fmt_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+_started_at = time.time()
+# Jobs que el runner programó: /healthz los revisa aunque no hayan terminado nunca
+_expected_jobs: List[str] = []
+
+for _name, _kind, _help in (
+    ("job_runs_total", "counter", "Job runs by final status."),
+    ("job_duration_seconds", "histogram", "Wall time of job runs."),
+    ("job_last_run_timestamp_seconds", "gauge", "Unix time the job last finished."),
+    ("job_last_success_timestamp_seconds", "gauge", "Unix time the job last finished successfully."),
+    ("job_last_rows", "gauge", "Rows reported by the job's last successful run."),
+    ("load_rows_total", "counter", "Rows upserted by table and outcome (inserted/updated/unchanged)."),
+    ("load_seconds_total", "counter", "Seconds spent upserting, by table."),
+    ("load_rows_per_second", "gauge", "Upsert throughput of the last run that loaded the table."),
+    ("download_bytes_total", "counter", "Bytes of exports downloaded, by job."),
+    ("download_seconds", "histogram", "Latency of one export download (request to last byte), by job."),
+):
+    REGISTRY.describe(_name, _kind, _help)
+
+
+def expect_job(name: str) -> None:
+    """Marca un job como esperado: si se cuelga o nunca termina, /healthz lo reporta."""
+    if name not in _expected_jobs:
+        _expected_jobs.append(name)
+
+
+def record_run(run: "job_run.JobRun", err: Optional[BaseException]) -> None:
+    """Finish hook de db.job_run: vuelca una ejecución terminada al registro."""
+    job = _labels(job=run.job_name)
+    now = time.time()
+    REGISTRY.inc("job_runs_total", _labels(job=run.job_name, status=run.status))
+    if run.wall_seconds is not None:
+        REGISTRY.observe("job_duration_seconds", job, run.wall_seconds, JOB_DURATION_BUCKETS)
+    REGISTRY.set("job_last_run_timestamp_seconds", job, now)
+    if err is None:
+        REGISTRY.set("job_last_success_timestamp_seconds", job, now)
+        REGISTRY.set("job_last_rows", job, run.row_count or 0)
+
+    for table, load in run.tables.items():
+        for outcome in ("inserted", "updated", "unchanged"):
+            REGISTRY.inc("load_rows_total", _labels(table=table, outcome=outcome), getattr(load, outcome))
+        REGISTRY.inc("load_seconds_total", _labels(table=table), load.seconds)
+        if load.seconds > 0 and load.rows:
+            REGISTRY.set("load_rows_per_second", _labels(table=table), load.rows / load.seconds)
+
+    if run.bytes_downloaded:
+        REGISTRY.inc("download_bytes_total", job, run.bytes_downloaded)
+    for download in run.downloads:
+        REGISTRY.observe("download_seconds", job, download.seconds, DOWNLOAD_SECONDS_BUCKETS)
+
+
+def _dynamic_metrics() -> List[Tuple[str, str, str, Labels, float]]:
+    """Métricas calculadas en cada scrape: antigüedad del último éxito y pool de conexiones."""
+    now = time.time()
+    out: List[Tuple[str, str, str, Labels, float]] = [
+        ("uptime_seconds", "gauge", "Seconds since the worker started.", (), now - _started_at),
+    ]
+    for labels, ts in REGISTRY.series("job_last_success_timestamp_seconds").items():
+        out.append(("job_last_success_age_seconds", "gauge", "Seconds since the job last succeeded.", labels, now - ts))
+
+    stats = pool_stats()
+    if stats is not None:
+        size, available = stats.get("pool_size", 0), stats.get("pool_available", 0)
+        out += [
+            ("db_pool_size", "gauge", "Connections currently open in the pool.", (), size),
+            ("db_pool_max", "gauge", "Maximum pool size.", (), stats.get("pool_max", 0)),
+            ("db_pool_available", "gauge", "Idle connections in the pool.", (), available),
+            ("db_pool_in_use", "gauge", "Connections checked out of the pool.", (), max(0, size - available)),
+            ("db_pool_waiting", "gauge", "Clients waiting for a connection.", (), stats.get("requests_waiting", 0)),
+            ("db_pool_requests_total", "counter", "Connection requests to the pool.", (), stats.get("requests_num", 0)),
+            ("db_pool_requests_queued_total", "counter", "Connection requests that had to wait.", (), stats.get("requests_queued", 0)),
+            ("db_pool_timeouts_total", "counter", "Connection requests that failed (timed out).", (), stats.get("requests_errors", 0)),
+            ("db_pool_wait_seconds_total", "counter", "Time spent waiting for a connection.", (), stats.get("requests_wait_ms", 0) / 1000),
+            ("db_pool_connection_errors_total", "counter", "Failed connection attempts.", (), stats.get("connections_errors", 0)),
+            ("db_pool_connections_lost_total", "counter", "Connections found broken.", (), stats.get("connections_lost", 0)),
+        ]
+    return out
+
+
+def health() -> Tuple[bool, Dict[str, object]]:
+    now = time.time()
+    jobs: Dict[str, Dict[str, object]] = {
+        name: {"last_run_age_seconds": None, "last_success_age_seconds": None} for name in _expected_jobs
+    }
+    for labels, ts in REGISTRY.series("job_last_run_timestamp_seconds").items():
+        jobs[dict(labels)["job"]] = {"last_run_age_seconds": round(now - ts, 1), "last_success_age_seconds": None}
+    for labels, ts in REGISTRY.series("job_last_success_timestamp_seconds").items():
+        jobs[dict(labels)["job"]]["last_success_age_seconds"] = round(now - ts, 1)
+
+    stale = []
+    if HEALTH_MAX_SUCCESS_AGE > 0 and now - _started_at > HEALTH_MAX_SUCCESS_AGE:
+        for name, info in jobs.items():
+            age = info["last_success_age_seconds"]
+            if age is None or age > HEALTH_MAX_SUCCESS_AGE:
+                stale.append(name)
+    ok = not stale
+    return ok, {"status": "ok" if ok else "stale", "stale_jobs": stale, "uptime_seconds": round(now - _started_at, 1), "jobs": jobs}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args) -> None:  # noqa: A002
+        pass
+
+    def _send(self, status: int, body: str, content_type: str) -> None:
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:  # noqa: N802
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            try:
+                body = REGISTRY.render(_dynamic_metrics())
+            except Exception as e:  # noqa: BLE001
+                return self._send(500, f"# metrics error: {e}\n", "text/plain; charset=utf-8")
+            return self._send(200, body, "text/plain; version=0.0.4; charset=utf-8")
+        if path in ("/healthz", "/health"):
+            ok, payload = health()
+            return self._send(200 if ok else 503, json.dumps(payload), "application/json")
+        self._send(404, "not found\n", "text/plain; charset=utf-8")
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def start(host: str = METRICS_HOST, port: int = METRICS_PORT) -> Optional[ThreadingHTTPServer]:
+    """Registra el finish hook y levanta el servidor en un hilo daemon (idempotente)."""
+    global _server
+    if _server is not None:
+        return _server
+    job_run.add_finish_hook(record_run)
+    try:
+        _server = ThreadingHTTPServer((host, port), _Handler)
+    except OSError as e:
+        print(f"[metrics] could not listen on {host}:{port}: {e}")
+        return None
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"[metrics] serving /metrics and /healthz on {host}:{_server.server_address[1]}")
+    return _server
@@ -0,0 +1,152 @@
+"""
+Registro de plugins de Booknetic: importa cada plugin una vez y elige uno solo
+por ejecución.
+
+Un plugin expone ``iter_batches()`` (lotes tipados, ver jobs.batches) o
+``fetch()`` (formas antiguas: tupla, dict o lista, adaptadas con
+jobs.batches.from_legacy). Contrato opcional:
+  - ``probe() -> bool``: chequeo barato (config presente, archivos disponibles...),
+    sin login ni descargas. Sin probe() el plugin se considera disponible.
+  - ``CAPABILITIES``: entidades que entrega, p.ej. ("appointments", "customers", "payments").
+  - ``ALIAS_OF``: módulo cuyo fetch() envuelve; los alias se resuelven a ese
+    módulo, así dos candidatos que hacen el mismo scrape cuentan como uno.
+
+La autodetección prueba primero el último plugin cuya carga terminó bien (guardado en
+etl_state) y luego los candidatos en orden; se ejecuta el primero cuyo probe()
+pasa, y solo ese.
+"""
+import importlib
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from db.state import delete_state, get_state, set_state
+from jobs.batches import Item, from_legacy
+
+DEFAULT_CANDIDATES: Tuple[str, ...] = (
+    "plugins.booknetic_full_export",
+    "plugins.booknetic_export_adapter",
+    "plugins.booknetic_selenium_export",
+    "plugins.booknetic_adapter_example",
+)
+ALL_ENTITIES = ("appointments", "customers", "payments")
+LAST_PLUGIN_KEY = "booknetic:last_plugin"
+
+
+class Plugin:
+    """Un plugin importado; ``impl`` es el módulo cuyo fetch() se ejecuta (alias resueltos)."""
+
+    __slots__ = ("path", "impl_path", "impl", "capabilities")
+
+    def __init__(self, path: str, impl_path: str, impl: Any):
+        self.path = path
+        self.impl_path = impl_path
+        self.impl = impl
+        self.capabilities: Tuple[str, ...] = tuple(getattr(impl, "CAPABILITIES", ALL_ENTITIES))
+
+    def probe(self) -> bool:
+        probe = getattr(self.impl, "probe", None)
+        if probe is None:
+            return True
+        try:
+            return bool(probe())
+        except Exception as e:  # noqa: BLE001
+            print(f"[plugins] {self.impl_path}.probe() failed: {e}")
+            return False
+
+    def fetch(self) -> Any:
+        return self.impl.fetch()
+
+    def batches(self) -> Iterator[Item]:
+        """Lotes del plugin; un fetch() antiguo se ejecuta aquí mismo y se adapta."""
+        iter_batches = getattr(self.impl, "iter_batches", None)
+        if iter_batches is not None:
+            return iter(iter_batches())
+        return from_legacy(self.fetch())
+
+    def __repr__(self) -> str:
+        alias = f" -> {self.impl_path}" if self.impl_path != self.path else ""
+        return f"<Plugin {self.path}{alias}>"
+
+
+_cache: Dict[str, Optional[Plugin]] = {}
+_lock = threading.Lock()
+
+
+def load(path: str) -> Optional[Plugin]:
+    """Importa ``path`` (y su ALIAS_OF) una sola vez por proceso; None si no importa."""
+    with _lock:
+        if path in _cache:
+            return _cache[path]
+        plugin = None
+        try:
+            module = importlib.import_module(path)
+            impl_path = getattr(module, "ALIAS_OF", None) or path
+            impl = importlib.import_module(impl_path) if impl_path != path else module
+            if not any(callable(getattr(impl, f, None)) for f in ("iter_batches", "fetch")):
+                raise TypeError(f"{impl_path} has no iter_batches() or fetch()")
+            plugin = Plugin(path, impl_path, impl)
+        except Exception as e:  # noqa: BLE001
+            # Se cachea también el fallo: no reintentar (ni re-loguear) el import en cada ejecución
+            print(f"[plugins] could not load '{path}': {e}")
+        _cache[path] = plugin
+        return plugin
+
+
+def candidates(paths: Sequence[str] = DEFAULT_CANDIDATES) -> List[Plugin]:
+    """Plugins importables de ``paths``, en orden, sin repetir implementación."""
+    seen = set()
+    out: List[Plugin] = []
+    for path in paths:
+        plugin = load(path)
+        if plugin is None or plugin.impl_path in seen:
+            continue
+        seen.add(plugin.impl_path)
+        out.append(plugin)
+    return out
+
+
+def _last_successful() -> Optional[str]:
+    try:
+        return get_state(LAST_PLUGIN_KEY)
+    except Exception as e:  # noqa: BLE001
+        print(f"[plugins] could not read last plugin: {e}")
+        return None
+
+
+def select(paths: Sequence[str] = DEFAULT_CANDIDATES) -> Optional[Plugin]:
+    """El plugin a ejecutar: el último exitoso si su probe() pasa, si no el primer candidato que pase."""
+    ordered = list(paths)
+    last = _last_successful()
+    if last:
+        ordered = [last] + [p for p in ordered if p != last]
+    for plugin in candidates(ordered):
+        if plugin.probe():
+            return plugin
+        print(f"[plugins] {plugin.path}: probe failed, skipping")
+    return None
+
+
+def remember(plugin: Plugin) -> None:
+    try:
+        set_state(LAST_PLUGIN_KEY, plugin.impl_path)
+    except Exception as e:  # noqa: BLE001
+        print(f"[plugins] could not save last plugin: {e}")
+
+
+def forget() -> None:
+    try:
+        delete_state(LAST_PLUGIN_KEY)
+    except Exception as e:  # noqa: BLE001
+        print(f"[plugins] could not clear last plugin: {e}")
+
+
+def tracked(plugin: Plugin) -> Iterator[Item]:
+    """
+    Lotes de ``plugin``; si fallan lo olvida. Recordarlo (remember) le toca a
+    quien carga los lotes, una vez confirmada la carga.
+    """
+    try:
+        yield from plugin.batches()
+    except Exception as e:
+        forget()
+        raise RuntimeError(f"plugin '{plugin.path}' failed: {e}") from e
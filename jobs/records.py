@@ -0,0 +1,272 @@
+"""
+Filas mapeadas compactas para las tres entidades de Booknetic.
+
+Cada registro guarda sus columnas en ``__slots__`` y el ``raw`` como la tupla
+de valores de la fila del CSV, alineada a un Header (claves normalizadas)
+compartido por todas las filas del mismo encabezado. Así 100k filas no cargan
+100k dicts con las mismas claves repetidas.
+
+Los registros se usan como las filas dict de antes donde hace falta
+(``get``, ``row["id"]``, ``keys()``), y el loader los codifica directo con
+``wire(columns)``, sin dicts intermedios (ver db.utils).
+
+Cada encabezado distinto se normaliza una sola vez (header_for, claves
+internadas) y su Header precalcula la plantilla JSON de las claves: codificar
+el raw de una fila solo escapa sus valores.
+"""
+import json
+import sys
+from functools import lru_cache
+from json.encoder import encode_basestring_ascii
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+from psycopg.types.json import Jsonb
+
+from jobs.batches import SCHEMAS
+
+
+class Header:
+    """Claves normalizadas de un encabezado de CSV, compartidas por sus filas."""
+
+    __slots__ = ("keys", "positions", "_json_keys", "_json_index")
+
+    def __init__(self, keys: Sequence[str]):
+        self.keys: Tuple[str, ...] = tuple(keys)
+        # Clave repetida: gana la última columna, en la posición de la primera (como un dict)
+        self.positions: Dict[str, int] = {k: i for i, k in enumerate(self.keys)}
+        # Plantilla JSON: '{"clave":' / ',"clave":' por clave, en el orden de positions
+        self._json_keys: Tuple[str, ...] = tuple(
+            ("," if n else "{") + encode_basestring_ascii(k) + ":" for n, k in enumerate(self.positions)
+        )
+        self._json_index: Tuple[int, ...] = tuple(self.positions.values())
+
+    def get(self, values: Sequence[Any], key: str, default: Any = None) -> Any:
+        i = self.positions.get(key)
+        if i is None or i >= len(values):
+            return default
+        return values[i]
+
+    def items(self, values: Sequence[Any]) -> Iterator[Tuple[str, Any]]:
+        """(clave, valor) del raw; columnas que faltan en la fila valen None."""
+        n = len(values)
+        for key, i in self.positions.items():
+            yield key, (values[i] if i < n else None)
+
+    def json(self, values: Sequence[Any]) -> str:
+        """El raw de ``values`` como objeto JSON compacto (mismo contenido que json.dumps del dict)."""
+        if not self._json_keys:
+            return "{}"
+        n = len(values)
+        if n >= len(self.keys):
+            return "".join([k + _json_value(values[i]) for k, i in zip(self._json_keys, self._json_index)]) + "}"
+        return "".join(
+            [k + (_json_value(values[i]) if i < n else "null") for k, i in zip(self._json_keys, self._json_index)]
+        ) + "}"
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __repr__(self) -> str:
+        return f"Header{self.keys!r}"
+
+
+_headers: Dict[Tuple[str, ...], Header] = {}
+
+
+def shared_header(keys: Sequence[str]) -> Header:
+    """El Header de ``keys``, el mismo objeto para encabezados iguales."""
+    keys = tuple(keys)
+    header = _headers.get(keys)
+    if header is None:
+        header = _headers.setdefault(keys, Header(keys))
+    return header
+
+
+def _json_value(value: Any) -> str:
+    # Los valores de un CSV son str (o None si la fila viene corta)
+    if value.__class__ is str:
+        return encode_basestring_ascii(value)
+    if value is None:
+        return "null"
+    return json.dumps(value)
+
+
+@lru_cache(maxsize=256)
+def header_for(raw_keys: Tuple[str, ...], normalize: Callable[[str], str]) -> Header:
+    """
+    Header de un encabezado tal como viene en el CSV: cada encabezado distinto
+    se normaliza una sola vez, con las claves internadas.
+    """
+    return shared_header([sys.intern(normalize(k)) for k in raw_keys])
+
+
+def iter_with_headers(
+    rows: Iterable[Dict[str, Any]], normalize: Callable[[str], str]
+) -> Iterator[Tuple[Header, Tuple[Any, ...]]]:
+    """(Header, valores) por fila de csv.DictReader; el Header se busca solo cuando cambia el encabezado."""
+    last_keys = None
+    header = None
+    for row in rows:
+        keys = tuple(row)
+        if keys != last_keys:
+            header = header_for(keys, normalize)
+            last_keys = keys
+        yield header, tuple(row.values())
+
+
+def _dump_raw(record: "Record") -> str:
+    # JSON del raw directo desde (header, valores), sin armar el dict
+    return record.header.json(record.values)
+
+
+def _columns(entity: str) -> Tuple[str, ...]:
+    return tuple(c for c in SCHEMAS[entity].columns if c != "raw")
+
+
+class Record:
+    """Base de los registros: ``header`` + ``values`` forman el raw."""
+
+    __slots__ = ("header", "values")
+    ENTITY = ""
+    # Columnas mapeadas (todas las del esquema menos raw), en orden
+    COLUMNS: Tuple[str, ...] = ()
+
+    def raw(self) -> Dict[str, Any]:
+        """El raw como dict (compatibilidad; el loader usa wire())."""
+        return dict(self.header.items(self.values))
+
+    def raw_get(self, key: str, default: Any = None) -> Any:
+        """Un valor del raw sin armar el dict."""
+        return self.header.get(self.values, key, default)
+
+    def raw_text(self) -> str:
+        """El raw como texto JSON."""
+        return self.header.json(self.values)
+
+    def raw_json(self) -> Jsonb:
+        """El raw listo para una columna jsonb."""
+        return Jsonb(self, _dump_raw)
+
+    def wire(self, columns: Sequence[str]) -> list:
+        """Valores en el orden de ``columns`` para el loader (None si el registro no la tiene)."""
+        return [self.raw_json() if c == "raw" else getattr(self, c, None) for c in columns]
+
+    # Acceso tipo dict, para el código que trata filas mapeadas como dicts
+    def get(self, key: str, default: Any = None) -> Any:
+        if key == "raw":
+            return self.raw()
+        if key in self.COLUMNS:
+            return getattr(self, key)
+        return default
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "raw":
+            return self.raw()
+        if key not in self.COLUMNS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in self.COLUMNS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.COLUMNS + ("raw",)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """La fila como dict, con la forma de los mappers antiguos."""
+        row = {c: getattr(self, c) for c in self.COLUMNS}
+        row["raw"] = self.raw()
+        return row
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, Record):
+            return type(self) is type(other) and self.as_dict() == other.as_dict()
+        if isinstance(other, dict):
+            return self.as_dict() == other
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{c}={getattr(self, c)!r}" for c in self.COLUMNS)
+        return f"{type(self).__name__}({fields})"
+
+
+class AppointmentRecord(Record):
+    __slots__ = _columns("appointments")
+    ENTITY = "appointments"
+    COLUMNS = __slots__
+
+    def __init__(
+        self,
+        header: Header,
+        values: Tuple[Any, ...],
+        id: str,
+        customer_name: Optional[str],
+        customer_email: Optional[str],
+        service_name: Optional[str],
+        starts_at: Optional[str],
+        status: Optional[str],
+    ):
+        self.header = header
+        self.values = values
+        self.id = id
+        self.customer_name = customer_name
+        self.customer_email = customer_email
+        self.service_name = service_name
+        self.starts_at = starts_at
+        self.status = status
+
+
+class CustomerRecord(Record):
+    __slots__ = _columns("customers")
+    ENTITY = "customers"
+    COLUMNS = __slots__
+
+    def __init__(
+        self,
+        header: Header,
+        values: Tuple[Any, ...],
+        id: str,
+        name: Optional[str],
+        email: Optional[str],
+        phone: Optional[str],
+        status: Optional[str] = None,
+    ):
+        self.header = header
+        self.values = values
+        self.id = id
+        self.name = name
+        self.email = email
+        self.phone = phone
+        self.status = status
+
+
+class PaymentRecord(Record):
+    __slots__ = _columns("payments")
+    ENTITY = "payments"
+    COLUMNS = __slots__
+
+    def __init__(
+        self,
+        header: Header,
+        values: Tuple[Any, ...],
+        id: str,
+        appointment_id: Optional[str],
+        amount: Optional[float],
+        currency: Optional[str],
+        status: Optional[str],
+        method: Optional[str],
+        paid_at: Optional[str],
+    ):
+        self.header = header
+        self.values = values
+        self.id = id
+        self.appointment_id = appointment_id
+        self.amount = amount
+        self.currency = currency
+        self.status = status
+        self.method = method
+        self.paid_at = paid_at
@@ -1,7 +1,8 @@
 """
-Runner simple SIN APScheduler - usa loop + sleep
+Runner simple SIN APScheduler - usa jobs.scheduler (heap + pool de workers)
 Compatible con Railway y más confiable
 """
+import argparse
 import os
 import sys
 import time
@@ -14,9 +15,12 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
+from db import profiling
 from db.utils import run_with_job_meta, print_db_identity
 from db.migrate import ensure_schema
+from jobs import metrics
 from jobs.job_scrape_booknetic import run as run_booknetic
+from jobs.scheduler import Scheduler, make_trigger
 
 # Importar dotenv solo si está disponible (para desarrollo local)
 try:
@@ -57,15 +61,15 @@ def load_env() -> None:
         print("[env] Using system environment variables (Railway mode)")
 
 
-def run_job_safely(job_name: str, job_func):
-    """Ejecuta un job con manejo de errores"""
+def run_job_safely(job_name: str, job_func, profile=None):
+    """Ejecuta un job con manejo de errores (profile: ver db.utils.run_with_job_meta)"""
     try:
         print(f"\n{'='*60}")
         print(f"🚀 Ejecutando job: {job_name}")
         print(f"⏰ Hora: {dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"{'='*60}\n")
         
-        run_with_job_meta(job_name, job_func)
+        run_with_job_meta(job_name, job_func, profile=profile)
         
         print(f"\n✅ Job '{job_name}' completado exitosamente\n")
     except Exception as e:
@@ -74,9 +78,34 @@ def run_job_safely(job_name: str, job_func):
         traceback.print_exc()
 
 
-def main() -> None:
-    """Main loop - ejecuta jobs cada X minutos"""
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="HotBoat ETL runner")
+    parser.add_argument("--profile", action="store_true",
+                        help="perfilar (cProfile) todas las ejecuciones de este proceso")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="con --profile/--profile-next, registrar también asignaciones de memoria")
+    parser.add_argument("--profile-next", metavar="JOB", nargs="?", const=profiling.ALL_JOBS,
+                        help="marcar en la DB la próxima ejecución de JOB (o de cualquier job) para perfilar, y salir")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    """Main loop - programa los jobs y duerme hasta el próximo vencimiento"""
+    args = parse_args(argv)
     load_env()
+
+    if args.profile_next:
+        # One-shot: el runner desplegado lo consume en su próxima ejecución, sin redeploy
+        profiling.request_next(args.profile_next, trace_memory=args.tracemalloc)
+        print(f"[profile] próxima ejecución de '{args.profile_next}' será perfilada")
+        return
+    if args.tracemalloc:
+        profiling.PROFILE_TRACEMALLOC = True
+    profile = True if args.profile else None
+
+    # /metrics y /healthz en un hilo aparte
+    if metrics.METRICS_ENABLED:
+        metrics.start()
     
     print("="*60)
     print("🚀 HotBoat ETL - Runner Simple (SIN APScheduler)")
@@ -87,57 +116,56 @@ def main() -> None:
     print_db_identity()
     ensure_schema()
     
-    # Configuración de intervalos (en segundos)
+    # Configuración de intervalos (en segundos) o expresiones cron (*_CRON)
     BOOKNETIC_INTERVAL = int(os.getenv("BOOKNETIC_INTERVAL", "900"))  # 15 min por defecto
     SHEETS_INTERVAL = int(os.getenv("SHEETS_INTERVAL", "600"))  # 10 min por defecto
-    
+    booknetic_trigger = make_trigger(os.getenv("BOOKNETIC_CRON"), BOOKNETIC_INTERVAL)
+    sheets_trigger = make_trigger(os.getenv("SHEETS_CRON"), SHEETS_INTERVAL)
+
+    scheduler = Scheduler(
+        max_workers=int(os.getenv("SCHEDULER_WORKERS", "2")),
+        jitter=float(os.getenv("SCHEDULER_JITTER_SECONDS", "0")),
+        misfire_policy=os.getenv("SCHEDULER_MISFIRE_POLICY", "run_once").strip().lower(),
+    )
+
     print(f"⚙️ Configuración:")
-    print(f"   - Booknetic: cada {BOOKNETIC_INTERVAL//60} minutos")
+    print(f"   - Booknetic: {booknetic_trigger}")
     if SHEETS_ENABLED:
-        print(f"   - Sheets: cada {SHEETS_INTERVAL//60} minutos")
+        print(f"   - Sheets: {sheets_trigger}")
     else:
         print(f"   - Sheets: DESHABILITADO")
+    print(f"   - Workers: {scheduler.max_workers}, jitter: {scheduler.jitter:g}s, "
+          f"ejecuciones perdidas: {scheduler.misfire_policy}")
     print()
-    
-    # Ejecutar Booknetic inmediatamente al inicio
-    print("🔷 Ejecución inicial de Booknetic...")
-    run_job_safely("booknetic_scrape", run_booknetic)
-    
-    last_booknetic_run = time.time()
-    last_sheets_run = time.time()
-    
+
+    # Booknetic se ejecuta inmediatamente al inicio
+    scheduler.add_job(
+        "booknetic_scrape",
+        lambda: run_job_safely("booknetic_scrape", run_booknetic, profile),
+        booknetic_trigger,
+        run_immediately=True,
+    )
+    metrics.expect_job("booknetic_scrape")
+    if SHEETS_ENABLED:
+        scheduler.add_job(
+            "sheets_import",
+            lambda: run_job_safely("sheets_import", run_sheets, profile),
+            sheets_trigger,
+        )
+        metrics.expect_job("sheets_import")
+
     print("\n" + "="*60)
-    print("⏰ Loop iniciado - Esperando próximas ejecuciones...")
+    print("⏰ Scheduler iniciado - Esperando próximas ejecuciones...")
     print("="*60)
     print()
-    
+
     try:
-        while True:
-            current_time = time.time()
-            
-            # Ejecutar Booknetic si pasó el intervalo
-            if current_time - last_booknetic_run >= BOOKNETIC_INTERVAL:
-                run_job_safely("booknetic_scrape", run_booknetic)
-                last_booknetic_run = current_time
-            
-            # Ejecutar Sheets si está habilitado y pasó el intervalo
-            if SHEETS_ENABLED and current_time - last_sheets_run >= SHEETS_INTERVAL:
-                run_job_safely("sheets_import", run_sheets)
-                last_sheets_run = current_time
-            
-            # Calcular tiempo hasta próxima ejecución
-            time_to_next_booknetic = BOOKNETIC_INTERVAL - (current_time - last_booknetic_run)
-            next_run = dt.datetime.now() + dt.timedelta(seconds=time_to_next_booknetic)
-            
-            print(f"💤 Esperando... Próxima ejecución de Booknetic: {next_run.strftime('%H:%M:%S')}")
-            
-            # Dormir por 60 segundos (1 minuto)
-            time.sleep(60)
-            
+        scheduler.run_forever()
     except (KeyboardInterrupt, SystemExit):
         print("\n" + "="*60)
         print("🛑 Runner detenido")
         print("="*60)
+        scheduler.shutdown(wait=False)
         time.sleep(0.5)
 
 
@@ -0,0 +1,257 @@
+"""
+Scheduler simple para el runner: cola de prioridad (heap) de próximas
+ejecuciones, duerme exactamente hasta el próximo job vencido y ejecuta los jobs
+en un pool de workers.
+
+- Triggers: IntervalTrigger (cada N segundos) y CronTrigger (5 campos estilo cron).
+- Un mismo job nunca corre solapado consigo mismo.
+- Jitter configurable (se suma a cada ejecución, sin acumular deriva).
+- Política de ejecuciones perdidas (job aún corriendo o proceso atrasado):
+    "run_once": se ejecuta una sola vez apenas se pueda (las demás se fusionan)
+    "skip": se descartan y se espera al próximo horario futuro
+"""
+import datetime as dt
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional, Set, Tuple
+
+MISFIRE_POLICIES = ("run_once", "skip")
+
+
+class IntervalTrigger:
+    def __init__(self, seconds: float):
+        if seconds <= 0:
+            raise ValueError("interval must be > 0 seconds")
+        self.seconds = seconds
+
+    def next_after(self, t: float) -> float:
+        return t + self.seconds
+
+    def __repr__(self) -> str:
+        return f"every {self.seconds:g}s"
+
+
+def _parse_cron_field(field: str, lo: int, hi: int) -> Set[int]:
+    values: Set[int] = set()
+    for part in field.split(","):
+        expr, _, step_s = part.partition("/")
+        step = int(step_s) if step_s else 1
+        if step <= 0:
+            raise ValueError(f"invalid cron step in {field!r}")
+        if expr == "*":
+            start, end = lo, hi
+        elif "-" in expr:
+            a, b = expr.split("-", 1)
+            start, end = int(a), int(b)
+        else:
+            start = int(expr)
+            end = hi if step_s else start
+        if start < lo or end > hi or start > end:
+            raise ValueError(f"cron field {field!r} out of range {lo}-{hi}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronTrigger:
+    """
+    Expresión cron de 5 campos: minuto hora día-del-mes mes día-de-semana
+    (0 o 7 = domingo), en hora local del proceso. Soporta *, a-b, listas y /paso.
+    Como en cron, si día-del-mes y día-de-semana están restringidos basta con uno.
+    """
+
+    def __init__(self, expr: str):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron expression needs 5 fields: {expr!r}")
+        self.expr = expr
+        self.minutes = _parse_cron_field(fields[0], 0, 59)
+        self.hours = _parse_cron_field(fields[1], 0, 23)
+        self.days = _parse_cron_field(fields[2], 1, 31)
+        self.months = _parse_cron_field(fields[3], 1, 12)
+        self.weekdays = {d % 7 for d in _parse_cron_field(fields[4], 0, 7)}
+        self._dom_any = fields[2] == "*"
+        self._dow_any = fields[4] == "*"
+
+    def _day_matches(self, d: dt.datetime) -> bool:
+        dom = d.day in self.days
+        dow = (d.isoweekday() % 7) in self.weekdays
+        if self._dom_any or self._dow_any:
+            return dom and dow
+        return dom or dow
+
+    def next_after(self, t: float) -> float:
+        d = dt.datetime.fromtimestamp(t).replace(second=0, microsecond=0) + dt.timedelta(minutes=1)
+        limit = d + dt.timedelta(days=366 * 5)
+        while d < limit:
+            if d.month not in self.months:
+                d = (d.replace(day=1) + dt.timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self._day_matches(d):
+                d = (d + dt.timedelta(days=1)).replace(hour=0, minute=0)
+            elif d.hour not in self.hours:
+                d = (d + dt.timedelta(hours=1)).replace(minute=0)
+            elif d.minute not in self.minutes:
+                d += dt.timedelta(minutes=1)
+            else:
+                return d.timestamp()
+        raise ValueError(f"cron expression never fires: {self.expr!r}")
+
+    def __repr__(self) -> str:
+        return f"cron '{self.expr}'"
+
+
+def make_trigger(cron: Optional[str], interval_seconds: float):
+    """CronTrigger si hay expresión cron, si no IntervalTrigger."""
+    if cron and cron.strip():
+        return CronTrigger(cron.strip())
+    return IntervalTrigger(interval_seconds)
+
+
+class ScheduledJob:
+    def __init__(self, name: str, func: Callable[[], None], trigger, jitter: float):
+        self.name = name
+        self.func = func
+        self.trigger = trigger
+        self.jitter = jitter
+        self.base_time = 0.0  # horario teórico, sin jitter (evita deriva)
+        self.due_time = 0.0
+        self.running = False
+        self.missed = False
+        self.last_started: Optional[float] = None
+        self.last_finished: Optional[float] = None
+
+
+class Scheduler:
+    def __init__(
+        self,
+        max_workers: int = 2,
+        jitter: float = 0.0,
+        misfire_policy: str = "run_once",
+        clock: Callable[[], float] = time.time,
+    ):
+        if misfire_policy not in MISFIRE_POLICIES:
+            raise ValueError(f"misfire_policy must be one of {MISFIRE_POLICIES}, got {misfire_policy!r}")
+        self.max_workers = max(1, max_workers)
+        self.jitter = jitter
+        self.misfire_policy = misfire_policy
+        self._clock = clock
+        self.jobs: List[ScheduledJob] = []
+        self._heap: List[Tuple[float, int, ScheduledJob]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], None],
+        trigger,
+        run_immediately: bool = False,
+        jitter: Optional[float] = None,
+    ) -> ScheduledJob:
+        job = ScheduledJob(name, func, trigger, self.jitter if jitter is None else jitter)
+        now = self._clock()
+        with self._cond:
+            self.jobs.append(job)
+            if run_immediately:
+                job.base_time = now
+                self._push(job, now)
+            else:
+                self._schedule_from(job, now)
+            self._cond.notify()
+        return job
+
+    # -- internals (llamar con self._cond tomado) --
+
+    def _push(self, job: ScheduledJob, due: float) -> None:
+        job.due_time = due
+        heapq.heappush(self._heap, (due, next(self._seq), job))
+
+    def _schedule_from(self, job: ScheduledJob, base: float) -> None:
+        job.base_time = job.trigger.next_after(base)
+        jitter = random.uniform(0, job.jitter) if job.jitter > 0 else 0.0
+        self._push(job, job.base_time + jitter)
+
+    def _reschedule(self, job: ScheduledJob, now: float) -> None:
+        """Próxima ejecución tras la actual, aplicando la política de ejecuciones perdidas."""
+        base = job.trigger.next_after(job.base_time)
+        if base > now:
+            job.base_time = base
+            jitter = random.uniform(0, job.jitter) if job.jitter > 0 else 0.0
+            self._push(job, base + jitter)
+        else:
+            self._misfire(job, now)
+
+    def _misfire(self, job: ScheduledJob, now: float) -> None:
+        """Aplica la política a una ejecución que ya venció y no se hizo."""
+        if self.misfire_policy == "run_once":
+            print(f"[scheduler] {job.name}: ejecución atrasada, se ejecuta una vez ahora")
+            job.base_time = now
+            self._push(job, now)
+        else:
+            print(f"[scheduler] {job.name}: ejecuciones perdidas descartadas")
+            self._schedule_from(job, now)
+
+    def _start(self, job: ScheduledJob) -> None:
+        job.running = True
+        job.last_started = self._clock()
+        future = self._executor.submit(job.func)
+        future.add_done_callback(lambda f, job=job: self._finished(job, f))
+
+    def _finished(self, job: ScheduledJob, future: Future) -> None:
+        exc = future.exception()
+        if exc is not None:
+            print(f"[scheduler] {job.name} terminó con error: {exc}")
+        with self._cond:
+            now = self._clock()
+            job.running = False
+            job.last_finished = now
+            if job.missed:
+                # La ejecución pospuesta (job.due_time) ya venció mientras corría: se aplica
+                # la política desde ahora. No basta con el próximo horario tras base_time:
+                # si el atraso fue menor a un intervalo ese horario es futuro y se perdería.
+                job.missed = False
+                self._misfire(job, now)
+            self._cond.notify()
+
+    def _dispatch(self, job: ScheduledJob, now: float) -> None:
+        """Lanza ``job`` (ya sacado del heap por vencido) o lo marca pospuesto si sigue corriendo."""
+        if job.running:
+            # Nunca solapar un job consigo mismo: se reprograma al terminar
+            print(f"[scheduler] {job.name} sigue corriendo; ejecución pospuesta")
+            job.missed = True
+            return
+        self._start(job)
+        self._reschedule(job, now)
+
+    # -- API --
+
+    def run_forever(self) -> None:
+        """Loop principal: duerme hasta el próximo vencimiento y despacha jobs."""
+        announced: Optional[Tuple[float, int]] = None
+        with self._cond:
+            while not self._stopped:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                due, seq, job = self._heap[0]
+                now = self._clock()
+                if due > now:
+                    if announced != (due, seq):
+                        announced = (due, seq)
+                        when = dt.datetime.fromtimestamp(due).strftime("%H:%M:%S")
+                        print(f"💤 Esperando... Próxima ejecución: {job.name} a las {when}")
+                    self._cond.wait(due - now)
+                    continue
+                heapq.heappop(self._heap)
+                self._dispatch(job, now)
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._executor.shutdown(wait=wait)
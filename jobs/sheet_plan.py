@@ -0,0 +1,145 @@
+"""
+Plan de ingestión de Google Sheets, compilado una vez por ejecución.
+
+Toda la configuración (SHEETS_COL_MAP_JSON, SHEETS_COL_INDEX_JSON,
+SHEETS_ID_FIELDS, SHEETS_USE_EMAIL_AS_ID) y la normalización de headers se
+resuelven al construir el plan: headers normalizados, proyección de alias a
+índices de columna y posiciones de los campos del id. Cada fila se convierte
+luego con una proyección por índice, sin volver a leer env ni normalizar claves.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Campos destino que se pueden mapear desde alias/índices
+DEST_FIELDS = {"id", "name", "email", "phone"}
+
+
+def normalize_key(key: Optional[str]) -> str:
+    """Normaliza un header de la hoja: 'Full Name ' -> 'full_name'."""
+    return (key or "").strip().lower().replace(" ", "_")
+
+
+class SheetPlan:
+    """
+    ``keys[i]`` toma el valor de la columna ``sources[i]`` (None = siempre None).
+    El id faltante se deriva de ``id_positions`` (posiciones en ``keys``) y,
+    opcionalmente, del email.
+    """
+
+    __slots__ = ("keys", "sources", "id_pos", "email_pos", "id_positions", "use_email_as_id")
+
+    def __init__(
+        self,
+        columns: Dict[str, Optional[int]],
+        id_fields: Sequence[str],
+        use_email_as_id: bool,
+    ):
+        self.keys: Tuple[str, ...] = tuple(columns)
+        self.sources: Tuple[Optional[int], ...] = tuple(columns.values())
+        position = {k: i for i, k in enumerate(self.keys)}
+        self.id_pos = position.get("id")
+        self.email_pos = position.get("email")
+        self.id_positions: Optional[Tuple[Optional[int], ...]] = (
+            tuple(position.get(f) for f in id_fields) if id_fields else None
+        )
+        self.use_email_as_id = use_email_as_id
+
+    @classmethod
+    def for_headers(
+        cls,
+        headers: Sequence[Any],
+        col_map: Optional[Dict[str, str]],
+        id_fields: Sequence[str],
+        use_email_as_id: bool,
+    ) -> "SheetPlan":
+        # normalized header -> index (el último repetido gana, como al armar el dict por fila)
+        header_index: Dict[str, Optional[int]] = {}
+        for i, h in enumerate(headers):
+            header_index[normalize_key(h)] = i
+
+        columns = dict(header_index)
+        if col_map:
+            # origen -> destino (id/name/email/phone); no pisa columnas existentes
+            normalized_map = {normalize_key(k): v for k, v in col_map.items()}
+            for src_key, dest_key in normalized_map.items():
+                if dest_key in DEST_FIELDS and dest_key not in columns:
+                    columns[dest_key] = header_index.get(src_key)
+        return cls(columns, id_fields, use_email_as_id)
+
+    @classmethod
+    def for_indexes(
+        cls,
+        index_to_dest: Dict[int, str],
+        id_fields: Sequence[str],
+        use_email_as_id: bool,
+    ) -> "SheetPlan":
+        # Índices 1-based; fuera de rango -> None
+        columns: Dict[str, Optional[int]] = {}
+        for idx, dest in index_to_dest.items():
+            if dest in DEST_FIELDS:
+                columns[dest] = idx - 1 if idx >= 1 else None
+        return cls(columns, id_fields, use_email_as_id)
+
+    @classmethod
+    def from_env(cls, headers: Optional[Sequence[Any]]) -> "SheetPlan":
+        """Plan para la hoja actual: con headers, o modo sin headers (headers=None)."""
+        fields_csv = os.getenv("SHEETS_ID_FIELDS", "email,marca_temporal").strip()
+        id_fields = [normalize_key(f) for f in fields_csv.split(",") if f.strip()]
+        use_email_as_id = os.getenv("SHEETS_USE_EMAIL_AS_ID", "").strip().lower() in {"1", "true", "yes", "y"}
+        if headers is not None:
+            return cls.for_headers(headers, _col_map_from_env(), id_fields, use_email_as_id)
+        return cls.for_indexes(_index_map_from_env(), id_fields, use_email_as_id)
+
+    def record(self, row: Sequence[Any]) -> Dict[str, Any]:
+        """Fila de la hoja -> registro con alias e id."""
+        n = len(row)
+        values = [row[i] if i is not None and i < n else None for i in self.sources]
+        rec = dict(zip(self.keys, values))
+        if self.id_pos is not None and values[self.id_pos]:
+            return rec
+        if self.id_positions is not None:
+            raw = "||".join(
+                "" if p is None or values[p] is None else str(values[p]) for p in self.id_positions
+            )
+            rec["id"] = hashlib.sha1(raw.encode("utf-8")).hexdigest()  # stable deterministic id
+        elif self.use_email_as_id and self.email_pos is not None and values[self.email_pos]:
+            rec["id"] = values[self.email_pos]
+        return rec
+
+    def records(self, rows: Sequence[Sequence[Any]]) -> List[Dict[str, Any]]:
+        record = self.record
+        return [record(r) for r in rows]
+
+
+def _col_map_from_env() -> Optional[Dict[str, str]]:
+    # Optional column mapping from env JSON: {"id_cliente":"id","correo":"email"}
+    col_map_env = os.getenv("SHEETS_COL_MAP_JSON")
+    if not col_map_env:
+        return None
+    try:
+        col_map = json.loads(col_map_env)
+    except Exception:  # noqa: BLE001
+        return None
+    return col_map if isinstance(col_map, dict) else None
+
+
+def _index_map_from_env() -> Dict[int, str]:
+    # Column index mapping (1-based). Accepts either {"email":2, "id":5} or {"2":"email"}
+    index_map_env = os.getenv("SHEETS_COL_INDEX_JSON", "")
+    index_to_dest: Dict[int, str] = {}
+    if index_map_env:
+        try:
+            raw = json.loads(index_map_env)
+            # dest->index form
+            for k, v in raw.items():
+                if isinstance(v, int):
+                    index_to_dest[int(v)] = k
+            # index->dest form
+            for k, v in raw.items():
+                if isinstance(k, str) and k.isdigit():
+                    index_to_dest[int(k)] = str(v)
+        except Exception:  # noqa: BLE001
+            index_to_dest = {}
+    return index_to_dest
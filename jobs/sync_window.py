@@ -0,0 +1,128 @@
+"""
+Sync en dos niveles para Booknetic: ventana "caliente" + reconciliación completa.
+
+Las ejecuciones frecuentes solo procesan filas cuya fecha de inicio (o de
+creación) cae en la ventana caliente: citas recientes y próximas, que son las
+que cambian. Cada BOOKNETIC_FULL_RECONCILE_HOURS se hace una ejecución completa
+que recoge todo lo demás. La hora de la última ejecución completa se guarda en
+etl_state.
+
+La ventana activa se publica en un contextvar para que los exporters puedan
+filtrar el export en origen (BOOKNETIC_EXPORT_FILTER_QUERY) y marcar el alcance
+de sus fingerprints.
+"""
+import contextvars
+import datetime as dt
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, NamedTuple, Optional
+
+from db.state import get_state, set_state
+from jobs.dates import parse_date_flexible
+
+# "tiered" (ventana caliente + reconciliación completa) o "full" (siempre todo)
+SYNC_MODE = os.getenv("BOOKNETIC_SYNC_MODE", "tiered").strip().lower()
+HOT_WINDOW_PAST_DAYS = float(os.getenv("BOOKNETIC_HOT_WINDOW_PAST_DAYS", "14"))
+HOT_WINDOW_FUTURE_DAYS = float(os.getenv("BOOKNETIC_HOT_WINDOW_FUTURE_DAYS", "180"))
+FULL_RECONCILE_HOURS = float(os.getenv("BOOKNETIC_FULL_RECONCILE_HOURS", "24"))
+# Query string opcional para filtrar el export en origen, con {start}/{end} (YYYY-MM-DD),
+# p.ej. "filters[start_date]={start}&filters[end_date]={end}". Vacío = filtrar tras descargar.
+EXPORT_FILTER_QUERY = os.getenv("BOOKNETIC_EXPORT_FILTER_QUERY", "").strip()
+
+LAST_FULL_KEY = "booknetic:last_full_sync"
+
+# Campos (mapeados o en raw) que ubican una fila en el tiempo
+ROW_DATE_FIELDS = ("starts_at", "date", "paid_at")
+RAW_DATE_FIELDS = ("created_at", "start_date", "appointment_date")
+
+_ISO = "%Y-%m-%d %H:%M:%S"
+
+
+class SyncWindow(NamedTuple):
+    mode: str  # "full" | "hot"
+    start: Optional[dt.datetime] = None
+    end: Optional[dt.datetime] = None
+
+    @property
+    def is_hot(self) -> bool:
+        return self.mode == "hot"
+
+    def export_query(self) -> str:
+        """Query string para filtrar el export en origen ('' si no aplica)."""
+        if not self.is_hot or not EXPORT_FILTER_QUERY:
+            return ""
+        return EXPORT_FILTER_QUERY.format(start=self.start.strftime("%Y-%m-%d"), end=self.end.strftime("%Y-%m-%d"))
+
+    def contains(self, row: Dict[str, Any]) -> bool:
+        """
+        True si alguna fecha de la fila cae en la ventana. Filas sin ninguna
+        fecha reconocible se conservan (no se puede saber si cambiaron).
+        """
+        if not self.is_hot:
+            return True
+        start, end = self.start.strftime(_ISO), self.end.strftime(_ISO)
+        # Registros de jobs.records leen el raw sin armar el dict
+        raw_get = getattr(row, "raw_get", None)
+        if raw_get is None:
+            raw_get = (row.get("raw") if isinstance(row.get("raw"), dict) else {}).get
+        seen_date = False
+        for value in [row.get(f) for f in ROW_DATE_FIELDS] + [raw_get(f) for f in RAW_DATE_FIELDS]:
+            iso = parse_date_flexible(value) if isinstance(value, str) else None
+            if iso is None:
+                continue
+            seen_date = True
+            if start <= iso <= end:
+                return True
+        return not seen_date
+
+    def filter(self, rows: Iterable[Dict[str, Any]], stats: Dict[str, int]) -> Iterator[Dict[str, Any]]:
+        """Filtra ``rows`` en streaming; cuenta las descartadas en stats["skipped"]."""
+        for row in rows:
+            if self.contains(row):
+                yield row
+            else:
+                stats["skipped"] = stats.get("skipped", 0) + 1
+
+
+FULL = SyncWindow("full")
+
+
+def choose_window(now: Optional[float] = None) -> SyncWindow:
+    """Ventana caliente, o completa si toca reconciliar (o el modo es 'full')."""
+    now = time.time() if now is None else now
+    if SYNC_MODE != "tiered":
+        return FULL
+    try:
+        last_full = get_state(LAST_FULL_KEY)
+    except Exception as e:  # noqa: BLE001
+        print(f"[booknetic] could not read last full sync: {e}")
+        return FULL
+    if not last_full or now - float(last_full) >= FULL_RECONCILE_HOURS * 3600:
+        return FULL
+    today = dt.datetime.fromtimestamp(now)
+    return SyncWindow(
+        "hot",
+        today - dt.timedelta(days=HOT_WINDOW_PAST_DAYS),
+        today + dt.timedelta(days=HOT_WINDOW_FUTURE_DAYS),
+    )
+
+
+def mark_full_sync(when: Optional[float] = None) -> None:
+    set_state(LAST_FULL_KEY, time.time() if when is None else when)
+
+
+_current: contextvars.ContextVar[SyncWindow] = contextvars.ContextVar("sync_window", default=FULL)
+
+
+def current_window() -> SyncWindow:
+    return _current.get()
+
+
+@contextmanager
+def activate(window: SyncWindow) -> Iterator[SyncWindow]:
+    token = _current.set(window)
+    try:
+        yield window
+    finally:
+        _current.reset(token)
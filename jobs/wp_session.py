@@ -0,0 +1,167 @@
+"""
+Sesión de WordPress persistida entre ejecuciones.
+
+El cookie jar autenticado se guarda en etl_state (una fila por base_url+usuario)
+con expiración tomada de la cookie wordpress_logged_in_*. En la siguiente
+ejecución se restaura y se valida con un request barato (profile.php sin seguir
+redirects); solo si la sesión no es válida se vuelve a hacer login.
+Lo comparten todos los exporters/plugins que usan requests.
+"""
+import hashlib
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import unquote
+
+import requests
+
+from db.state import delete_state, get_state, set_state
+
+# Reusar la sesión guardada (0 = login en cada ejecución, como antes)
+SESSION_CACHE_ENABLED = os.getenv("WP_SESSION_CACHE", "1").strip().lower() in {"1", "true", "yes", "y"}
+# Vida asumida si la cookie no trae expiración
+DEFAULT_TTL_SECONDS = int(os.getenv("WP_SESSION_TTL_SECONDS", str(12 * 3600)))
+# Margen para no reusar una sesión que está por expirar
+EXPIRY_MARGIN_SECONDS = 300
+
+LOGGED_IN_PREFIX = "wordpress_logged_in_"
+
+
+def has_login_cookie(session: requests.Session) -> bool:
+    # WordPress sets cookies named like 'wordpress_logged_in_<hash>'
+    return any(k.startswith(LOGGED_IN_PREFIX) for k in session.cookies.keys())
+
+
+def session_key(base_url: str, username: str) -> str:
+    digest = hashlib.sha1(f"{base_url.rstrip('/')}|{username}".encode("utf-8")).hexdigest()[:16]
+    return f"wp:session:{digest}"
+
+
+def _session_expiry(session: requests.Session) -> Optional[float]:
+    """
+    Expiración de la sesión según la cookie wordpress_logged_in_*: el menor entre
+    el Expires de la cookie y el timestamp embebido en su valor
+    (usuario|expiración|token|hmac).
+    """
+    expiry: Optional[float] = None
+    for c in session.cookies:
+        if not c.name.startswith(LOGGED_IN_PREFIX):
+            continue
+        candidates: List[float] = []
+        if c.expires:
+            candidates.append(float(c.expires))
+        parts = unquote(c.value or "").split("|")
+        if len(parts) >= 2 and parts[1].isdigit():
+            candidates.append(float(parts[1]))
+        if candidates:
+            expiry = min(candidates) if expiry is None else min(expiry, *candidates)
+    return expiry
+
+
+def _dump_cookies(session: requests.Session) -> List[Dict[str, Any]]:
+    return [
+        {
+            "name": c.name,
+            "value": c.value,
+            "domain": c.domain,
+            "path": c.path,
+            "secure": c.secure,
+            "expires": c.expires,
+            "rest": dict(getattr(c, "_rest", {}) or {}),
+        }
+        for c in session.cookies
+    ]
+
+
+def _load_cookies(session: requests.Session, cookies: List[Dict[str, Any]]) -> None:
+    for c in cookies:
+        session.cookies.set(
+            c["name"],
+            c["value"],
+            domain=c.get("domain") or "",
+            path=c.get("path") or "/",
+            secure=bool(c.get("secure")),
+            expires=c.get("expires"),
+            rest=c.get("rest") or {},
+        )
+
+
+def probe_session(session: requests.Session, base_url: str) -> bool:
+    """True si la sesión sigue autenticada (profile.php responde 200 sin redirigir al login)."""
+    try:
+        resp = session.get(
+            base_url.rstrip("/") + "/wp-admin/profile.php",
+            allow_redirects=False,
+            timeout=30,
+        )
+    except requests.RequestException as e:
+        print(f"[wp-session] probe failed: {e}")
+        return False
+    return resp.status_code == 200
+
+
+def restore_session(session: requests.Session, base_url: str, username: str) -> bool:
+    """Carga las cookies guardadas en ``session`` y las valida; False si hay que hacer login."""
+    key = session_key(base_url, username)
+    try:
+        saved = get_state(key)
+    except Exception as e:  # noqa: BLE001
+        print(f"[wp-session] could not read cached session: {e}")
+        return False
+    if not saved:
+        return False
+    if saved.get("expires_at") and saved["expires_at"] - EXPIRY_MARGIN_SECONDS < time.time():
+        return False
+
+    _load_cookies(session, saved.get("cookies") or [])
+    if has_login_cookie(session) and probe_session(session, base_url):
+        return True
+
+    print("[wp-session] cached session is no longer valid")
+    session.cookies.clear()
+    try:
+        delete_state(key)
+    except Exception as e:  # noqa: BLE001
+        print(f"[wp-session] could not delete cached session: {e}")
+    return False
+
+
+def save_session(session: requests.Session, base_url: str, username: str) -> None:
+    expires_at = _session_expiry(session)
+    ttl = (expires_at - time.time()) if expires_at else DEFAULT_TTL_SECONDS
+    if ttl <= EXPIRY_MARGIN_SECONDS:
+        return
+    try:
+        set_state(
+            session_key(base_url, username),
+            {"cookies": _dump_cookies(session), "expires_at": expires_at, "saved_at": time.time()},
+            ttl_seconds=ttl,
+        )
+    except Exception as e:  # noqa: BLE001
+        print(f"[wp-session] could not persist session: {e}")
+
+
+def ensure_logged_in(
+    session: requests.Session,
+    base_url: str,
+    username: str,
+    login: Callable[[], Any],
+) -> bool:
+    """
+    Deja ``session`` autenticada: reusa la sesión guardada si sigue válida y si no
+    llama a ``login()`` y persiste el resultado. ``login`` puede retornar False
+    o lanzar excepción si falla. Retorna True si la sesión quedó autenticada.
+    """
+    if SESSION_CACHE_ENABLED and restore_session(session, base_url, username):
+        print("[wp-session] reusing cached WordPress session (login skipped)")
+        return True
+
+    ok = login()
+    if ok is False:
+        return False
+    if not has_login_cookie(session):
+        # Sin cookie de login no hay nada que persistir
+        return bool(ok)
+    if SESSION_CACHE_ENABLED:
+        save_session(session, base_url, username)
+    return True
@@ -1,6 +1,14 @@
 from typing import Any, Dict, List
 
 
+def probe() -> bool:
+    """
+    Chequeo barato para el registro de plugins (jobs.plugin_registry): sin login
+    ni descargas. El ejemplo no entrega datos, así que nunca se autodetecta.
+    """
+    return False
+
+
 def fetch() -> List[Dict[str, Any]]:
     """
     Ejemplo de interfaz para tu scraper existente.
@@ -1,5 +1,4 @@
 import csv
-import hashlib
 import os
 import time
 from datetime import datetime
@@ -8,17 +7,7 @@ from typing import Any, Dict, List, Optional
 import requests
 import io
 
-
-def _normalize_key(key: str) -> str:
-    return (key or "").strip().lower().replace(" ", "_")
-
-
-def _detect_field(row: Dict[str, Any], contains: List[str]) -> Optional[str]:
-    for k in row.keys():
-        nk = _normalize_key(k)
-        if any(token in nk for token in contains):
-            return k
-    return None
+from plugins.header_plan import FieldSpec, plan_for_row
 
 
 def _parse_csv(path: Path) -> List[Dict[str, Any]]:
@@ -39,40 +28,57 @@ def _parse_csv_text(text: str) -> List[Dict[str, Any]]:
     return items
 
 
+# Heurística para extraer campos comunes, resuelta una vez por encabezado (plugins.header_plan)
+APPOINTMENT_FIELDS: FieldSpec = (
+    ("id", (("appointment_id", "appointmentid", "booking_id", "bookingid", "id", "ID"),)),  # id preferente
+    ("customer_name", (("name", "customer", "cliente"),)),
+    ("customer_email", (("email", "correo", "e-mail", "mail"),)),
+    ("service_name", (("service", "servicio"),)),
+    ("starts_at", (("start", "fecha", "date", "hora", "start_time"),)),  # flexible
+    ("status", (("status", "estado"),)),
+)
+
+
 def _best_effort_map(row: Dict[str, Any]) -> Dict[str, Any]:
-    # Heurística para extraer campos comunes
-    email_k = _detect_field(row, ["email", "correo", "e-mail", "mail"])
-    name_k = _detect_field(row, ["name", "customer", "cliente"])
-    service_k = _detect_field(row, ["service", "servicio"])
-    start_k = _detect_field(row, ["start", "fecha", "date", "hora", "start_time"])  # flexible
-    status_k = _detect_field(row, ["status", "estado"])
-    id_k = _detect_field(row, ["appointment_id", "appointmentid", "booking_id", "bookingid", "id", "ID"])  # id preferente
-
-    raw_id = row.get(id_k) if id_k else None
+    plan = plan_for_row(row, APPOINTMENT_FIELDS)
+    values = list(row.values())
+
+    mapped = plan.project(values)
+    raw_id = mapped["id"]
     if isinstance(raw_id, str):
-        raw_id = raw_id.strip() or None
-
-    mapped: Dict[str, Any] = {
-        "id": raw_id,
-        "customer_name": row.get(name_k) if name_k else None,
-        "customer_email": row.get(email_k) if email_k else None,
-        "service_name": row.get(service_k) if service_k else None,
-        "starts_at": row.get(start_k) if start_k else None,
-        "status": row.get(status_k) if status_k else None,
-        "raw": { _normalize_key(k): v for k, v in row.items() },
-    }
+        mapped["id"] = raw_id.strip() or None
+    mapped["raw"] = plan.raw(values)
 
     # Genera id estable si falta: hash de todo el row normalizado y ordenado
     if not mapped["id"]:
-        pieces = [f"{_normalize_key(k)}={str(v).strip()}" for k, v in sorted(row.items(), key=lambda kv: _normalize_key(kv[0]))]
-        fallback_raw = "|".join(pieces)
-        mapped["id"] = hashlib.sha1(fallback_raw.encode("utf-8")).hexdigest()
+        mapped["id"] = plan.fallback_id(values)
     return mapped
 
 
+CAPABILITIES = ("appointments",)
+
+
+def _export_url() -> Optional[str]:
+    return os.getenv("BOOKNETIC_EXPORT_URL_APPOINTMENTS") or os.getenv("BOOKNETIC_EXPORT_URL")
+
+
+def _export_dir() -> Path:
+    return Path(os.getenv("BOOKNETIC_EXPORT_DIR", os.path.join(os.getcwd(), "archivos_input", "Archivos input reservas")))
+
+
+def probe() -> bool:
+    """Disponible si hay URL de export, script de export o CSVs en el directorio; no descarga nada."""
+    if _export_url():
+        return True
+    if os.getenv("BOOKNETIC_USE_EXPORT_SCRIPT", "").strip().lower() in {"1", "true", "yes", "y"}:
+        return True
+    folder = _export_dir()
+    return folder.is_dir() and any(folder.glob("*.csv"))
+
+
 def fetch() -> List[Dict[str, Any]]:
     # 1) Prefer URLs si están definidas
-    url = os.getenv("BOOKNETIC_EXPORT_URL_APPOINTMENTS") or os.getenv("BOOKNETIC_EXPORT_URL")
+    url = _export_url()
     if url:
         try:
             resp = requests.get(url, timeout=90)
@@ -88,7 +94,6 @@ def fetch() -> List[Dict[str, Any]]:
             print(f"[booknetic-export] failed to load URL: {e}")
 
     # 2) Ejecutar script (opcional) y leer desde directorio
-    export_dir = os.getenv("BOOKNETIC_EXPORT_DIR", os.path.join(os.getcwd(), "archivos_input", "Archivos input reservas"))
     run_script = os.getenv("BOOKNETIC_USE_EXPORT_SCRIPT", "").strip().lower() in {"1", "true", "yes", "y"}
 
     if run_script:
@@ -98,7 +103,7 @@ def fetch() -> List[Dict[str, Any]]:
         except Exception as e:  # noqa: BLE001
             print(f"[booknetic-export] run failed: {e}")
 
-    folder = Path(export_dir)
+    folder = _export_dir()
     if not folder.exists():
         print(f"[booknetic-export] export_dir not found: {folder}")
         return []
@@ -5,6 +5,9 @@ Compatible con Railway
 """
 from typing import Any, Dict
 
+# El registro de plugins (jobs.plugin_registry) ejecuta directamente este módulo
+ALIAS_OF = "jobs.booknetic_export_requests"
+
 def fetch() -> Dict[str, Any]:
     """
     Fetch all Booknetic data using requests (no Selenium)
@@ -16,7 +19,7 @@ def fetch() -> Dict[str, Any]:
         print("[booknetic_full_export] Usando versión REQUESTS (rápida y confiable)")
         result = export_fetch()
         
-        print(f"[booknetic_full_export] Completado: {result}")
+        print(f"[booknetic_full_export] Completado: {sorted(result)}")
         return result
         
     except Exception as e:
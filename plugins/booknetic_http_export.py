@@ -1,21 +1,20 @@
 import csv
-import hashlib
 import io
+import os
 import re
-from typing import Any, Dict, List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import requests
 import json
 from urllib.parse import urljoin
 
-
-def _normalize_key(key: str) -> str:
-    return (key or "").strip().lower().replace(" ", "_")
-
-
-def _has_login_cookie(session: requests.Session) -> bool:
-    # WordPress sets cookies named like 'wordpress_logged_in_<hash>'
-    return any(k.startswith("wordpress_logged_in_") for k in session.cookies.keys())
+from db import job_run
+from db.state import delete_state, get_state, set_state
+from jobs.batches import Item, batched
+from jobs.wp_session import ensure_logged_in, has_login_cookie as _has_login_cookie
+from plugins.header_plan import FieldSpec, plan_for_row
 
 
 def _login_wp(session: requests.Session, base_url: str, username: str, password: str) -> None:
@@ -36,9 +35,40 @@ def _login_wp(session: requests.Session, base_url: str, username: str, password:
         raise RuntimeError("WordPress login failed - no login cookie present")
 
 
+MODULES = ("appointments", "customers", "payments")
+CAPABILITIES = MODULES
+
+
+def probe() -> bool:
+    """Cheap availability check for the plugin registry: config only, no login."""
+    base_url = os.getenv("BOOKNETIC_URL") or os.getenv("BOOKNETIC_BASE_URL")
+    return bool(base_url and os.getenv("BOOKNETIC_USERNAME") and os.getenv("BOOKNETIC_PASSWORD"))
+
+# Vida de una URL de export descubierta en etl_state (cambia casi nunca)
+EXPORT_URL_TTL = int(os.getenv("BOOKNETIC_EXPORT_URL_TTL", str(7 * 24 * 3600)))
+
+
+class ExportReturnedHTML(RuntimeError):
+    """The export URL answered with an HTML page (login/admin) instead of a CSV."""
+
+
+def _looks_like_html(resp: requests.Response) -> bool:
+    """Decide from the body: WordPress often serves CSV exports as text/html."""
+    head = resp.content[:512].lstrip(b"\xef\xbb\xbf \t\r\n").lower()
+    if head.startswith(b"<!doctype html") or head.startswith(b"<html"):
+        return True
+    # Content-Type is only a hint: an HTML fragment (login form, admin notice)
+    # starts with a tag, which a CSV header never does
+    return "text/html" in resp.headers.get("Content-Type", "").lower() and head.startswith(b"<")
+
+
 def _download_csv(session: requests.Session, url: str) -> List[Dict[str, Any]]:
+    started = time.perf_counter()
     resp = session.get(url, timeout=120)
     resp.raise_for_status()
+    if _looks_like_html(resp):
+        raise ExportReturnedHTML(f"export returned HTML instead of CSV: {url}")
+    job_run.add_bytes(len(resp.content), time.perf_counter() - started)
     # Decode handling BOM
     text = resp.content.decode("utf-8-sig", errors="replace")
     reader = csv.DictReader(io.StringIO(text))
@@ -67,101 +97,176 @@ def _discover_export_url(session: requests.Session, base_url: str, module: str)
     return base_url.rstrip('/') + f"/wp-admin/admin.php?page=booknetic&module={module}&action=export"
 
 
-def _best_map_appointment(row: Dict[str, Any]) -> Dict[str, Any]:
-    def find_key(tokens):
-        for k in row.keys():
-            nk = _normalize_key(k)
-            if any(t in nk for t in tokens):
-                return k
+def _export_url_key(module: str) -> str:
+    return f"booknetic:export_url:{module}"
+
+
+def _cached_export_url(base_url: str, module: str) -> Optional[str]:
+    try:
+        cached = get_state(_export_url_key(module))
+    except Exception as e:  # noqa: BLE001
+        print(f"[booknetic-http] export URL cache unavailable: {e}")
         return None
+    if cached and cached.get("base_url") == base_url.rstrip("/"):
+        return cached.get("url")
+    return None
 
-    email_k = find_key(["email"]) or find_key(["correo"])  # es/pt support
-    name_k = find_key(["name", "customer", "cliente"]) 
-    service_k = find_key(["service", "servicio"]) 
-    start_k = find_key(["start", "fecha", "date", "hora", "start_time"]) 
-    status_k = find_key(["status", "estado"]) 
-    id_k = find_key(["appointment_id", "appointmentid", "booking_id", "bookingid", "id", "ID"]) 
-
-    mapped = {
-        "id": row.get(id_k) if id_k else None,
-        "customer_name": row.get(name_k) if name_k else None,
-        "customer_email": row.get(email_k) if email_k else None,
-        "service_name": row.get(service_k) if service_k else None,
-        "starts_at": row.get(start_k) if start_k else None,
-        "status": row.get(status_k) if status_k else None,
-        "raw": { _normalize_key(k): v for k, v in row.items() },
-    }
+
+def _remember_export_url(base_url: str, module: str, url: str) -> None:
+    try:
+        set_state(
+            _export_url_key(module),
+            {"base_url": base_url.rstrip("/"), "url": url},
+            ttl_seconds=EXPORT_URL_TTL,
+        )
+    except Exception as e:  # noqa: BLE001
+        print(f"[booknetic-http] could not cache export URL for {module}: {e}")
+
+
+def _forget_export_url(module: str) -> None:
+    try:
+        delete_state(_export_url_key(module))
+    except Exception as e:  # noqa: BLE001
+        print(f"[booknetic-http] could not invalidate export URL for {module}: {e}")
+
+
+def _clone_session(session: requests.Session) -> requests.Session:
+    """Session for a worker thread sharing the authenticated cookies."""
+    s = requests.Session()
+    s.headers.update(session.headers)
+    s.cookies.update(session.cookies)
+    return s
+
+
+def _discover_export_urls(session: requests.Session, base_url: str, modules: Tuple[str, ...]) -> Dict[str, str]:
+    """Discover several modules' export URLs concurrently (one admin page load each)."""
+    if not modules:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(modules)) as pool:
+        futures = {m: pool.submit(_discover_export_url, _clone_session(session), base_url, m) for m in modules}
+        return {m: f.result() for m, f in futures.items()}
+
+
+def _resolve_export_urls(session: requests.Session, base_url: str) -> Dict[str, Tuple[str, bool]]:
+    """{module: (url, from_cache)}; cache misses are rediscovered concurrently."""
+    resolved: Dict[str, Tuple[str, bool]] = {}
+    for m in MODULES:
+        url = _cached_export_url(base_url, m)
+        if url:
+            resolved[m] = (url, True)
+    missing = tuple(m for m in MODULES if m not in resolved)
+    for m, url in _discover_export_urls(session, base_url, missing).items():
+        resolved[m] = (url, False)
+    if resolved:
+        print(f"[booknetic-http] export URLs: cached={len(MODULES) - len(missing)} discovered={len(missing)}")
+    return resolved
+
+
+def _download_module(
+    session: requests.Session, base_url: str, module: str, url: str, from_cache: bool
+) -> List[Dict[str, Any]]:
+    """
+    Download one module's CSV. A URL that yields CSV is cached; a cached URL that
+    now returns HTML is invalidated and rediscovered once.
+    """
+    try:
+        rows = _download_csv(session, url)
+    except ExportReturnedHTML:
+        if not from_cache:
+            raise
+        print(f"[booknetic-http] cached export URL for {module} returned HTML; rediscovering")
+        _forget_export_url(module)
+        url = _discover_export_url(session, base_url, module)
+        rows = _download_csv(session, url)
+        from_cache = False
+    if not from_cache:
+        _remember_export_url(base_url, module, url)
+    return rows
+
+
+# Column heuristics, resolved once per CSV header by plugins.header_plan
+APPOINTMENT_FIELDS: FieldSpec = (
+    ("id", (("appointment_id", "appointmentid", "booking_id", "bookingid", "id", "ID"),)),
+    ("customer_name", (("name", "customer", "cliente"),)),
+    ("customer_email", (("email",), ("correo",))),  # es/pt support
+    ("service_name", (("service", "servicio"),)),
+    ("starts_at", (("start", "fecha", "date", "hora", "start_time"),)),
+    ("status", (("status", "estado"),)),
+)
+
+CUSTOMER_FIELDS: FieldSpec = (
+    ("id", (("customer_id", "id", "ID"),)),
+    ("name", (("name", "customer", "cliente"),)),
+    ("email", (("email", "correo"),)),
+    ("phone", (("phone", "telefono", "tel"),)),
+    ("status", (("status", "estado"),)),
+)
+
+PAYMENT_FIELDS: FieldSpec = (
+    ("id", (("payment_id", "id", "ID"),)),
+    ("appointment_id", (("appointment_id", "appointmentid", "booking_id", "bookingid"),)),
+    ("amount", (("amount", "total", "monto"),)),
+    ("currency", (("currency", "moneda"),)),
+    ("status", (("status", "estado"),)),
+    ("method", (("method", "metodo"),)),
+    ("paid_at", (("date", "paid_at", "fecha"),)),
+)
+
+
+def _best_map_appointment(row: Dict[str, Any]) -> Dict[str, Any]:
+    plan = plan_for_row(row, APPOINTMENT_FIELDS)
+    values = list(row.values())
+
+    mapped = plan.project(values)
+    mapped["raw"] = plan.raw(values)
     if not mapped["id"]:
-        pieces = [f"{_normalize_key(k)}={str(v).strip()}" for k, v in sorted(row.items(), key=lambda kv: _normalize_key(kv[0]))]
-        fallback_raw = "|".join(pieces)
-        mapped["id"] = hashlib.sha1(fallback_raw.encode("utf-8")).hexdigest()
+        mapped["id"] = plan.fallback_id(values)
     return mapped
 
 
 def _best_map_customer(row: Dict[str, Any]) -> Dict[str, Any]:
-    def fk(tokens):
-        for k in row.keys():
-            nk = _normalize_key(k)
-            if any(t in nk for t in tokens):
-                return k
-        return None
+    plan = plan_for_row(row, CUSTOMER_FIELDS)
+    values = list(row.values())
 
-    id_k = fk(["customer_id", "id", "ID"]) 
-    name_k = fk(["name", "customer", "cliente"]) 
-    email_k = fk(["email", "correo"]) 
-    phone_k = fk(["phone", "telefono", "tel"])
-
-    mapped = {
-        "id": row.get(id_k) if id_k else None,
-        "name": row.get(name_k) if name_k else None,
-        "email": row.get(email_k) if email_k else None,
-        "phone": row.get(phone_k) if phone_k else None,
-        "status": row.get(fk(["status", "estado"])) if fk(["status", "estado"]) else None,
-        "raw": { _normalize_key(k): v for k, v in row.items() },
-    }
+    mapped = plan.project(values)
+    mapped["raw"] = plan.raw(values)
     if not mapped["id"]:
-        pieces = [f"{_normalize_key(k)}={str(v).strip()}" for k, v in sorted(row.items(), key=lambda kv: _normalize_key(kv[0]))]
-        fallback_raw = "|".join(pieces)
-        mapped["id"] = hashlib.sha1(fallback_raw.encode("utf-8")).hexdigest()
+        mapped["id"] = plan.fallback_id(values)
     return mapped
 
 
-def _best_map_payment(row: Dict[str, Any]) -> Dict[str, Any]:
-    def fk(tokens):
-        for k in row.keys():
-            nk = _normalize_key(k)
-            if any(t in nk for t in tokens):
-                return k
+def _norm_val(v):
+    if v is None:
         return None
+    if isinstance(v, (list, dict)):
+        return json.dumps(v, ensure_ascii=False, sort_keys=True)
+    return str(v)
 
-    def norm_val(v):
-        if v is None:
-            return None
-        if isinstance(v, (list, dict)):
-            return json.dumps(v, ensure_ascii=False, sort_keys=True)
-        return str(v)
-
-    mapped = {
-        "id": norm_val(row.get(fk(["payment_id", "id", "ID"]))),
-        "appointment_id": norm_val(row.get(fk(["appointment_id", "appointmentid", "booking_id", "bookingid"]))),
-        "amount": norm_val(row.get(fk(["amount", "total", "monto"]))),
-        "currency": norm_val(row.get(fk(["currency", "moneda"]))),
-        "status": norm_val(row.get(fk(["status", "estado"]))),
-        "method": norm_val(row.get(fk(["method", "metodo"]))),
-        "paid_at": norm_val(row.get(fk(["date", "paid_at", "fecha"]))),
-        "raw": { _normalize_key(k): v for k, v in row.items() },
-    }
+
+def _best_map_payment(row: Dict[str, Any]) -> Dict[str, Any]:
+    plan = plan_for_row(row, PAYMENT_FIELDS)
+    values = list(row.values())
+
+    mapped = {k: _norm_val(v) for k, v in plan.project(values).items()}
+    mapped["raw"] = plan.raw(values)
     if not mapped["id"]:
-        pieces = [f"{_normalize_key(k)}={str(v).strip()}" for k, v in sorted(row.items(), key=lambda kv: _normalize_key(kv[0]))]
-        fallback_raw = "|".join(pieces)
-        mapped["id"] = hashlib.sha1(fallback_raw.encode("utf-8")).hexdigest()
+        mapped["id"] = plan.fallback_id(values)
     return mapped
 
 
-def fetch() -> Dict[str, List[Dict[str, Any]]]:
-    """Login to WordPress and download Booknetic CSVs via HTTP (no browser)."""
-    import os
+_MAPPERS = (
+    ("appointments", _best_map_appointment),
+    ("customers", _best_map_customer),
+    ("payments", _best_map_payment),
+)
+
 
+def iter_batches() -> Iterator[Item]:
+    """
+    Login to WordPress and download Booknetic CSVs via HTTP (no browser), as
+    typed record batches (jobs.batches). Each module is yielded as soon as it
+    is downloaded and mapped, so it loads while the next one downloads.
+    """
     base_url = os.getenv("BOOKNETIC_URL") or os.getenv("BOOKNETIC_BASE_URL")
     username = os.getenv("BOOKNETIC_USERNAME")
     password = os.getenv("BOOKNETIC_PASSWORD")
@@ -169,39 +274,28 @@ def fetch() -> Dict[str, List[Dict[str, Any]]]:
         raise RuntimeError("BOOKNETIC_URL/USERNAME/PASSWORD not set")
 
     s = requests.Session()
-    _login_wp(s, base_url, username, password)
+    with job_run.phase("login"):
+        ensure_logged_in(s, base_url, username, lambda: _login_wp(s, base_url, username, password))
 
-    urls = {
-        "appointments": _discover_export_url(s, base_url, "appointments"),
-        "customers": _discover_export_url(s, base_url, "customers"),
-        "payments": _discover_export_url(s, base_url, "payments"),
-    }
+    with job_run.phase("discover"):
+        urls = _resolve_export_urls(s, base_url)
 
-    results: Dict[str, List[Dict[str, Any]]] = {"appointments": [], "customers": [], "payments": []}
-    try:
-        rows = _download_csv(s, urls["appointments"]) or []
-        mapped = [_best_map_appointment(r) for r in rows]
-        results["appointments"] = mapped
-        print(f"[booknetic-http] appointments rows={len(mapped)} distinct_ids={len({m.get('id') for m in mapped})}")
-    except Exception as e:
-        print(f"[booknetic-http] appointments export failed: {e}")
+    for module, mapper in _MAPPERS:
+        try:
+            with job_run.phase("download"):
+                rows = _download_module(s, base_url, module, *urls[module]) or []
+            with job_run.phase("map"):
+                mapped = [mapper(r) for r in rows]
+            print(f"[booknetic-http] {module} rows={len(mapped)} distinct_ids={len({str(m.get('id')) for m in mapped})}")
+        except Exception as e:
+            print(f"[booknetic-http] {module} export failed: {e}")
+            continue
+        yield from batched(module, mapped)
 
-    try:
-        rows = _download_csv(s, urls["customers"]) or []
-        mapped = [_best_map_customer(r) for r in rows]
-        results["customers"] = mapped
-        print(f"[booknetic-http] customers rows={len(mapped)} distinct_ids={len({m.get('id') for m in mapped})}")
-    except Exception as e:
-        print(f"[booknetic-http] customers export failed: {e}")
-
-    try:
-        rows = _download_csv(s, urls["payments"]) or []
-        mapped = [_best_map_payment(r) for r in rows]
-        results["payments"] = mapped
-        print(f"[booknetic-http] payments rows={len(mapped)} distinct_ids={len({str(m.get('id')) for m in mapped})}")
-    except Exception as e:
-        print(f"[booknetic-http] payments export failed: {e}")
 
+def fetch() -> Dict[str, List[Dict[str, Any]]]:
+    """Login to WordPress and download Booknetic CSVs via HTTP (no browser)."""
+    results: Dict[str, List[Dict[str, Any]]] = {"appointments": [], "customers": [], "payments": []}
+    for batch in iter_batches():
+        results[batch.entity].extend(batch.rows)
     return results
-
-
@@ -5,10 +5,13 @@ Mucho más rápido y confiable para Railway
 """
 from typing import Any, Dict
 
+# El registro de plugins (jobs.plugin_registry) ejecuta directamente este módulo
+ALIAS_OF = "jobs.booknetic_export_requests"
+
 def fetch() -> Dict[str, Any]:
     """
     Fetch all Booknetic data using requests (no Selenium)
-    Returns: dict with lists of customers, appointments, payments
+    Returns: dict with customers, appointments, payments (lazy iterators of mapped rows)
     """
     try:
         # Usar la versión optimizada con requests
@@ -17,7 +20,8 @@ def fetch() -> Dict[str, Any]:
         print("[booknetic_selenium_export] ACTUALIZADO: Usando REQUESTS (rápido)")
         result = export_fetch()
         
-        print(f"[booknetic_selenium_export] Completado: {len(result.get('customers', []))} customers, {len(result.get('appointments', []))} appointments, {len(result.get('payments', []))} payments")
+        # Las entidades son iteradores perezosos (streaming); el conteo lo reporta el upsert
+        print(f"[booknetic_selenium_export] Completado: {', '.join(k for k in ('customers', 'appointments', 'payments') if k in result)}")
         return result
         
     except Exception as e:
@@ -0,0 +1,89 @@
+"""
+Compiled column-resolution plans for the heuristic Booknetic mappers.
+
+The mappers pick source columns by token matching on normalized headers
+(e.g. the first header containing "email"). Instead of re-normalizing and
+scanning every header for every row, a HeaderPlan resolves the
+source -> target mapping once per header tuple (LRU-cached by header
+signature) and rows are then mapped by direct index lookup.
+"""
+import hashlib
+import sys
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# (target, token groups in priority order). A header matches a group when its
+# normalized name contains any of the group's tokens; the first header (in
+# column order) matching the first group that matches anything wins.
+FieldSpec = Tuple[Tuple[str, Tuple[Tuple[str, ...], ...]], ...]
+
+
+def normalize_key(key: Optional[str]) -> str:
+    return (key or "").strip().lower().replace(" ", "_")
+
+
+class HeaderPlan:
+    """Resolved column indexes for one header tuple and one FieldSpec."""
+
+    __slots__ = ("header", "index", "raw_keys", "raw_index", "id_parts")
+
+    def __init__(self, header: Tuple[Any, ...], fields: FieldSpec):
+        # Interned: every raw dict built from this plan shares the same key objects
+        normalized = [sys.intern(normalize_key(h)) for h in header]
+        self.header = header
+
+        self.index: Dict[str, Optional[int]] = {}
+        for target, groups in fields:
+            self.index[target] = _resolve(normalized, groups)
+
+        # raw payload: normalized key -> value, last column wins on collisions
+        last: Dict[str, int] = {}
+        for i, nk in enumerate(normalized):
+            last[nk] = i
+        self.raw_keys: Tuple[str, ...] = tuple(last)
+        self.raw_index: Tuple[int, ...] = tuple(last.values())
+
+        # fallback id: "nk=value" pieces sorted by normalized key
+        order = sorted(range(len(header)), key=lambda i: normalized[i])
+        self.id_parts: Tuple[Tuple[str, int], ...] = tuple((f"{normalized[i]}=", i) for i in order)
+
+    def value(self, values: Sequence[Any], target: str) -> Any:
+        i = self.index[target]
+        if i is None or i >= len(values):
+            return None
+        return values[i]
+
+    def project(self, values: Sequence[Any]) -> Dict[str, Any]:
+        """{target: value} for every field of the plan (None when unresolved)."""
+        n = len(values)
+        return {t: (values[i] if i is not None and i < n else None) for t, i in self.index.items()}
+
+    def raw(self, values: Sequence[Any]) -> Dict[str, Any]:
+        n = len(values)
+        return {k: (values[i] if i < n else None) for k, i in zip(self.raw_keys, self.raw_index)}
+
+    def fallback_id(self, values: Sequence[Any]) -> str:
+        """sha1 of the whole row, normalized and ordered by key."""
+        n = len(values)
+        fallback_raw = "|".join(
+            prefix + str(values[i] if i < n else None).strip() for prefix, i in self.id_parts
+        )
+        return hashlib.sha1(fallback_raw.encode("utf-8")).hexdigest()
+
+
+def _resolve(normalized: List[str], groups: Tuple[Tuple[str, ...], ...]) -> Optional[int]:
+    for tokens in groups:
+        for i, nk in enumerate(normalized):
+            if any(t in nk for t in tokens):
+                return i
+    return None
+
+
+@lru_cache(maxsize=64)
+def compile_plan(header: Tuple[Any, ...], fields: FieldSpec) -> HeaderPlan:
+    return HeaderPlan(header, fields)
+
+
+def plan_for_row(row: Dict[Any, Any], fields: FieldSpec) -> HeaderPlan:
+    """Plan for a csv.DictReader row, keyed by its header tuple."""
+    return compile_plan(tuple(row), fields)
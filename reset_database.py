@@ -18,6 +18,15 @@ except ImportError:
 
 from db.connection import get_connection
 
+# Estado en etl_state que describe los datos cargados: si queda tras vaciar las
+# tablas, la próxima ejecución salta los exports "sin cambios", va en modo hot
+# y Sheets lee solo filas nuevas, y las tablas quedan vacías
+DATA_STATE_KEYS = [
+    "booknetic:export_fingerprint:%",
+    "booknetic:last_full_sync",
+    "sheets:hwm:%",
+]
+
 
 def reset_tables():
     """Limpia todas las tablas de datos"""
@@ -33,6 +42,7 @@ def reset_tables():
     print("   - booknetic_appointments")
     print("   - booknetic_payments")
     print("   - job_runs")
+    print("   y el estado de sincronización en etl_state (fingerprints, última sync completa, HWM de Sheets)")
     print()
     
     confirmacion = input("¿Estás seguro? Escribe 'SI' para continuar: ")
@@ -61,6 +71,10 @@ def reset_tables():
                         print(f"✅ {table} limpiada")
                     except Exception as e:
                         print(f"⚠️  {table}: {e}")
+
+                for pattern in DATA_STATE_KEYS:
+                    cur.execute("DELETE FROM etl_state WHERE key LIKE %s", (pattern,))
+                    print(f"✅ etl_state {pattern}: {cur.rowcount} claves eliminadas")
                 
                 conn.commit()
                 
@@ -106,6 +120,15 @@ def verify_clean():
                         print(f"⚠️  {table}: {count} registros (esperado: 0)")
                         all_empty = False
                 
+                for pattern in DATA_STATE_KEYS:
+                    cur.execute("SELECT COUNT(*) FROM etl_state WHERE key LIKE %s", (pattern,))
+                    count = cur.fetchone()[0]
+                    if count == 0:
+                        print(f"✅ etl_state {pattern}: {count} claves")
+                    else:
+                        print(f"⚠️  etl_state {pattern}: {count} claves (esperado: 0)")
+                        all_empty = False
+
                 print()
                 if all_empty:
                     print("✅ Todas las tablas están vacías")
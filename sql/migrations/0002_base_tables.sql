@@ -11,6 +11,10 @@ create table if not exists leads (
     updated_at timestamptz not null default now()
 );
 
+-- Ensure new columns exist on already-created tables
+alter table if exists leads
+add column if not exists raw jsonb;
+
 create or replace function set_updated_at()
 returns trigger as $$
 begin
@@ -77,5 +81,3 @@ drop trigger if exists trg_booknetic_pay_updated_at on booknetic_payments;
 create trigger trg_booknetic_pay_updated_at
 before update on booknetic_payments
 for each row execute procedure set_updated_at();
-
-
@@ -0,0 +1,7 @@
+-- Key/value store for ETL bookkeeping (export fingerprints, caches)
+create table if not exists etl_state (
+    key text primary key,
+    value jsonb not null,
+    expires_at timestamptz,
+    updated_at timestamptz not null default now()
+);
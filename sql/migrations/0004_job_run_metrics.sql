@@ -0,0 +1,21 @@
+-- Per-run metrics and per-phase timings written by db.job_run.JobRun
+alter table job_runs add column if not exists rows_inserted integer;
+alter table job_runs add column if not exists rows_updated integer;
+alter table job_runs add column if not exists rows_unchanged integer;
+alter table job_runs add column if not exists bytes_downloaded bigint;
+alter table job_runs add column if not exists peak_rss_kb bigint;
+alter table job_runs add column if not exists wall_seconds double precision;
+alter table job_runs add column if not exists cpu_seconds double precision;
+
+create table if not exists job_run_phases (
+    job_run_id bigint not null references job_runs(id) on delete cascade,
+    seq integer not null,
+    phase text not null,
+    started_at timestamptz not null,
+    wall_seconds double precision not null,
+    cpu_seconds double precision not null,
+    primary key (job_run_id, seq)
+);
+
+create index if not exists idx_job_run_phases_phase
+on job_run_phases (phase, started_at desc);
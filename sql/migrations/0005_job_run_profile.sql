@@ -0,0 +1,2 @@
+-- Compact cProfile/tracemalloc summary of profiled runs (db.profiling)
+alter table job_runs add column if not exists profile jsonb;
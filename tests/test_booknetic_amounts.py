@@ -0,0 +1,51 @@
+import pytest
+
+from jobs.booknetic_export_requests import iter_map_payments, parse_amount
+
+
+@pytest.mark.parametrize(
+    "value, currency, expected",
+    [
+        ("$164.970", None, 164970.0),
+        ("164.970", "CLP", 164970.0),
+        ("$ 1.164.970", None, 1164970.0),
+        ("1.234,5", None, 1234.5),
+        ("1.234,5", "EUR", 1234.5),
+        ("99.90", None, 99.9),
+        ("99.90", "CLP", 99.9),
+        # Con moneda con decimales, un grupo final de 3 dígitos es decimal
+        ("99.900", "USD", 99.9),
+        ("99.900", "usd", 99.9),
+        ("1.234.567", "USD", 1234567.0),
+        ("25000", None, 25000.0),
+        ("", None, None),
+        (None, None, None),
+        ("  $ ", None, None),
+        ("gratis", None, None),
+    ],
+)
+def test_parse_amount(value, currency, expected):
+    assert parse_amount(value, currency) == expected
+
+
+def test_parse_amount_default_currency_is_zero_decimal():
+    # Riesgo documentado: sin currency, "99.900" se lee en la moneda por defecto (CLP)
+    assert parse_amount("99.900") == 99900.0
+
+
+def test_iter_map_payments_uses_row_currency():
+    rows = [
+        {"ID": "10", "Customer": "Ana", "Payment date": "30/12/2024 18:51", "Paid amount": "$164.970",
+         "Payment status": "Paid", "Method": "card"},
+        {"ID": "11", "Customer": "Bob", "Payment date": "2024-12-31", "Paid amount": "99.900",
+         "Payment status": "Paid", "Method": "paypal", "Currency": "USD"},
+    ]
+
+    first, second = iter_map_payments(rows)
+
+    assert (first.id, first.appointment_id, first.amount, first.currency, first.method) == (
+        "10", "10", 164970.0, None, "card"
+    )
+    assert first.paid_at == "2024-12-30 18:51:00"
+    assert (second.id, second.amount, second.currency, second.method) == ("11", 99.9, "USD", "paypal")
+    assert second.raw_get("customer") == "Bob"
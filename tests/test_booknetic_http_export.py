@@ -0,0 +1,30 @@
+import pytest
+import requests
+
+from plugins.booknetic_http_export import _looks_like_html
+
+
+def _response(body: bytes, content_type: str) -> requests.Response:
+    resp = requests.Response()
+    resp._content = body
+    resp.headers["Content-Type"] = content_type
+    return resp
+
+
+@pytest.mark.parametrize(
+    "body, content_type, expected",
+    [
+        (b"ID,Customer\n1,Ana\n", "text/csv", False),
+        # WordPress suele servir el CSV como text/html
+        (b"ID,Customer\n1,Ana\n", "text/html; charset=UTF-8", False),
+        (b"\xef\xbb\xbfID,Customer\n1,Ana\n", "text/html", False),
+        (b"", "text/html", False),
+        (b"\n  <!DOCTYPE html><html><body>login</body></html>", "text/html", True),
+        (b"<html><body>login</body></html>", "application/octet-stream", True),
+        (b"\xef\xbb\xbf<!doctype html>", "text/csv", True),
+        (b'<div class="notice">Sesion expirada</div>', "text/html", True),
+        (b'<div class="notice">Sesion expirada</div>', "text/csv", False),
+    ],
+)
+def test_looks_like_html(body, content_type, expected):
+    assert _looks_like_html(_response(body, content_type)) is expected
@@ -0,0 +1,47 @@
+import itertools
+
+import pytest
+
+from jobs.dates import FORMATS, DateColumnParser, _parse_fast, _parse_with_format, parse_date_flexible
+
+# Valid dates in each format, plus variants the fast path must treat like strptime
+SAMPLES = [
+    "30/12/1922 18:51",
+    "30-12-1922 18:51",
+    "1922-12-30 18:51:07",
+    "1922-12-30 18:51",
+    "1922-12-30",
+    "30/12/1922",
+    "30-12-1922",
+]
+UNICODE_DIGITS = ["٣", "۳", "३", "３", "𝟑"]
+
+
+def _variants():
+    for sample, digit in itertools.product(SAMPLES, UNICODE_DIGITS):
+        for i, ch in enumerate(sample):
+            if ch.isdigit():
+                yield sample[:i] + digit + sample[i + 1 :]
+    yield from SAMPLES
+    # strptime accepts any run of (Unicode) whitespace where the format has a space
+    yield "30/12/1922\u00a018:51"
+    yield "30/12/1922  18:51"
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_fast_path_never_disagrees_with_strptime(fmt):
+    # The fast path may decline a value (it then falls back to strptime), never accept a different one
+    for value in _variants():
+        fast = _parse_fast(value, fmt)
+        if fast is not None:
+            slow, slow_fmt = _parse_with_format(value)
+            assert (fast, fmt) == (slow, slow_fmt), value
+
+
+@pytest.mark.parametrize("sample", SAMPLES)
+def test_column_parser_matches_flexible_on_unicode_digits(sample):
+    parse = DateColumnParser(sample_size=1)
+    parse(sample)  # infer the format from a clean value
+    assert parse.format is not None
+    for value in _variants():
+        assert parse(value) == parse_date_flexible(value), value
@@ -0,0 +1,46 @@
+import pytest
+
+from jobs import metrics
+
+
+@pytest.fixture
+def fresh(monkeypatch):
+    monkeypatch.setattr(metrics, "REGISTRY", metrics.Registry())
+    monkeypatch.setattr(metrics, "_expected_jobs", [])
+    monkeypatch.setattr(metrics, "HEALTH_MAX_SUCCESS_AGE", 60.0)
+    monkeypatch.setattr(metrics.time, "time", lambda: 1000.0)
+    monkeypatch.setattr(metrics, "_started_at", 0.0)
+    return metrics
+
+
+def test_expected_job_that_never_finished_is_stale(fresh):
+    fresh.expect_job("booknetic_scrape")
+
+    ok, payload = fresh.health()
+
+    assert not ok
+    assert payload["stale_jobs"] == ["booknetic_scrape"]
+    assert payload["jobs"]["booknetic_scrape"] == {"last_run_age_seconds": None, "last_success_age_seconds": None}
+
+
+def test_expected_job_gets_grace_period_after_start(fresh, monkeypatch):
+    monkeypatch.setattr(fresh, "_started_at", 990.0)
+    fresh.expect_job("booknetic_scrape")
+
+    ok, payload = fresh.health()
+
+    assert ok
+    assert payload["stale_jobs"] == []
+
+
+def test_recent_success_is_healthy(fresh):
+    fresh.expect_job("booknetic_scrape")
+    fresh.expect_job("booknetic_scrape")
+    job = metrics._labels(job="booknetic_scrape")
+    fresh.REGISTRY.set("job_last_run_timestamp_seconds", job, 980.0)
+    fresh.REGISTRY.set("job_last_success_timestamp_seconds", job, 980.0)
+
+    ok, payload = fresh.health()
+
+    assert ok
+    assert payload["jobs"] == {"booknetic_scrape": {"last_run_age_seconds": 20.0, "last_success_age_seconds": 20.0}}
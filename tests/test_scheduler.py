@@ -0,0 +1,80 @@
+import heapq
+from concurrent.futures import Future
+
+import pytest
+
+from jobs.scheduler import IntervalTrigger, Scheduler
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeExecutor:
+    """Futures that finish only when the test says so."""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn):
+        future = Future()
+        self.futures.append(future)
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def make_scheduler(policy):
+    clock = FakeClock()
+    scheduler = Scheduler(misfire_policy=policy, clock=clock)
+    scheduler._executor.shutdown()
+    scheduler._executor = FakeExecutor()
+    job = scheduler.add_job("job", lambda: None, IntervalTrigger(1), run_immediately=True)
+    return scheduler, clock, job
+
+
+def tick(scheduler, clock, t):
+    """What run_forever does at time ``t``: dispatch every job due by then."""
+    clock.now = t
+    while scheduler._heap and scheduler._heap[0][0] <= t:
+        _, _, job = heapq.heappop(scheduler._heap)
+        scheduler._dispatch(job, t)
+
+
+def finish(scheduler, clock, t):
+    clock.now = t
+    scheduler._executor.futures[-1].set_result(None)
+
+
+@pytest.mark.parametrize("policy", ["run_once", "skip"])
+def test_overrun_shorter_than_interval(policy):
+    # 1s interval, first run takes 1.5s: the 1.0 run is missed while it runs
+    scheduler, clock, job = make_scheduler(policy)
+    tick(scheduler, clock, 0.0)
+    tick(scheduler, clock, 1.0)
+    assert job.missed
+    finish(scheduler, clock, 1.5)
+    tick(scheduler, clock, 1.5)
+    tick(scheduler, clock, 1.9)
+
+    starts = [0.0, 1.5] if policy == "run_once" else [0.0]
+    assert len(scheduler._executor.futures) == len(starts)
+    assert job.last_started == starts[-1]
+    # run_once: next after the catch-up run; skip: next slot counted from the finish
+    assert scheduler._heap[0][0] == 2.5
+
+
+def test_run_once_merges_several_missed_runs():
+    scheduler, clock, job = make_scheduler("run_once")
+    tick(scheduler, clock, 0.0)
+    tick(scheduler, clock, 1.0)
+    tick(scheduler, clock, 2.0)  # nothing queued while running: missed only once
+    finish(scheduler, clock, 3.2)
+    tick(scheduler, clock, 3.2)
+    assert len(scheduler._executor.futures) == 2
+    assert job.last_started == 3.2